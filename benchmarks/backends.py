@@ -0,0 +1,49 @@
+# Compares the execution backends on the same programs: the stack VM's opcode-table loop
+# and the closure compiler (src/closures.py), each with and without the JIT (src/jit.py).
+# Results should match, times shouldn't.
+#
+#     python3 benchmarks/backends.py
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM, BACKENDS
+from jit import THRESHOLD
+
+DEFS = """
+(define fib (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        ((eq? n 1) 1)
+        (true (+ (fib (- n 1)) (fib (- n 2)))))))
+(define loop (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (loop (- n 1) (+ acc 1))))))
+""".strip()
+
+PROGRAMS = ["(fib 18)", "(loop 50000 0)"]
+
+def bench(backend, jit, src, repeats=3):
+    lexer, parser, vm = Lexer(), Parser(), VM(backend=backend, jit=jit)
+    vm.run(parser.parse(lexer.lex(DEFS)))
+    code = parser.parse(lexer.lex(src))
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        vm.run(code)
+        best = min(best, perf_counter() - start)
+    return best, vm.stack.pop()
+
+if __name__ == "__main__":
+    for src in PROGRAMS:
+        for backend in BACKENDS:
+            for jit in [None, THRESHOLD]:
+                elapsed, result = bench(backend, jit, src)
+                name = backend + ("+jit" if jit else "")
+                print(f"{src:<16} {name:<12} {elapsed * 1000:8.2f} ms  = {result}")
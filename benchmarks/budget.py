@@ -0,0 +1,52 @@
+# Measures what running under a budget (see src/budget.py) costs: each program in
+# benchmarks/programs is run on each backend, with and without the JIT, first without a
+# budget and then under one that's never exceeded, and the slowdown is printed with what
+# the budget counted (which is the same whatever runs the code).
+#
+#     python3 benchmarks/budget.py [RUNS]
+
+from os.path import basename, dirname, join
+from glob import glob
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+from budget import Budget
+from jit import THRESHOLD
+from vm import BACKENDS
+
+PROGRAMS = join(dirname(__file__), "programs")
+
+def timed(interp, program, runs, limits):
+    """The best times of `runs` runs of `program` without a budget and under `limits`
+    (taken in turns, so both see the machine in the same state), and the last budget."""
+    plain = limited = None
+    for _ in range(runs):
+        start = perf_counter()
+        interp.run(program)
+        elapsed = perf_counter() - start
+        plain = elapsed if plain is None else min(plain, elapsed)
+
+        budget = Budget(*limits)
+        start = perf_counter()
+        interp.run(program, budget)
+        elapsed = perf_counter() - start
+        limited = elapsed if limited is None else min(limited, elapsed)
+    return plain, limited, budget
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"{'program':<16} {'backend':<8} {'jit':>4} {'plain (ms)':>11} {'budget (ms)':>12} {'slowdown':>9}  usage")
+    for path in sorted(glob(join(PROGRAMS, "*.lisp"))):
+        with open(path) as f:
+            source = f.read()
+        for backend in BACKENDS:
+            for jit in (None, THRESHOLD):
+                interp = Interpreter(backend, jit)
+                program = interp.compile(source)
+                interp.run(program, Budget()) # compiled, metered variants included, before timing
+                plain, limited, budget = timed(interp, program, runs, (10**12, 10**6, 10**12))
+                print(f"{basename(path):<16} {backend:<8} {str(jit):>4} {plain * 1000:>11.2f} {limited * 1000:>12.2f} "
+                      f"{limited / plain - 1:>9.1%}  {budget.usage()}")
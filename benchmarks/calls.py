@@ -0,0 +1,44 @@
+# Measures the cost of a user lambda call against the number of globals in scope.
+# Before frames were linked lexically, every call deep-copied the whole global table,
+# so the numbers below grew with the amount of definitions; now they should stay flat.
+#
+#     python3 benchmarks/calls.py
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM
+
+FIB = """
+(define fib (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        ((eq? n 1) 1)
+        (true (+ (fib (- n 1)) (fib (- n 2)))))))
+"""
+
+def name(i):
+    """Spells out `i` in letters, since symbols can't contain digits."""
+    return "g" + "".join("abcdefghij"[int(d)] for d in str(i))
+
+def bench(globals_count, n=15, repeats=3):
+    lexer, parser, vm = Lexer(), Parser(), VM({})
+    filler = "".join(f"(define {name(i)} (list {i} {i} {i}))" for i in range(globals_count))
+    vm.run(parser.parse(lexer.lex((filler + FIB).strip())))
+
+    code = parser.parse(lexer.lex(f"(fib {n})"))
+    best = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        vm.run(code)
+        best = min(best, perf_counter() - start)
+    return best
+
+if __name__ == "__main__":
+    for count in [0, 100, 500]:
+        print(f"{count:>5} globals: fib(15) in {bench(count) * 1000:8.2f} ms")
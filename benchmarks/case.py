@@ -0,0 +1,57 @@
+# Compares `case` (one OP_SWITCH table lookup) with the `cond` chain of `eq?` tests it
+# replaces, on a dispatch loop over an increasing number of alternatives: the chain gets
+# slower the further down it the matching pair is, the table doesn't.
+#
+#     python3 benchmarks/case.py [ITERATIONS]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+import parse
+
+def dispatch(form, ways):
+    """A loop running each of `ways` pairs in turn, over and over."""
+    if form == "case":
+        pairs = " ".join(f"({i} (+ acc {i}))" for i in range(ways))
+        body = f"(case k {pairs} (else acc))"
+    else:
+        pairs = " ".join(f"((eq? k {i}) (+ acc {i}))" for i in range(ways))
+        body = f"(cond {pairs} (true acc))"
+    return f"""
+(define run-{form} (λ (n k acc)
+    (cond
+        ((eq? n 0) acc)
+        ((eq? k {ways}) (run-{form} (- n 1) 0 acc))
+        (true (run-{form} n (+ k 1) {body})))))
+"""
+
+def timed(interp, source, runs=3):
+    """The best time of `runs` runs of `source`, and its result."""
+    program = interp.compile(source)
+    best = None
+    for _ in range(runs):
+        start = perf_counter()
+        res = interp.run(program)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, res
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    parse.SWITCH_MIN = 1 << 30 # leave the `cond`s as they are
+    for backend in ("stack", "closure"):
+        for jit in (None, 100):
+            print(f"{backend}, {'JIT' if jit else 'no JIT'}")
+            for ways in (4, 16, 64):
+                interp = Interpreter(backend=backend, jit=jit, prelude=False)
+                times, results = {}, {}
+                for form in ("cond", "case"):
+                    interp.load(dispatch(form, ways))
+                    times[form], results[form] = timed(interp, f"(run-{form} {iterations // ways} 0 0)")
+                same = results["cond"] == results["case"]
+                print(f"  {ways:3} ways  cond {times['cond'] * 1000:8.1f} ms  case {times['case'] * 1000:8.1f} ms"
+                      f"  {times['cond'] / times['case']:5.1f}x  {'ok' if same else 'MISMATCH'}")
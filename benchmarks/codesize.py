@@ -0,0 +1,41 @@
+# Reports how much memory compiled code takes. Instruction streams are `array('i')`s, so
+# each word costs 4 bytes; the same words in a Python list cost a pointer each, plus an
+# int object for every value outside of CPython's small int cache.
+#
+#     python3 benchmarks/codesize.py [FORMS]
+
+from os.path import dirname, join
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+
+def walk(code):
+    """Yields `code` and every code object nested in it."""
+    yield code
+    for const in code.consts:
+        if hasattr(const, "ops"):
+            yield from walk(const)
+
+def array_bytes(code):
+    return sum(sys.getsizeof(c.ops) for c in walk(code))
+
+def list_bytes(code):
+    total = 0
+    for c in walk(code):
+        words = list(c.ops)
+        total += sys.getsizeof(words) + sum(sys.getsizeof(w) for w in words if not -5 <= w <= 256)
+    return total
+
+if __name__ == "__main__":
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    src = " ".join(f"(define f (λ (a b) (cond ((eq? a {i}) (+ a b {i})) (true (list a b {i})))))"
+                   for i in range(forms))
+    code = Parser().parse(Lexer().lex(src))
+
+    words = sum(len(c.ops) for c in walk(code))
+    print(f"{forms} forms, {words} words")
+    print(f"  array('i'): {array_bytes(code) / 1024:8.1f} KiB")
+    print(f"  list:       {list_bytes(code) / 1024:8.1f} KiB")
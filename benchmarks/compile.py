@@ -0,0 +1,41 @@
+# Measures compile time on generated sources of growing size; time per form should stay
+# flat as the program grows. The last size also nests `cond`s and lists deeply.
+#
+#     python3 benchmarks/compile.py [FORMS]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+
+FORM = """
+(define fn (λ (list el)
+    (cond
+        ((nil? list) (quote (a b c {i})))
+        ((eq? (car list) el) (cond ((eq? el {i}) 1) (true (+ {i} (* 2 {i}) (- el 1)))))
+        (true (fn (cdr list) el)))))
+"""
+
+def nested(depth):
+    return "(+ 1 " * depth + "0" + ")" * depth
+
+if __name__ == "__main__":
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sys.setrecursionlimit(10000)
+
+    for n in (forms // 10, forms // 2, forms):
+        lexed = Lexer().lex("".join(FORM.format(i=i) for i in range(n)))
+        start = perf_counter()
+        Parser().parse(lexed)
+        took = perf_counter() - start
+        print(f"{n:>7} forms {took:8.3f} s  {took / n * 1e6:6.1f} us/form")
+
+    for depth in (500, 1000, 2000):
+        lexed = Lexer().lex(nested(depth))
+        start = perf_counter()
+        Parser().parse(lexed)
+        print(f"depth {depth:>5} {(perf_counter() - start) * 1000:8.2f} ms")
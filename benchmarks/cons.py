@@ -0,0 +1,29 @@
+# Times the basic operations on long cons lists: building one at lex time, measuring,
+# iterating, reversing and printing it. All of these should scale linearly.
+#
+#     python3 benchmarks/cons.py [LENGTH]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+
+def timed(label, fn):
+    start = perf_counter()
+    result = fn()
+    print(f"  {label:<10} {(perf_counter() - start) * 1000:8.2f} ms")
+    return result
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    src = "(" + " ".join(str(i) for i in range(length)) + ")"
+
+    print(f"{length} elements")
+    lst = timed("lex", lambda: Lexer().lex(src)[0])
+    timed("len", lambda: len(lst))
+    timed("iter", lambda: sum(1 for _ in lst))
+    timed("reversed", lambda: list(reversed(lst)))
+    timed("repr", lambda: repr(lst))
@@ -0,0 +1,61 @@
+# Compares plain and hash-consed lists (see src/cons.py) on a program that builds the same
+# sublists over and over and compares long lists with `eq?`: memory held by the result
+# and time taken, with and without `native.hashconsing`.
+#
+#     python3 benchmarks/hashcons.py [LENGTH]
+
+from os.path import dirname, join
+from time import perf_counter
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+DEFS = """
+(define build (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (build (- n 1) (cons n lst))))))
+(define rows (λ (n row acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (rows (- n 1) row (cons (build row nil) acc))))))
+"""
+
+def measure(length, hashcons):
+    from lex import Lexer
+    from parse import Parser
+    from vm import VM
+    import native
+    if hashcons:
+        native.hashconsing()
+    lexer, parser, vm = Lexer(), Parser(), VM(jit=None)
+    vm.run(parser.parse(lexer.lex(DEFS)))
+    vm.run(parser.parse(lexer.lex(f"(define a (build {length} nil)) (define b (build {length} nil))")))
+
+    tracemalloc.start()
+    start = perf_counter()
+    vm.run(parser.parse(lexer.lex(f"(define table (rows {length // 100} 100 nil))")))
+    built = perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    code = parser.parse(lexer.lex("(eq? a b)"))
+    start = perf_counter()
+    for _ in range(100):
+        vm.run(code)
+    compared = (perf_counter() - start) / 100
+    return built, held, compared
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        # a fresh process per mode, as hash-consing is process-wide
+        print(*measure(int(sys.argv[1]), sys.argv[2] == "on"))
+        sys.exit()
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for mode in ("off", "on"):
+        out = subprocess.run([sys.executable, __file__, str(length), mode], capture_output=True, text=True, check=True)
+        built, held, compared = map(float, out.stdout.split())
+        print(f"hash-consing {mode:<3}  build {built * 1000:8.2f} ms  {held / 1024:8.1f} KiB held"
+              f"  eq? on {length} elements {compared * 1e6:8.1f} us")
@@ -0,0 +1,37 @@
+# Measures lexing throughput on a large generated source file.
+#
+#     python3 benchmarks/lexer.py [FORMS]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+
+FORM = """
+% form {i}
+(define fn (λ (list el)
+    (cond
+        ((cons? list) (or? (among (car list) el) (among (cdr list) el)))
+        ((eq? el {i}) (quote (a b c {i})))
+        (true (+ {i} (* 2 {i}) (- el 1))))))
+"""
+
+def generate(forms):
+    return "".join(FORM.format(i=i) for i in range(forms))
+
+if __name__ == "__main__":
+    forms = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    src = generate(forms)
+
+    lexer = Lexer()
+    best = float("inf")
+    for _ in range(3):
+        start = perf_counter()
+        lexer.lex(src)
+        best = min(best, perf_counter() - start)
+
+    mb = len(src.encode()) / 1e6
+    print(f"{mb:.2f} MB in {best:.3f} s: {mb / best:.2f} MB/s")
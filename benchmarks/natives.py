@@ -0,0 +1,45 @@
+# Times native-heavy code on the interpreters alone (no JIT): arithmetic in a loop, and
+# walking lists with `car`/`cdr`.
+#
+#     python3 benchmarks/natives.py
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM, BACKENDS
+
+DEFS = """
+(define arith (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (arith (- n 1) (+ acc (* n 2) (- n 3) 1))))))
+(define walk (λ (lst acc)
+    (cond
+        ((nil? lst) acc)
+        (true (walk (cdr lst) (+ acc (car lst)))))))
+(define build (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (build (- n 1) (cons n lst))))))
+(define numbers (build 20000 nil))
+""".strip()
+
+PROGRAMS = ["(arith 20000 0)", "(walk numbers 0)"]
+
+if __name__ == "__main__":
+    for backend in BACKENDS:
+        lexer, parser, vm = Lexer(), Parser(), VM(backend=backend, jit=None)
+        vm.run(parser.parse(lexer.lex(DEFS)))
+        for src in PROGRAMS:
+            code = parser.parse(lexer.lex(src))
+            best = float("inf")
+            for _ in range(3):
+                start = perf_counter()
+                vm.run(code)
+                best = min(best, perf_counter() - start)
+            print(f"{backend:<8} {src:<18} {best * 1000:8.2f} ms  -> {vm.stack.pop()}")
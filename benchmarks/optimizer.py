@@ -0,0 +1,94 @@
+# Runs a corpus of programs with and without the optimizer (src/optimize.py) on every
+# backend, checks that the results match and compares code size and run time.
+#
+#     python3 benchmarks/optimizer.py
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from optimize import optimize
+from bytecode import Code
+from vm import VM, BACKENDS
+
+PRELUDE = join(dirname(__file__), "..", "src", "prelude.lisp")
+
+DEFS = """
+(define area (λ (r) (* (/ 22 7) (* r r))))
+(define classify (λ (n)
+    (cond
+        (false (quote never))
+        ((eq? n (+ 1 1)) (quote (two (is (+ 1 1)))))
+        ((eq? n (* 2 (+ 1 2))) (quote six))
+        (true (cond
+            ((nil? n) nil)
+            (true (list n (+ 10 20 30))))))))
+(define count (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (count (- n 1) (+ acc (* 2 3) (- 4 4)))))))
+"""
+
+CORPUS = [
+    "(+ 1 2 3)",
+    "(car (cdr (list 1 (+ 2 3) 4)))",
+    "(quote (a b (unquote (* 6 7)) c))",
+    "(eq? (list 1 2) (quote (1 2)))",
+    "(cond (false 1) (true (+ 1 1)))",
+    "(cond ((eq? 1 2) 1))",
+    "(classify 2)",
+    "(classify 6)",
+    "(classify 7)",
+    "(area 10)",
+    "(count 20000 0)",
+    "(among (quote (1 (2 3))) 3)",
+    "(cadr (list 1 2 3))",
+    "(+ 1 (quote a))",
+]
+
+def size(code):
+    """Words of microcode in `code` and the lambda bodies in it."""
+    return len(code) + sum(size(const) for const in code.consts if type(const) is Code)
+
+def run(backend, optimized):
+    parser = Parser()
+    def load(src):
+        code = parser.parse(Lexer().lex(src))
+        return optimize(code) if optimized else code
+
+    vm = VM(backend=backend)
+    with open(PRELUDE) as f:
+        vm.run(load(f.read()))
+    defs = load(DEFS)
+    vm.run(defs)
+
+    results, took, words = [], 0, size(defs)
+    for src in CORPUS:
+        code = load(src)
+        words += size(code)
+        start = perf_counter()
+        try:
+            vm.run(code)
+            results.append(vm.stack.pop() if vm.stack else None)
+        except Exception as e:
+            results.append(f"error: {e}")
+        took += perf_counter() - start
+    return [str(r) for r in results], took, words
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    ok = True
+    for backend in BACKENDS:
+        plain, plaintime, plainwords = run(backend, False)
+        opt, opttime, optwords = run(backend, True)
+        for src, want, got in zip(CORPUS, plain, opt):
+            if want != got:
+                ok = False
+                print(f"MISMATCH ({backend}) {src}: {want} != {got}")
+        print(f"{backend:<8} {plainwords:5} -> {optwords:5} words  {plaintime * 1000:8.2f} -> {opttime * 1000:8.2f} ms")
+    print("results match" if ok else "results differ")
+    sys.exit(0 if ok else 1)
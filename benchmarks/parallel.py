@@ -0,0 +1,66 @@
+# Compares `pmap` and `preduce` (src/parallel.py) with their serial equivalents on a
+# CPU-bound list transform. The first parallel run also starts the worker pool, so it's
+# timed separately.
+#
+#     python3 benchmarks/parallel.py [LENGTH [WORKERS]]
+#
+# With a single CPU, `pmap` runs serially unless WORKERS is given.
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM
+import parallel
+
+DEFS = """
+(define fib (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        ((eq? n 1) 1)
+        (true (+ (fib (- n 1)) (fib (- n 2)))))))
+(define map (λ (f lst)
+    (cond
+        ((nil? lst) nil)
+        (true (cons (f (car lst)) (map f (cdr lst)))))))
+(define fold (λ (f acc lst)
+    (cond
+        ((nil? lst) acc)
+        (true (fold f (f acc (car lst)) (cdr lst))))))
+(define range (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (range (- n 1) (cons 16 lst))))))
+(define slow-add (λ (a b) (+ a b (* 0 (fib 14)))))
+"""
+
+# (name, serial version, parallel version); `preduce` needs an associative lambda
+PROGRAMS = [("map", "(map fib nums)", "(pmap fib nums)"),
+            ("reduce", "(fold slow-add 0 nums)", "(preduce slow-add 0 nums)")]
+
+def timed(vm, code):
+    start = perf_counter()
+    vm.run(code)
+    return perf_counter() - start, vm.stack.pop()
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    if len(sys.argv) > 2:
+        parallel.WORKERS = int(sys.argv[2])
+    sys.setrecursionlimit(10000)
+    lexer, parser, vm = Lexer(), Parser(), VM()
+    vm.run(parser.parse(lexer.lex(DEFS + f"(define nums (range {length} nil))")))
+    print(f"{parallel.WORKERS} workers, {length} elements")
+
+    timed(vm, parser.parse(lexer.lex("(map fib nums)"))) # lets the JIT compile fib
+    warm, _ = timed(vm, parser.parse(lexer.lex("(pmap fib nums)")))
+    print(f"pool start and first pmap {warm * 1000:8.1f} ms")
+    for name, serial, parallel_src in PROGRAMS:
+        serial_time, want = timed(vm, parser.parse(lexer.lex(serial)))
+        parallel_time, got = timed(vm, parser.parse(lexer.lex(parallel_src)))
+        print(f"{name:<8} serial {serial_time * 1000:8.1f} ms  parallel {parallel_time * 1000:8.1f} ms"
+              f"  {serial_time / parallel_time:5.2f}x  {'ok' if str(want) == str(got) else f'MISMATCH {want} != {got}'}")
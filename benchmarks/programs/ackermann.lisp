@@ -0,0 +1,10 @@
+% The Ackermann function: deep recursion, a mix of tail and non-tail calls.
+% expect: 125
+
+(define ack (λ (m n)
+    (cond
+        ((eq? m 0) (+ n 1))
+        ((eq? n 0) (ack (- m 1) 1))
+        (true (ack (- m 1) (ack m (- n 1)))))))
+
+(ack 3 4)
@@ -0,0 +1,19 @@
+% A long `cond` chain, taken down to a different branch on every call.
+% expect: 800000
+
+(define classify (λ (n)
+    (cond
+        ((eq? n 0) 1000) ((eq? n 1) 10) ((eq? n 2) 20) ((eq? n 3) 30) ((eq? n 4) 40)
+        ((eq? n 5) 50) ((eq? n 6) 60) ((eq? n 7) 70) ((eq? n 8) 80) ((eq? n 9) 90)
+        ((eq? n 10) 100) ((eq? n 11) 110) ((eq? n 12) 120) ((eq? n 13) 130) ((eq? n 14) 140)
+        ((eq? n 15) 150) ((eq? n 16) 160) ((eq? n 17) 170) ((eq? n 18) 180) ((eq? n 19) 190)
+        ((eq? n 20) 200) ((eq? n 21) 210) ((eq? n 22) 220) ((eq? n 23) 230) ((eq? n 24) 240)
+        (true 0))))
+
+(define loop (λ (n i acc)
+    (cond
+        ((eq? n 0) acc)
+        ((eq? i 0) (loop (- n 1) 24 (+ acc (classify 0))))
+        (true (loop (- n 1) (- i 1) (+ acc (classify i)))))))
+
+(loop 5000 24 0)
@@ -0,0 +1,10 @@
+% Naive doubly recursive Fibonacci: lots of small non-tail calls and arithmetic.
+% expect: 2584
+
+(define fib (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        ((eq? n 1) 1)
+        (true (+ (fib (- n 1)) (fib (- n 2)))))))
+
+(fib 18)
@@ -0,0 +1,39 @@
+% Higher-order code: `map`, `filter` and `fold` taking lambdas, closures made by other
+% lambdas and composed.
+% expect: 701295
+
+(define map (λ (f lst)
+    (cond
+        ((nil? lst) nil)
+        (true (cons (f (car lst)) (map f (cdr lst)))))))
+
+(define filter (λ (p lst)
+    (cond
+        ((nil? lst) nil)
+        ((p (car lst)) (cons (car lst) (filter p (cdr lst))))
+        (true (filter p (cdr lst))))))
+
+(define fold (λ (f acc lst)
+    (cond
+        ((nil? lst) acc)
+        (true (fold f (f acc (car lst)) (cdr lst))))))
+
+(define compose (λ (f g) (λ (x) (f (g x)))))
+(define adder (λ (k) (λ (x) (+ x k))))
+
+(define range (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (range (- n 1) (cons n lst))))))
+
+(define nums (range 200 nil))
+
+(define round (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (round (- n 1)
+            (+ acc (fold (λ (a b) (+ a b)) 0
+                (map (compose (adder 1) (adder n))
+                    (filter (λ (x) (not? (eq? x 7))) nums)))))))))
+
+(round 30 0)
@@ -0,0 +1,19 @@
+% Building, reversing and summing lists with `cons`, `car` and `cdr`.
+% expect: 12502500
+
+(define build (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (build (- n 1) (cons n lst))))))
+
+(define rev (λ (lst acc)
+    (cond
+        ((nil? lst) acc)
+        (true (rev (cdr lst) (cons (car lst) acc))))))
+
+(define sum (λ (lst acc)
+    (cond
+        ((nil? lst) acc)
+        (true (sum (cdr lst) (+ acc (car lst)))))))
+
+(sum (rev (rev (build 5000 nil) nil) nil) 0)
@@ -0,0 +1,16 @@
+% Memoized Fibonacci, called on a range of arguments so most calls hit the cache and a
+% few of the results get evicted.
+% expect: 2178309
+
+(define fib (memo (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        ((eq? n 1) 1)
+        (true (+ (fib (- n 1)) (fib (- n 2)))))) 64))
+
+(define loop (λ (n acc)
+    (cond
+        ((eq? n 0) (fib 32))
+        (true (loop (- n 1) (+ acc (fib (+ 40 n))))))))
+
+(loop 100 0)
@@ -0,0 +1,23 @@
+% Quoted data, rebuilt every time it's evaluated, walked with the prelude's `among`
+% and counted atom by atom.
+% expect: 8100
+
+(define count (λ (val)
+    (cond
+        ((nil? val) 0)
+        ((atom? val) 1)
+        (true (+ (count (car val)) (count (cdr val)))))))
+
+(define data (λ
+    (quote ((alpha (1 2 3) (beta gamma))
+            (delta (4 5 (6 7)) epsilon)
+            (zeta ((8) 9 10) (eta (theta iota)))
+            (kappa lambda mu (11 12 (13 (14 15))))))))
+
+(define round (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        ((among (data) 14) (round (- n 1) (+ acc (count (data)))))
+        (true acc))))
+
+(round 300 0)
@@ -0,0 +1,62 @@
+# Compares persistent vectors (src/pvector.py) with lists on indexed and append-heavy
+# jobs, which are quadratic with lists: building a sequence by appending to its end, then
+# summing it by index.
+#
+#     python3 benchmarks/pvector.py [LENGTH]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+
+DEFS = """
+(define append (λ (lst val)
+    (cond
+        ((nil? lst) (cons val nil))
+        (true (cons (car lst) (append (cdr lst) val))))))
+(define list-ref (λ (lst i)
+    (cond
+        ((eq? i 0) (car lst))
+        (true (list-ref (cdr lst) (- i 1))))))
+(define list-fill (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (list-fill (- n 1) (append lst n))))))
+(define list-sum (λ (lst i n acc)
+    (cond
+        ((eq? i n) acc)
+        (true (list-sum lst (+ i 1) n (+ acc (list-ref lst i)))))))
+(define vec-fill (λ (n vec)
+    (cond
+        ((eq? n 0) vec)
+        (true (vec-fill (- n 1) (pvector-push vec n))))))
+(define vec-sum (λ (vec i n acc)
+    (cond
+        ((eq? i n) acc)
+        (true (vec-sum vec (+ i 1) n (+ acc (pvector-ref vec i)))))))
+"""
+
+def timed(interp, source):
+    program = interp.compile(source)
+    start = perf_counter()
+    res = interp.run(program)
+    return perf_counter() - start, res
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    sys.setrecursionlimit(100000)
+    interp = Interpreter()
+    interp.load(DEFS)
+    interp.load(f"(define nums (list-fill {length} nil)) (define vec (vec-fill {length} []))")
+    print(f"{length} elements")
+
+    for name, lists, vectors in [("append", f"(list-fill {length} nil)", f"(vec-fill {length} [])"),
+                                 ("index", f"(list-sum nums 0 {length} 0)", f"(vec-sum vec 0 {length} 0)")]:
+        list_time, want = timed(interp, lists)
+        vector_time, got = timed(interp, vectors)
+        same = str(want).strip("()[]") == str(got).strip("()[]")
+        print(f"{name:<7} lists {list_time * 1000:9.2f} ms  pvectors {vector_time * 1000:9.2f} ms"
+              f"  {list_time / vector_time:7.1f}x  {'ok' if same else 'MISMATCH'}")
@@ -0,0 +1,45 @@
+# Runs a recursive sum that isn't tail recursive, to growing depths, under a deliberately
+# tiny Python recursion limit. The stack VM keeps calls on its own continuation stack
+# rather than Python's, so this should go as deep as memory allows, with the time and
+# memory per level staying flat.
+#
+#     python3 benchmarks/recursion.py [DEPTH]
+
+from os.path import dirname, join
+from time import perf_counter
+import tracemalloc
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM
+
+SUM = """
+(define sum (λ (n)
+    (cond
+        ((eq? n 0) 0)
+        (true (+ n (sum (- n 1)))))))
+""".strip()
+
+if __name__ == "__main__":
+    deepest = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sys.setrecursionlimit(100)
+
+    lexer, parser, vm = Lexer(), Parser(), VM({})
+    vm.run(parser.parse(lexer.lex(SUM)))
+
+    print(f"{'depth':>9} {'time (s)':>9} {'per call (us)':>14} {'peak (KiB)':>11} {'per call (B)':>13}")
+    depth = 1000
+    while depth <= deepest:
+        code = parser.parse(lexer.lex(f"(sum {depth})"))
+        tracemalloc.start()
+        start = perf_counter()
+        vm.run(code)
+        elapsed = perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert vm.stack.pop() == depth * (depth + 1) // 2
+        print(f"{depth:>9} {elapsed:>9.3f} {elapsed / depth * 1e6:>14.2f} {peak / 1024:>11.1f} {peak / depth:>13.1f}")
+        depth *= 10
@@ -0,0 +1,73 @@
+# Measures the evaluation server (src/server.py) against starting the interpreter for each
+# evaluation: the round trip of one request at a time, and how many requests a second get
+# through when they're pipelined.
+#
+#     python3 benchmarks/server.py [WORKERS]
+
+from os.path import dirname, exists, join
+from time import perf_counter, sleep
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+
+AWRWYDR = join(dirname(__file__), "..", "src", "awrwydr.py")
+SOURCE = "(+ 1 (* 2 3))"
+
+def start(path, workers):
+    proc = subprocess.Popen([sys.executable, AWRWYDR, "--serve", path, "--workers", str(workers)],
+                            stdout=subprocess.DEVNULL)
+    while not exists(path):
+        sleep(0.01)
+    return proc
+
+def connect(path):
+    sock = socket.socket(socket.AF_UNIX)
+    for _ in range(100):
+        try:
+            sock.connect(path)
+            return sock, sock.makefile("rb")
+        except (ConnectionRefusedError, FileNotFoundError):
+            sleep(0.01)
+    raise Exception("the server isn't accepting connections")
+
+def request(i, source=SOURCE):
+    return json.dumps({"id": i, "source": source}).encode() + b"\n"
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+
+    start_time = perf_counter()
+    runs = 5
+    for _ in range(runs):
+        subprocess.run([sys.executable, AWRWYDR, "-"], input=SOURCE.encode(), stdout=subprocess.DEVNULL, check=True)
+    print(f"new process per evaluation  {(perf_counter() - start_time) / runs * 1000:10.3f} ms")
+
+    path = join(tempfile.mkdtemp(), "awrwydr.sock")
+    proc = start(path, workers)
+    try:
+        sock, responses = connect(path)
+        for i in range(100): # warming up
+            sock.sendall(request(i))
+            responses.readline()
+
+        n = 2000
+        start_time = perf_counter()
+        for i in range(n):
+            sock.sendall(request(i))
+            response = json.loads(responses.readline())
+        print(f"one request at a time       {(perf_counter() - start_time) / n * 1000:10.3f} ms")
+        assert response == {"id": n - 1, "results": ["7"]}, response
+
+        n = 20000
+        start_time = perf_counter()
+        sock.sendall(b"".join(request(i) for i in range(n)))
+        ids = [json.loads(responses.readline())["id"] for _ in range(n)]
+        elapsed = perf_counter() - start_time
+        print(f"pipelined                   {n / elapsed:10.0f} requests/s")
+        assert ids == list(range(n))
+    finally:
+        proc.terminate()
+        proc.wait()
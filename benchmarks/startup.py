@@ -0,0 +1,65 @@
+# Measures what the compiled-code cache saves at startup: loading a source file cold
+# (lexed, parsed and, with -O, optimized, then cached) against loading it warm (read
+# back from the `.awc` file). Runs on a copy of the prelude and on a generated program,
+# in a temporary directory, so no cache files are left lying around.
+#
+#     python3 benchmarks/startup.py [-O] [FORMS]
+
+from os.path import dirname, join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import os
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from compile import FORM
+from lex import Lexer
+from parse import Parser
+from optimize import optimize
+from ops import disassemble
+import cache
+
+PRELUDE_PATH = join(dirname(__file__), "..", "src", "prelude.lisp")
+RUNS = 20
+
+def build(source):
+    code = Parser().parse(Lexer().lex(source))
+    return optimize(code) if OPTIMIZE else code
+
+def best(fn):
+    times = []
+    for _ in range(RUNS):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return min(times)
+
+if __name__ == "__main__":
+    OPTIMIZE = "-O" in sys.argv
+    rest = [arg for arg in sys.argv[1:] if arg != "-O"]
+    forms = int(rest[0]) if rest else 500
+
+    with open(PRELUDE_PATH) as f:
+        sources = {"prelude": f.read(), f"{forms} forms": "".join(FORM.format(i=i) for i in range(forms))}
+
+    with TemporaryDirectory() as tmp:
+        for name, source in sources.items():
+            path = join(tmp, "source.lisp")
+            with open(path, "w") as f:
+                f.write(source)
+
+            def cold():
+                try:
+                    os.remove(cache.location(path))
+                except OSError:
+                    pass
+                return cache.load(path, build, "bench")
+            warm = lambda: cache.load(path, build, "bench")
+
+            cold_time = best(cold)
+            warm_time = best(warm)
+            if disassemble(warm()) != disassemble(build(source)):
+                raise Exception(f"{name}: cached code differs from compiled code")
+            print(f"{name:>12} cold {cold_time * 1000:8.2f} ms  warm {warm_time * 1000:8.2f} ms"
+                  f"  {cold_time / warm_time:5.1f}x  ({os.path.getsize(cache.location(path))} bytes)")
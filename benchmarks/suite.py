@@ -0,0 +1,143 @@
+# The benchmark suite: times lexing, parsing and running each program in
+# benchmarks/programs (checking it evaluates to what its `% expect:` line says), plus
+# lexing and parsing large generated sources. Every phase is warmed up, then timed a few
+# times, keeping the best time.
+#
+# Results can be saved as JSON and compared against a baseline saved the same way; any
+# phase that got slower by more than the threshold is flagged, and the exit status is 1:
+#
+#     python3 benchmarks/suite.py --save baseline.json
+#     ...change things...
+#     python3 benchmarks/suite.py --compare baseline.json [--threshold 0.1]
+#
+# Pass `-b closure`, `--no-jit` or `-O` to measure another configuration; baselines
+# should be compared against results of the same one.
+
+from os.path import basename, dirname, join
+from glob import glob
+from time import perf_counter
+import argparse
+import json
+import platform
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from compile import FORM, nested
+from lex import Lexer
+from parse import Parser
+from optimize import optimize
+from vm import VM, BACKENDS
+from jit import THRESHOLD as JIT_THRESHOLD
+
+PROGRAMS = join(dirname(__file__), "programs")
+PRELUDE = join(dirname(__file__), "..", "src", "prelude.lisp")
+
+# Differences below this many seconds are noise, whatever the ratio.
+FLOOR = 1e-4
+
+def generated():
+    """Returns the generated sources, by name, which are only lexed and parsed."""
+    return {"gen-forms": "".join(FORM.format(i=i) for i in range(5000)),
+            "gen-nested": nested(2000)}
+
+def best(fn, warmup, repeat):
+    """Returns the best time of `repeat` calls to `fn` after `warmup` untimed ones, and
+    what the last call returned."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        res = fn()
+        times.append(perf_counter() - start)
+    return min(times), res
+
+def expected(source):
+    for line in source.splitlines():
+        if line.startswith("% expect:"):
+            return line[len("% expect:"):].strip()
+    return None
+
+def measure(name, source, args, run=True):
+    lexed_time, lexed = best(lambda: Lexer().lex(source), args.warmup, args.repeat)
+    parse = (lambda: optimize(Parser().parse(lexed))) if args.optimize else (lambda: Parser().parse(lexed))
+    parse_time, code = best(parse, args.warmup, args.repeat)
+    times = {"lex": lexed_time, "parse": parse_time}
+    if not run:
+        return times
+
+    vm = VM(backend=args.backend, jit=None if args.no_jit else JIT_THRESHOLD)
+    with open(PRELUDE) as f:
+        vm.run(Parser().parse(Lexer().lex(f.read())))
+    def execute():
+        vm.run(code)
+        return vm.stack[-1] if vm.stack else None
+    times["run"], result = best(execute, args.warmup, args.repeat)
+
+    want = expected(source)
+    if want is not None and str(result) != want:
+        raise Exception(f"{name}: expected {want}, got {result}")
+    return times
+
+def compare(results, baseline, threshold):
+    """Prints how `results` compare to `baseline` and returns the regressions."""
+    regressions = []
+    for name, times in results.items():
+        for phase, time in times.items():
+            old = baseline.get(name, {}).get(phase)
+            if old is None:
+                continue
+            ratio = time / old if old else float("inf")
+            flag = ""
+            if ratio > 1 + threshold and time - old > FLOOR:
+                regressions.append((name, phase, ratio))
+                flag = "  REGRESSION"
+            print(f"{name:<12} {phase:<6} {old * 1000:10.3f} -> {time * 1000:10.3f} ms  {ratio:6.2f}x{flag}")
+    return regressions
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="times the lexer, compiler and VM")
+    argparser.add_argument("-b", "--backend", choices=BACKENDS, default="stack")
+    argparser.add_argument("--no-jit", action="store_true")
+    argparser.add_argument("-O", "--optimize", action="store_true")
+    argparser.add_argument("--warmup", type=int, default=1, help="untimed runs before timing")
+    argparser.add_argument("--repeat", type=int, default=5, help="timed runs, the best one counting")
+    argparser.add_argument("--save", metavar="FILE", help="write the results to FILE as JSON")
+    argparser.add_argument("--compare", metavar="FILE", help="compare the results against FILE")
+    argparser.add_argument("--threshold", type=float, default=0.1, help="how much slower is a regression (0.1: 10%%)")
+    argparser.add_argument("only", nargs="*", help="only run these benchmarks")
+    args = argparser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    sources = {}
+    for path in sorted(glob(join(PROGRAMS, "*.lisp"))):
+        with open(path) as f:
+            sources[basename(path)[:-len(".lisp")]] = f.read()
+    sources.update(generated())
+
+    results = {}
+    print(f"{'':<12} {'lex (ms)':>10} {'parse (ms)':>10} {'run (ms)':>10}")
+    for name, source in sources.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = times = measure(name, source, args, run=not name.startswith("gen-"))
+        print(f"{name:<12} " + " ".join(f"{times[phase] * 1000:10.3f}" if phase in times else f"{'-':>10}"
+                                        for phase in ("lex", "parse", "run")))
+
+    config = {"backend": args.backend, "jit": not args.no_jit, "optimize": args.optimize}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": config, "python": platform.python_version(), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print(f"warning: the baseline was measured with {baseline.get('config')}")
+        print()
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+        print("no regressions")
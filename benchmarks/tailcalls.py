@@ -0,0 +1,39 @@
+# Runs a tail-recursive counting loop under a deliberately tiny Python recursion limit.
+# Calls in tail position compile to OP_TAIL_EVAL, which reuses the running frame, so
+# this should finish with a flat memory profile no matter how many iterations it does.
+#
+#     python3 benchmarks/tailcalls.py [ITERATIONS]
+
+from os.path import dirname, join
+from time import perf_counter
+import tracemalloc
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from vm import VM
+
+LOOP = """
+(define loop (λ (n acc)
+    (cond
+        ((eq? n 0) acc)
+        (true (loop (- n 1) (+ acc 1))))))
+""".strip()
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    sys.setrecursionlimit(100)
+
+    lexer, parser, vm = Lexer(), Parser(), VM({})
+    vm.run(parser.parse(lexer.lex(LOOP)))
+    code = parser.parse(lexer.lex(f"(loop {iterations} 0)"))
+
+    tracemalloc.start()
+    start = perf_counter()
+    vm.run(code)
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+
+    print(f"(loop {iterations} 0) = {vm.stack.pop()} in {elapsed:.2f} s, peak {peak / 1024:.1f} KiB")
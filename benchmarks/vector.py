@@ -0,0 +1,55 @@
+# Compares numeric vectors (src/vector.py) with lists of ints for the same jobs: scaling
+# the elements and summing them, and a dot product. The list versions are tail-recursive
+# lambdas, the vector ones a native call or two.
+#
+#     python3 benchmarks/vector.py [LENGTH]
+
+from os.path import dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+import vector
+
+DEFS = """
+(define range (λ (n lst)
+    (cond
+        ((eq? n 0) lst)
+        (true (range (- n 1) (cons (- n 1) lst))))))
+(define scaled-sum (λ (lst k acc)
+    (cond
+        ((nil? lst) acc)
+        (true (scaled-sum (cdr lst) k (+ acc (* k (car lst))))))))
+(define dot-list (λ (a b acc)
+    (cond
+        ((nil? a) acc)
+        (true (dot-list (cdr a) (cdr b) (+ acc (* (car a) (car b))))))))
+"""
+
+# (name, with lists, with vectors)
+JOBS = [("scale+sum", "(scaled-sum nums 3 0)", "(vector-sum (* vec 3))"),
+        ("dot", "(dot-list nums nums 0)", "(vector-dot vec vec)")]
+
+def best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        res = fn()
+        times.append(perf_counter() - start)
+    return min(times), res
+
+if __name__ == "__main__":
+    length = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    interp = Interpreter()
+    interp.load(DEFS)
+    interp.load(f"(define nums (range {length} nil)) (define vec (to-vector nums))")
+    print(f"{length} elements, vectors backed by {'NumPy' if vector.numpy is not None else 'array'}")
+
+    for name, lists, vectors in JOBS:
+        lists, vectors = interp.compile(lists), interp.compile(vectors)
+        list_time, want = best(lambda: interp.run(lists))
+        vector_time, got = best(lambda: interp.run(vectors))
+        print(f"{name:<10} lists {list_time * 1000:9.2f} ms  vectors {vector_time * 1000:9.2f} ms"
+              f"  {list_time / vector_time:7.1f}x  {'ok' if want == got else f'MISMATCH {want} != {got}'}")
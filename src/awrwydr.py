@@ -1,44 +1,189 @@
 # from sys import stderr
 
 from os.path import dirname, join
-from colorama import Fore, Style
-import argparse
+from types import SimpleNamespace
+import atexit
+import io
+import json
+import os
+import sys
 
-from lex import Lexer
+from bytecode import Code
+from lex import Lexer, LexError, chunks
 from parse import Parser
-from vm import VM
+from vm import VM, BACKENDS
+from jit import THRESHOLD as JIT_THRESHOLD
+from optimize import optimize
+import native
+from profiler import Profiler
+import cache
 
 
 VERSION = "0.1.1"
 
+# Colours are for terminals; when the output goes anywhere else there's no need for them,
+# or for colorama.
+if sys.stdout.isatty():
+    from colorama import Fore, Style
+else:
+    class Fore:
+        RED = BLUE = RESET = ""
+    class Style:
+        BRIGHT = DIM = RESET_ALL = ""
+
 MESSAGE        = Style.BRIGHT + f"""*~ awrwydr v{VERSION} ~*\nEnter an s-expression!""" + Style.RESET_ALL
 PRELUDE_PATH   = join(dirname(__file__), "prelude.lisp")
 ERROR_PROMPT   = Fore.RED + ":: " + Fore.RESET
 SUCCESS_PROMPT = Fore.BLUE + ":: " + Fore.RESET
 
-argparser = argparse.ArgumentParser(prog="awrwydr", description="an hourglass Lisp")
-argparser.add_argument("-v", "--verbose", action="store_true")
-args = argparser.parse_args()
+DEFAULTS = dict(verbose=False, backend="stack", no_jit=False, optimize=False, no_cache=False, hashcons=False,
+                profile=False, profile_json=None, serve=None, workers=1, files=[])
+
+# Batch runs (`gen | awrwydr`) usually pass no arguments, so parsing them (and importing
+# argparse to do it) is skipped then.
+if len(sys.argv) > 1:
+    import argparse
+    argparser = argparse.ArgumentParser(prog="awrwydr", description="an hourglass Lisp")
+    argparser.add_argument("-v", "--verbose", action="store_true")
+    argparser.add_argument("-b", "--backend", choices=BACKENDS, help="how to execute code")
+    argparser.add_argument("--no-jit", action="store_true", help="never compile hot lambdas to Python")
+    argparser.add_argument("-O", "--optimize", action="store_true", help="optimize code before running it")
+    argparser.add_argument("--no-cache", action="store_true", help="never read or write compiled code next to source files")
+    argparser.add_argument("--hashcons", action="store_true", help="share equal lists instead of copying them")
+    argparser.add_argument("--profile", action="store_true", help="print where time went on exit (stack backend only)")
+    argparser.add_argument("--profile-json", metavar="FILE", help="write where time went to FILE as JSON on exit")
+    argparser.add_argument("--serve", metavar="ADDRESS", help="serve evaluations on a Unix socket path or [HOST:]PORT (see server.py)")
+    argparser.add_argument("--workers", type=int, help="how many processes serve evaluations")
+    argparser.add_argument("files", nargs="*", help="scripts to run instead of starting the REPL, `-` being stdin")
+    argparser.set_defaults(**DEFAULTS)
+    args = argparser.parse_args()
+else:
+    args = SimpleNamespace(**DEFAULTS)
+
+# Without a terminal to read from, whatever is piped in is run as a script.
+scripts = args.files or ([] if sys.stdin.isatty() or args.serve else ["-"])
 
-print(MESSAGE)
+if not scripts and not args.serve:
+    print(MESSAGE)
 
 # Awrwydr internals
+if args.hashcons:
+    native.hashconsing()
 lexer  = Lexer()
 parser = Parser()
-vm     = VM()
+vm     = VM(backend=args.backend, jit=None if args.no_jit else JIT_THRESHOLD)
+
+# What compiled code depends on besides its source, as far as the cache is concerned (see
+# cache.py): constant lists are built differently when they're hash-consed.
+FLAGS = ("O" if args.optimize else "") + ("H" if args.hashcons else "")
+
+# Scripts up to this many bytes are read in full and their code cached; bigger ones (and
+# stdin) are only ever streamed.
+CACHED_SCRIPT_SIZE = 1 << 20
+
+def build(code):
+    code = parser.parse(lexer.lex(code))
+    return optimize(code) if args.optimize else code
+
+def load(path):
+    """Compiles a library, like the prelude, or loads its compiled code from the cache (see
+    cache.py). Scripts are run as they're read instead (see `script`)."""
+    if args.no_cache:
+        with open(path, "r") as f:
+            return build(f.read())
+    return cache.load(path, build, VERSION, FLAGS)
+
+def describe(e):
+    if type(e) is LexError:
+        return f"<error at {e.line}:{e.column}: {e.args[0]}>"
+    return f"<error: {e.args[0]}>"
 
 # loading the prelude
 try:
-    with open(PRELUDE_PATH, "r") as f:
-        vm.run(parser.parse(lexer.lex(f.read())))
-    print(SUCCESS_PROMPT + Style.DIM + "<`prelude.lisp` loaded!>")
+    vm.run(load(PRELUDE_PATH))
+    if not scripts and not args.serve:
+        print(SUCCESS_PROMPT + Style.DIM + "<`prelude.lisp` loaded!>")
 except Exception as e:
     msg = Style.DIM + "<run with `-v` or `--verbose` to see error>"
     if args.verbose:
-        msg = Style.DIM + f"<error: {e.args[0]}>"
+        msg = Style.DIM + describe(e)
     print(ERROR_PROMPT + Style.DIM + "<`prelude.lisp` faulty or not found>")
     print(ERROR_PROMPT + msg)
 
+# serving evaluations instead of running anything here
+if args.serve:
+    import server
+    print(SUCCESS_PROMPT + Style.DIM + f"<serving on {args.serve} with {args.workers} worker(s)>", flush=True)
+    server.serve(args.serve, vm, args.workers, args.optimize)
+    sys.exit(0)
+
+# profiling what runs after the prelude
+if args.profile or args.profile_json:
+    try:
+        profiler = Profiler(vm)
+    except Exception as e:
+        print(ERROR_PROMPT + Style.DIM + describe(e))
+        sys.exit(1)
+
+    @atexit.register
+    def report():
+        profiler.stop()
+        if args.profile:
+            print(profiler.report(), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, "w") as f:
+                json.dump(profiler.results(), f, indent=2)
+
+    profiler.start()
+
+def script(stream, compiled=None):
+    """Runs a script one top-level expression at a time, as it's read, printing what each
+    one evaluates to. The code of each is also appended to `compiled`, if given."""
+    for expr in lexer.read(chunks(stream)):
+        code = parser.parse((expr,))
+        code = optimize(code) if args.optimize else code
+        if compiled is not None:
+            compiled.append(code)
+        execute(code)
+
+def execute(code):
+    vm.run(code)
+    if vm.size() > 0:
+        print(SUCCESS_PROMPT + str(vm.stack.pop()))
+
+def cached_script(path):
+    """Runs a script small enough to read in full, from its cached code if that's fresh.
+    That code holds the code of each top-level expression as a constant, so they're still
+    run (and their values printed) one by one, exactly as `script` would; and it's only
+    cached once the whole script has been read and run without an error."""
+    with open(path, "rb") as f:
+        source = f.read()
+    key = cache.header(source, VERSION, FLAGS)
+    code = cache.fetch(path, key)
+    if code is not None:
+        for expr in code.consts:
+            execute(expr)
+        return
+    compiled = []
+    script(io.BytesIO(source), compiled)
+    cache.save(path, key, Code((), compiled))
+
+# running scripts
+for path in scripts:
+    try:
+        if path == "-":
+            script(sys.stdin.buffer)
+        elif not args.no_cache and os.path.getsize(path) <= CACHED_SCRIPT_SIZE:
+            cached_script(path)
+        else:
+            with open(path, "rb") as f:
+                script(f)
+    except Exception as e:
+        print(ERROR_PROMPT + Style.DIM + f"<{path}> " + describe(e))
+        sys.exit(1)
+if scripts:
+    sys.exit(0)
+
 # REPL loop
 while True:
     try:
@@ -52,9 +197,9 @@ while True:
             break
 
     try:
-        vm.run(parser.parse(lexer.lex(code)))
+        vm.run(build(code))
     except Exception as e:
-        print(ERROR_PROMPT + Style.DIM + f"<error: {e.args[0]}>")
+        print(ERROR_PROMPT + Style.DIM + describe(e))
     
     if vm.size() > 0:
         print(SUCCESS_PROMPT + str(vm.stack.pop()))
\ No newline at end of file
@@ -0,0 +1,96 @@
+# Budgets: limits on how much one evaluation may do, for running code nobody vouched for
+# (see server.py) without letting `(define loop (λ (x) (loop x)))` pin a core or a
+# runaway list builder eat the machine's memory.
+#
+#     budget = Budget(instructions=10**7, depth=500, allocations=10**6)
+#     vm.run(code, budget)     # raises `BudgetExceeded` if any of them is exceeded
+#     budget.usage()           # {"instructions": ..., "depth": ..., "allocations": ...}
+#
+# A budget limits
+#
+# - `instructions`: how many VM instructions the code runs, counted coarsely: every run of
+#   a code object, that is every call of a lambda (tail calls and JIT-compiled ones
+#   included) and every top-level run, counts all the instructions in it, whichever
+#   branches it takes, plus one for returning (`Code.cost`, worked out when it's
+#   compiled). That's at most a few times as many as it really runs, and the same on
+#   every backend;
+# - `depth`: how many lambda calls deep the code gets (tail calls don't count, as they
+#   don't nest);
+# - `allocations`: how many list cells and lambdas are made.
+#
+# Any of them can be left out (None), for no limit, which is kept as `math.inf`; the
+# counters go up either way, and can be read after the run for capacity planning. A
+# budget can be passed to several runs (say, every expression of a request), and then
+# limits them all together.
+#
+# Code runs under a budget however the VM runs it: on the stack VM or the closure
+# backend, calling what the JIT compiled (in a variant of it that counts, see jit.py).
+# Each of them charges a call where it makes it (compiled code, for calls of itself, just
+# before the statement making them), as cheaply as it can: adding the cost, and only
+# calling `settle` when it passes `horizon` or the call is the deepest yet. `settle`
+# checks everything against the limits and sets the horizon at most `BATCH` instructions
+# further, so instructions are enforced on the call that goes over, depth exactly, and
+# allocations (counted by the natives building lists and wherever lambdas
+# are made) a little late: a budget can be overrun by up to `BATCH` instructions' worth
+# of them, and by however many cells one native call makes.
+#
+# Calls on the stack VM are as deep as its continuation stack (`VM.conts`); `level` is how
+# many calls are running outside of it, made by Python (natives calling lambdas, the
+# closure backend, compiled code) rather than by the VM's own loop. Compiled code keeps
+# its own count instead, and only sets `level` for what it calls through Python.
+
+from math import inf
+
+BATCH = 1024 # instructions between full checks
+
+class BudgetExceeded(Exception):
+    """Raised when code goes over one of the limits of its `Budget`."""
+
+    def __init__(self, limit, value):
+        super().__init__(f"{limit} budget of {value} exceeded")
+        self.limit = limit # which: "instructions", "depth" or "allocations"
+        self.value = value # what it was
+
+class Budget:
+    __slots__ = ("instructions", "depth", "allocations", "executed", "deepest", "allocated", "level",
+                 "horizon")
+
+    def __init__(self, instructions=None, depth=None, allocations=None):
+        self.instructions = inf if instructions is None else instructions # the limits
+        self.depth = inf if depth is None else depth
+        self.allocations = inf if allocations is None else allocations
+        self.executed = 0  # instructions executed so far
+        self.deepest = 0   # how many calls deep the code has been (never more than `depth`)
+        self.allocated = 0 # list cells and lambdas made so far
+        self.level = 0     # how many calls are running outside the VM's continuation stack
+        self.horizon = min(self.instructions, BATCH) # how far `executed` goes before `settle`
+
+    def charge(self, cost, depth):
+        """Counts a run of code costing `cost`, in a call `depth` deep."""
+        self.executed += cost
+        if self.executed > self.horizon or depth > self.deepest:
+            self.settle(depth)
+
+    def settle(self, depth=0):
+        """Notes that calls are `depth` deep and checks the limits, raising if any of them
+        has been exceeded, then sets the next horizon."""
+        if depth > self.deepest:
+            if depth > self.depth:
+                raise BudgetExceeded("depth", self.depth)
+            self.deepest = depth
+        self.check()
+        self.horizon = min(self.instructions, self.executed + BATCH)
+
+    def check(self):
+        """Raises if any of the limits has been exceeded."""
+        if self.executed > self.instructions:
+            raise BudgetExceeded("instructions", self.instructions)
+        if self.allocated > self.allocations:
+            raise BudgetExceeded("allocations", self.allocations)
+
+    def usage(self):
+        """Returns what the runs under this budget have used, as a JSON-friendly dict."""
+        return {"instructions": self.executed, "depth": self.deepest, "allocations": self.allocated}
+
+    def __repr__(self):
+        return f"<budget {self.usage()}>"
@@ -0,0 +1,50 @@
+from array import array
+
+from ops import OPARITY
+
+# The compiled form of awrwydr code. The parser used to emit a Python list mixing int
+# opcodes with strings, parameter lists and nested code lists; now every instruction and
+# every operand is a plain int in a typed `array`, and whatever those ints refer to lives
+# off to the side:
+#
+# - `ops`     the instruction stream, `array('i')`,
+# - `consts`  the constant pool: atoms, native function names and nested `Code` objects
+#             (lambda bodies), referred to by index,
+# - `locals`  the names of this code's frame slots (parameters first); only kept for
+#             disassembly and error messages, the VM itself never looks at them.
+#
+# Global names are referred to by their index in `env.SYMBOLS`. Execution backends other
+# than the stack VM may cache their own translation of a code object in `compiled`.
+#
+# `cost` is what running the code once counts against a budget (see budget.py): how many
+# instructions it holds, plus one for returning.
+
+class Code:
+    __slots__ = ("ops", "consts", "nparams", "locals", "nlocals", "compiled", "cost")
+
+    def __init__(self, ops, consts, nparams=0, locals=()):
+        self.ops = array('i', ops)
+        self.consts = tuple(consts)
+        self.nparams = nparams      # how many leading slots are parameters
+        self.locals = tuple(locals) # slot -> name
+        self.nlocals = len(self.locals)
+        self.compiled = None
+        self.cost = count(self.ops) + 1
+
+    @property
+    def params(self):
+        return self.locals[:self.nparams]
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return f"<code ({' '.join(self.params)}) {len(self.ops)} words>"
+
+def count(ops):
+    """Returns how many instructions there are in `ops`."""
+    n = pc = 0
+    while pc < len(ops):
+        pc += OPARITY[ops[pc]] + 1
+        n += 1
+    return n
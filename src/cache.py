@@ -0,0 +1,180 @@
+from array import array
+from hashlib import sha256
+import marshal
+import os
+import sys
+
+from bytecode import Code
+from cons import Cons, hashcons
+from env import SITES, SYMBOLS
+from native import NATIVES, TABLE
+from pvector import PVector
+from vector import Vector
+import native
+import pvector
+import vector
+from ops import *
+import ops
+
+# The compiled-code cache. Compiling a source file (say, the prelude) gives a `Code`, which
+# is saved right next to it, like CPython's `.pyc`s:
+#
+#     prelude.lisp -> prelude.awc
+#
+# and the next time the same file is loaded the code is read back instead of lexing and
+# parsing it all over again.
+#
+# A cache file starts with a header holding everything the code depends on: the hash of
+# the source, the interpreter's version, the version of the instruction set, anything
+# else the caller says matters (like whether the code was optimized) and how ints are
+# laid out in memory. If any of that doesn't match, the file is simply recompiled and
+# the cache overwritten. The rest of the file is the code, `marshal`led.
+#
+# Code refers to globals and natives by their index in `env.SYMBOLS` and `native.TABLE`,
+# which are only valid within one process, so the file lists the names of the globals
+# and natives it uses, and the instructions refer to those lists. When the file is
+# loaded, the names are interned and the instructions pointed back at the real indexes.
+# Calls of globals are given new call site indexes (see `env.SITES`) the same way.
+
+MAGIC = b"AWRC"
+FORMAT = 1 # the layout of cache files themselves
+
+SUFFIX = ".awc"
+
+# Which positional argument of these instructions is a global's index...
+GLOBAL_OPERAND = {OP_DEFINE: 0, OP_FIND: 0, OP_FIND_CALL1: 0, OP_FIND_CALL2: 0, OP_FIND_EVAL: 0,
+                  OP_FIND_TAIL_EVAL: 0}
+# ...and which one is a call site's.
+SITE_OPERAND = {OP_FIND_EVAL: 2, OP_FIND_TAIL_EVAL: 2}
+# ...and which one is a native's.
+NATIVE_OPERAND = {OP_CALL: 0, OP_CALL1: 0, OP_CALL2: 0, OP_LOCAL_CALL1: 1, OP_LOCAL_CALL2: 1,
+                  OP_FIND_CALL1: 1, OP_FIND_CALL2: 1, OP_ATOM_CALL2: 1}
+
+def location(path):
+    """Returns where the compiled code of the source file at `path` is cached."""
+    return os.path.splitext(path)[0] + SUFFIX
+
+def header(source, version, flags=""):
+    layout = f"{sys.byteorder}{array('i').itemsize}"
+    key = f"{FORMAT}:{version}:{ops.VERSION}:{flags}:{layout}:".encode() + sha256(source).digest()
+    return MAGIC + sha256(key).digest()
+
+def load(path, compile, version, flags=""):
+    """Returns the compiled code of the source file at `path`, from the cache if it's fresh
+    and from `compile` (which takes the source and returns a `Code`) otherwise, caching it
+    for next time. `version` and `flags` are part of what makes a cached copy fresh."""
+    with open(path, "rb") as f:
+        source = f.read()
+    key = header(source, version, flags)
+    code = fetch(path, key)
+    if code is None:
+        code = compile(source.decode())
+        save(path, key, code)
+    return code
+
+def fetch(path, key):
+    """Returns the code cached for the source file at `path` if its header is `key` (see
+    `header`), or None."""
+    try:
+        with open(location(path), "rb") as f:
+            data = f.read()
+        if data.startswith(key):
+            return loads(data[len(key):])
+    except Exception:
+        pass # missing, unreadable or corrupt; same thing as far as we're concerned
+    return None
+
+def save(path, key, code):
+    """Caches `code` as the compiled code of the source file at `path`, under the header `key`."""
+    cached = location(path)
+    try:
+        # write and rename, so that another process never reads a half-written file
+        temp = f"{cached}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(key + dumps(code))
+        os.replace(temp, cached)
+    except OSError:
+        pass # a read-only directory just means no caching
+
+def dumps(code):
+    """Serializes a `Code` (and the code objects nested in it)."""
+    globals, natives = {}, {} # real index -> index in the file
+    tree = dump(code, globals, natives)
+    return marshal.dumps((tree, tuple(SYMBOLS.names[idx] for idx in globals),
+                          tuple(TABLE[idx].name for idx in natives)))
+
+def dump(code, globals, natives):
+    words = array('i', code.ops)
+    pc = 0
+    while pc < len(words):
+        op = words[pc]
+        if op in GLOBAL_OPERAND:
+            pos = pc + 1 + GLOBAL_OPERAND[op]
+            words[pos] = globals.setdefault(words[pos], len(globals))
+        if op in NATIVE_OPERAND:
+            pos = pc + 1 + NATIVE_OPERAND[op]
+            words[pos] = natives.setdefault(words[pos], len(natives))
+        if op in SITE_OPERAND:
+            words[pc + 1 + SITE_OPERAND[op]] = 0
+        pc += OPARITY[op] + 1
+    return (words.tobytes(), tuple(value(const, globals, natives) for const in code.consts),
+            code.nparams, code.locals)
+
+def value(val, globals, natives):
+    # Atoms are stored as they are; code objects, lists and vectors (literal ones, or
+    # constants optimize.py folded), which marshal can't store, become tuples, which are
+    # never atoms. `case` tables are dicts of atoms, which it can.
+    if type(val) is Code:
+        return ("code", dump(val, globals, natives))
+    if type(val) is Vector:
+        return ("vector", val.kind, val.items())
+    if type(val) is PVector:
+        return ("pvector", tuple(value(item, globals, natives) for item in val))
+    if type(val) is Cons:
+        items = []
+        while type(val) is Cons:
+            items.append(value(val.car, globals, natives))
+            val = val.cdr
+        return ("list", tuple(items), value(val, globals, natives))
+    return val
+
+def loads(data):
+    """Deserializes what `dumps` returned."""
+    tree, names, natives = marshal.loads(data)
+    globals = [SYMBOLS.intern(name) for name in names]
+    natives = [NATIVES[name].index for name in natives]
+    return load_code(tree, globals, natives)
+
+def load_code(tree, globals, natives):
+    raw, consts, nparams, locals = tree
+    words = array('i')
+    words.frombytes(raw)
+    pc = 0
+    while pc < len(words):
+        op = words[pc]
+        if op in GLOBAL_OPERAND:
+            pos = pc + 1 + GLOBAL_OPERAND[op]
+            words[pos] = globals[words[pos]]
+        if op in NATIVE_OPERAND:
+            pos = pc + 1 + NATIVE_OPERAND[op]
+            words[pos] = natives[words[pos]]
+        if op in SITE_OPERAND:
+            words[pc + 1 + SITE_OPERAND[op]] = next(SITES)
+        pc += OPARITY[op] + 1
+    return Code(words, [load_value(const, globals, natives) for const in consts], nparams, locals)
+
+def load_value(val, globals, natives):
+    if type(val) is not tuple:
+        return val
+    if val[0] == "code":
+        return load_code(val[1], globals, natives)
+    if val[0] == "vector":
+        return vector.make(val[2], val[1])
+    if val[0] == "pvector":
+        return pvector.make([load_value(item, globals, natives) for item in val[1]])
+    _, items, tail = val
+    make = hashcons if native.HASHCONS else Cons
+    lst = load_value(tail, globals, natives)
+    for item in reversed(items):
+        lst = make(load_value(item, globals, natives), lst)
+    return lst
@@ -0,0 +1,240 @@
+from lambdaobj import Lambda, TailCall
+from env import Frame, SYMBOLS, UNBOUND, VERSIONS
+from ops import *
+from decompile import decompile
+from native import NATIVES
+import jit
+
+# The closure-compiling backend, an alternative to running code through the stack VM's
+# `optable` loop. Instead of interpreting a code object one instruction at a time, it is
+# translated once into a tree of nested Python closures, each of which computes the value
+# of one subexpression; running the code is then just calling the root closure.
+#
+# The translation works on the microcode rather than on the source, so both backends
+# share the one parser: decompile.py recovers the expression trees, and every node of
+# those becomes a closure.
+#
+# Every closure takes the VM (for globals and natives) and the current frame, and returns
+# either a value, `NOTHING` when the expression doesn't leave one on the stack (a `define`;
+# a `cond` or `case` where nothing matches is nil, the parser making sure of it) or, for
+# calls in tail position, a `TailCall` that `apply` then runs without growing the Python
+# stack.
+#
+# Under a budget (see budget.py), `apply` charges every call it runs, and lambdas made
+# count as allocations, as on the stack VM.
+
+# What an expression that leaves nothing on the VM stack evaluates to. Never a language value.
+NOTHING = type("Nothing", (), {"__repr__": lambda self: "<nothing>"})()
+
+def run(vm, code):
+    """Runs top-level `code`, leaving the values it evaluates to on `vm.stack`."""
+    if code.compiled is None:
+        code.compiled = build(code)
+    for node in code.compiled:
+        val = node(vm, None)
+        if val is not NOTHING:
+            vm.stack.append(val)
+
+def apply(vm, fn, args):
+    """Calls `fn` with `args` (in parameter order) and returns its result."""
+    budget = vm.budget
+    while True:
+        if type(fn) is not Lambda:
+            raise Exception(f"{fn}: not a lambda")
+        code = fn.code
+        if len(args) != code.nparams:
+            raise Exception(f"lambda/{code.nparams}: invalid number of arguments")
+
+        func = jit.lookup(vm, fn) if vm.jit is not None else None
+        if func is not None:
+            # counting the Python calls of the closures between here and `vm.depth` too,
+            # so compiled code hands off to the stack VM before the real stack runs out
+            val = func(vm, fn.env, *args, vm.depth + 8)
+        else:
+            if code.nlocals != code.nparams:
+                args += [UNBOUND] * (code.nlocals - code.nparams)
+            if code.compiled is None:
+                code.compiled = sequence(build(code))
+            if budget is None:
+                val = code.compiled(vm, Frame(args, fn.env))
+            else:
+                # a call outside the VM's continuation stack, charged right here rather than
+                # through a function, which would cost another Python frame per call
+                budget.level = level = budget.level + 1
+                try:
+                    budget.executed = executed = budget.executed + code.cost
+                    if executed > budget.horizon or level + len(vm.conts) > budget.deepest:
+                        budget.settle(level + len(vm.conts))
+                    val = code.compiled(vm, Frame(args, fn.env))
+                finally:
+                    budget.level = level - 1
+        if type(val) is TailCall:
+            fn, args = val.fn, val.args
+            continue
+        return None if val is NOTHING else val # a body that evaluates to nothing returns nil
+
+def build(code):
+    """Translates `code` into closures and returns the ones for each top-level expression."""
+    return [closure(node) for node in decompile(code)]
+
+def closure(node):
+    """Translates one tree from `decompile` into a closure."""
+    tag = node[0]
+    if tag == "atom":
+        return atom(node[1])
+    elif tag == "find":
+        return find(node[1])
+    elif tag == "local":
+        return local(node[1], node[2])
+    elif tag == "deref":
+        return deref(node[1], node[2], node[3])
+    elif tag == "define":
+        return define(node[1], closure(node[2]))
+    elif tag == "setlocal":
+        return setLocal(node[1], closure(node[2]))
+    elif tag == "native":
+        return native(node[1], [closure(arg) for arg in node[2]])
+    elif tag == "lambda":
+        return lambda_(node[1])
+    elif tag == "call":
+        return call(closure(node[1]), [closure(arg) for arg in node[2]], node[3])
+    elif tag == "cond":
+        return cond([(closure(test), sequence([closure(n) for n in body])) for test, body in node[1]])
+    elif tag == "case":
+        _, key, pairs, default = node
+        return case(closure(key), [(keys, sequence([closure(n) for n in body])) for keys, body in pairs],
+                    sequence([closure(n) for n in default]) if default is not None else None)
+    elif tag == "dis":
+        return dis(node[1], node[2], node[3])
+
+# What follows are the closure factories for each kind of expression.
+
+def atom(val):
+    return lambda vm, frame: val
+
+def find(idx):
+    def node(vm, frame):
+        val = vm.globals[idx]
+        if val is UNBOUND:
+            raise Exception(f"symbol \"{SYMBOLS.names[idx]}\" not defined")
+        return val
+    return node
+
+def local(slot, name):
+    def node(vm, frame):
+        val = frame.slots[slot]
+        if val is UNBOUND:
+            raise Exception(f"symbol \"{name}\" not defined")
+        return val
+    return node
+
+def deref(depth, slot, name):
+    def node(vm, frame):
+        for _ in range(depth):
+            frame = frame.parent
+        val = frame.slots[slot]
+        if val is UNBOUND:
+            raise Exception(f"symbol \"{name}\" not defined in enclosing lambda")
+        return val
+    return node
+
+def define(idx, value):
+    def node(vm, frame):
+        vm.globals[idx] = value(vm, frame)
+        vm.version = next(VERSIONS)
+        if idx in vm.watchers:
+            vm.redefined(idx)
+        return NOTHING
+    return node
+
+def setLocal(slot, value):
+    def node(vm, frame):
+        frame.slots[slot] = value(vm, frame)
+        return NOTHING
+    return node
+
+def native(name, args):
+    # `args` are in the order the VM would push them, i.e. last argument first, and are
+    # evaluated in that order too
+    fn = NATIVES[name].fn
+    if len(args) == 1:
+        arg, = args
+        return lambda vm, frame: fn(vm, arg(vm, frame))
+    if len(args) == 2:
+        second, first = args
+        binary = NATIVES[name].binary
+        def node(vm, frame):
+            b = second(vm, frame)
+            return binary(vm, first(vm, frame), b)
+        return node
+
+    def node(vm, frame):
+        vals = [arg(vm, frame) for arg in args]
+        vals.reverse()
+        return fn(vm, *vals)
+    return node
+
+def lambda_(code):
+    def node(vm, frame):
+        if vm.budget is not None:
+            vm.budget.allocated += 1
+        return Lambda(code, frame)
+    return node
+
+def call(fn, args, tail):
+    # `args` are in the order the VM would push them, i.e. last parameter first
+    def node(vm, frame):
+        vals = [arg(vm, frame) for arg in args]
+        vals.reverse()
+        if tail:
+            return TailCall(fn(vm, frame), vals)
+        return apply(vm, fn(vm, frame), vals)
+    return node
+
+def cond(pairs):
+    def node(vm, frame):
+        for test, body in pairs:
+            if test(vm, frame):
+                return body(vm, frame)
+        return None
+    return node
+
+def case(key, pairs, default):
+    table = {}
+    for keys, body in pairs:
+        for k in keys:
+            table[k] = body
+    default = default or atom(None)
+    def node(vm, frame):
+        k = key(vm, frame) # outside the `try`, so its own TypeErrors get through
+        try:
+            body = table.get(k, default)
+        except TypeError:
+            body = default # an unhashable key
+        return body(vm, frame)
+    return node
+
+def sequence(nodes):
+    """Combines closures into one that evaluates to the value the last of them leaves."""
+    if len(nodes) == 1:
+        return nodes[0]
+    def node(vm, frame):
+        result = NOTHING
+        for node in nodes:
+            val = node(vm, frame)
+            if val is not NOTHING:
+                result = val
+        return result
+    return node
+
+def dis(code, start, stop):
+    def node(vm, frame):
+        pc = start
+        while pc < stop:
+            print(describe(code, pc))
+            if code.ops[pc] == OP_LAMBDA:
+                for line in disassemble(code.consts[code.ops[pc+1]], "    "):
+                    print(line)
+            pc += OPARITY[code.ops[pc]] + 1
+        return NOTHING
+    return node
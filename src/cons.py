@@ -1,46 +1,169 @@
+import sys
+
+# The cons cell, Awrwydr's one compound data type. Everything here walks lists with
+# loops rather than recursion, so lists of any length can be iterated, measured and
+# printed in linear time.
+#
+# Cells compare (`==`, which `eq?` uses) and hash structurally, so lists can be dict keys.
+# A cell is just its `car` and `cdr`, as lists are built all the time and a cell with
+# more slots is bigger and slower to make: only hash-consed cells (see below) have their
+# hash kept, in `HASHES`, and the hash of any other list is worked out again each time.
 class Cons:
+    __slots__ = ("car", "cdr")
+
     def __init__(self, car, cdr):
         self.car = car
         self.cdr = cdr
 
+    def __eq__(self, other):
+        if type(other) is not Cons:
+            return NotImplemented
+        a, b = self, other
+        while type(a) is Cons and type(b) is Cons:
+            if a is b:
+                return True
+            if HASHES:
+                ha, hb = HASHES.get(id(a)), HASHES.get(id(b))
+                if ha is not None and hb is not None and ha != hb:
+                    return False # which, with hash-consed lists, is how most comparisons end
+            if not (a.car is b.car or a.car == b.car):
+                return False
+            a, b = a.cdr, b.cdr
+        return a is b or (type(a) is not Cons and type(b) is not Cons and a == b)
+
+    def __hash__(self):
+        # a cell hashes as `hash((car, hash(cdr)))`, worked out from the last cell without
+        # a known hash back to this one, so long lists don't recurse
+        cells = []
+        obj = self
+        while type(obj) is Cons and id(obj) not in HASHES:
+            cells.append(obj)
+            obj = obj.cdr
+        h = HASHES[id(obj)] if type(obj) is Cons else hash(obj)
+        for cell in reversed(cells):
+            h = hash((cell.car, h))
+        return h
+
     def __repr__(self):
-        result = '('
+        parts = []
         obj = self
         while True:
-            result += str(obj.car)
-            if obj.cdr is None:
-                break
-            result += ' '
+            parts.append(str(obj.car))
             if type(obj.cdr) is not Cons:
-                result += f". {obj.cdr}"
                 break
             obj = obj.cdr
-        
-        result += ')'
-        return result
+        if obj.cdr is not None:
+            parts.append(f". {obj.cdr}")
+        return '(' + ' '.join(parts) + ')'
     
     # With this we can iterate over a cons like a list.
     def __iter__(self):
-        yield self.car
-        if type(self.cdr) is Cons:
-            yield from self.cdr
-        elif self.cdr is not None:
-            yield self.cdr
+        obj = self
+        while type(obj) is Cons:
+            yield obj.car
+            obj = obj.cdr
+        if obj is not None:
+            yield obj
 
     def __reversed__(self):
-        return reversed(list(self.__iter__())) # lazy but works for our purposes
+        items = self.items()
+        items.reverse()
+        return iter(items)
+
+    def items(self):
+        """Returns the elements as a Python list, in a single walk (`list(self)` takes two,
+        as it asks for the length first)."""
+        items = []
+        obj = self
+        while type(obj) is Cons:
+            items.append(obj.car)
+            obj = obj.cdr
+        if obj is not None:
+            items.append(obj)
+        return items
 
     def append(self, value):
-        """Appends a value to the end of the linked list."""
+        """Appends a value to the end of the linked list. Walks the whole list, so
+        prefer `ListBuilder` when building one element at a time."""
         if self.car is None and value is not None:
             self.car = value
-        elif type(self.cdr) is not Cons:
-            # basically we ignore the last cdr of an ill-formed list,
-            # we're only using this function on lex-time (well-formed) lists anyway
-            self.cdr = Cons(value, None)
-        else:
-            self.cdr.append(value)
+            return
+        obj = self
+        # basically we ignore the last cdr of an ill-formed list,
+        # we're only using this function on lex-time (well-formed) lists anyway
+        while type(obj.cdr) is Cons:
+            obj = obj.cdr
+        obj.cdr = Cons(value, None)
 
     def __len__(self):
-        return len(list(self.__iter__()))
-    
+        count = 0
+        obj = self
+        while type(obj) is Cons:
+            count += 1
+            obj = obj.cdr
+        if obj is not None:
+            count += 1
+        return count
+
+# Builds a well-formed list front to back in O(1) per element by keeping track of its
+# last cell.
+class ListBuilder:
+    __slots__ = ("head", "tail")
+
+    def __init__(self):
+        self.head = None
+        self.tail = None
+
+    def add(self, value):
+        cell = Cons(value, None)
+        if self.tail is None:
+            self.head = cell
+        else:
+            self.tail.cdr = cell
+        self.tail = cell
+
+    def build(self):
+        """Returns the list built so far; an empty one is `Cons(None, None)`, like `()`."""
+        return self.head if self.head is not None else Cons(None, None)
+
+# Hash-consing: `hashcons` makes sure there's only ever one cell with a given `car` and
+# `cdr` (told apart by type too, so `(1)` and `(true)` stay two lists), returning the
+# existing one if there is. Lists built only out of such cells are shared instead of
+# copied, and two of them are equal exactly when they are the same object, so `eq?` on
+# them takes constant time whatever their length.
+#
+# Plain cells can't be weakly referenced (that takes a slot too), so `CELLS` holds the
+# cells it knows; `sweep` drops the ones nothing else holds any more whenever the table
+# has doubled since the last time, newest first, so a list goes in one pass (its later
+# cells are only held by the earlier ones).
+#
+# It's off by default; `native.hashconsing` turns it on for the natives that build lists,
+# and everything else building lists at runtime (the JIT, `quote`, the code cache) follows.
+
+CELLS = {}  # (type of car, car, type of cdr, cdr) -> cell, lists by identity
+HASHES = {} # id of each cell in `CELLS` -> its hash
+SWEEP = 1024 # how big `CELLS` can get before the next sweep
+
+def hashcons(car, cdr):
+    """Returns the one cell holding `car` and `cdr`."""
+    key = (type(car), id(car) if type(car) is Cons else car, type(cdr), id(cdr) if type(cdr) is Cons else cdr)
+    try:
+        cell = CELLS.get(key)
+        if cell is None:
+            h = hash((car, hash(cdr)))
+            if len(CELLS) >= SWEEP:
+                sweep()
+            cell = CELLS[key] = Cons(car, cdr)
+            HASHES[id(cell)] = h
+    except TypeError:
+        return Cons(car, cdr) # holding something unhashable, which can't be shared
+    return cell
+
+def sweep():
+    """Forgets the hash-consed cells nothing but `CELLS` holds."""
+    global SWEEP
+    for key in reversed(list(CELLS)):
+        cell = CELLS[key]
+        if sys.getrefcount(cell) <= 3: # `CELLS`, `cell` and getrefcount's argument
+            del CELLS[key], HASHES[id(cell)]
+    SWEEP = max(1024, 2 * len(CELLS))
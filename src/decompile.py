@@ -0,0 +1,174 @@
+from ops import *
+from native import TABLE
+
+# Recovers the expression structure of microcode. It's the hourglass turned back over:
+# we walk the RPN instructions with a stack, but a stack of expression trees instead of
+# values. An OP_ATOM pushes an `atom` node, an OP_CALL pops the nodes of its arguments
+# and pushes a `native` node holding them, and so on. `cond`'s jumps are recognised by
+# their shape (see `decompile`), and `case`'s by where its OP_SWITCH goes.
+#
+# Backends that translate code into something else (closures.py, jit.py) work on these
+# trees rather than on the instruction stream directly. Nodes are tuples tagged by their
+# first element:
+#
+#     ("atom", value)
+#     ("find", symbol index)
+#     ("local", slot, name)
+#     ("deref", depth, slot, name)
+#     ("define", symbol index, value node)
+#     ("setlocal", slot, value node)
+#     ("native", name, argument nodes)
+#     ("lambda", code)
+#     ("call", function node, argument nodes, tail?)
+#     ("cond", [(test node, body nodes), ...])
+#     ("case", key node, [(keys, body nodes), ...], default body nodes or None)
+#     ("dis", code, start, stop)
+#
+# Argument nodes are always listed in the order the VM evaluates them, i.e. last
+# argument first.
+
+def decompile(code, start=0, end=None, ends=()):
+    """Returns the trees of the instructions of `code` from `start` up to `end`; i.e. one
+    for every value the VM would have left on the stack, plus `define`s. Jumping to any
+    address in `ends` is as good as jumping to `end`."""
+    ops, consts = code.ops, code.consts
+    end = len(ops) if end is None else end
+    ends = {end, *ends}
+    stack = [] # nodes, in the order the VM would have pushed their values
+    conds = [] # [end address, stack height, (test, body) pairs] of each open `cond`
+
+    pc = start
+    while pc < end:
+        while conds and conds[-1][0] == pc:
+            close(conds.pop(), stack)
+
+        op = ops[pc]
+        if op in (OP_ATOM, OP_FIND, OP_LOCAL):
+            stack.append(leaf(code, op, ops[pc+1]))
+        elif op == OP_DEREF:
+            stack.append(("deref", ops[pc+1], ops[pc+2], consts[ops[pc+3]]))
+        elif op == OP_DEFINE:
+            stack.append(("define", ops[pc+1], stack.pop()))
+        elif op == OP_SET_LOCAL:
+            stack.append(("setlocal", ops[pc+1], stack.pop()))
+        elif op in CALLS:
+            if op in FUSED:
+                # a superinstruction is the instruction it fused and the call
+                stack.append(leaf(code, FUSED[op], ops[pc+1]))
+                argc, native = CALLS[op] + 1, ops[pc+2]
+            else:
+                argc = ops[pc+2] if op == OP_CALL else CALLS[op]
+                native = ops[pc+1]
+            base = len(stack) - argc
+            stack[base:] = [("native", TABLE[native].name, stack[base:])]
+        elif op == OP_LAMBDA:
+            stack.append(("lambda", consts[ops[pc+1]]))
+        elif op in (OP_EVAL, OP_TAIL_EVAL):
+            fn = stack.pop()
+            base = len(stack) - ops[pc+1]
+            stack[base:] = [("call", fn, stack[base:], op == OP_TAIL_EVAL)]
+        elif op in EVALS:
+            base = len(stack) - ops[pc+2]
+            stack[base:] = [("call", ("find", ops[pc+1]), stack[base:], op == OP_FIND_TAIL_EVAL)]
+        elif op == OP_UP_DIS:
+            # everything up to the matching OP_DOWN_DIS is only ever printed
+            depth, stop = 0, pc
+            while True:
+                if ops[stop] == OP_UP_DIS:
+                    depth += 1
+                elif ops[stop] == OP_DOWN_DIS:
+                    depth -= 1
+                    if depth == 0:
+                        break
+                stop += OPARITY[ops[stop]] + 1
+            stack.append(("dis", code, pc + 1, stop))
+            pc = stop
+        elif op == OP_SWITCH:
+            stack.append(case(code, pc, stack.pop(), ends))
+            pc += ops[pc+3]
+            continue
+        elif op == OP_JIF:
+            # A `cond` pair compiles to
+            #     COND JIF(a) EXPR JUMP(b)
+            # where `a` skips to the next pair and `b` to the end of the whole `cond`. The
+            # JUMP may be missing on the last pair, in which case the `cond` ends at `a`.
+            #
+            # Optimized code (see optimize.py) may also have a `cond` end in a catch-all
+            # EXPR without a test, and jumps that skip straight to the end of an enclosing
+            # `cond` rather than to the end of their own; as far as the inner one is
+            # concerned those go to its end just the same.
+            target = pc + ops[pc+1]
+            target = end if target in ends else target
+            last = p = pc + 2
+            while p < target:
+                last = p
+                p += OPARITY[ops[p]] + 1
+
+            test = stack.pop()
+            if last < target and ops[last] == OP_JUMP:
+                stop = last + ops[last+1]
+                stop = end if stop in ends else stop
+                body = decompile(code, pc + 2, last, {stop} | ends if stop == end else {stop})
+            else:
+                stop = target
+                body = decompile(code, pc + 2, target, ends if stop == end else ())
+
+            if conds and conds[-1][0] == stop and conds[-1][1] == len(stack):
+                conds[-1][2].append((test, body))
+            else:
+                conds.append([stop, len(stack), [(test, body)]])
+            pc = target
+            continue
+        else:
+            raise Exception(f"{OPNAMES[op]}: cannot be decompiled")
+        pc += OPARITY[op] + 1
+
+    while conds:
+        close(conds.pop(), stack)
+    return stack
+
+def leaf(code, op, arg):
+    """Returns the node of an OP_ATOM, OP_FIND or OP_LOCAL with the positional argument `arg`."""
+    if op == OP_ATOM:
+        return ("atom", code.consts[arg])
+    elif op == OP_FIND:
+        return ("find", arg)
+    return ("local", arg, code.locals[arg])
+
+def case(code, pc, key, ends):
+    """Returns the node of the `case` whose OP_SWITCH is at `pc`, on the `key` node;
+    `ends` are as good as the end of the code being decompiled."""
+    # A `case` compiles to
+    #     KEY SWITCH(table, default, end) EXPR JUMP(end) EXPR JUMP(end) ... [DEFAULT]
+    # where the table maps each key to the EXPR it runs. The EXPRs follow each other in
+    # the order of the addresses in the table, so each one ends where the next starts,
+    # the last one at `end`; their JUMPs, like those of `cond`, may be missing (on the
+    # last one) or skip straight to the end of an enclosing `cond` or `case`.
+    ops, table = code.ops, code.consts[code.ops[pc+1]]
+    default, end = pc + ops[pc+2], pc + ops[pc+3]
+    keys = {} # address -> the keys that go there
+    for k, off in table.items():
+        keys.setdefault(pc + off, []).append(k)
+    starts = sorted({*keys, default} - {end})
+    ends = {end} | ends if end in ends else {end}
+
+    bodies = {}
+    for start, stop in zip(starts, starts[1:] + [end]):
+        last = p = start
+        while p < stop:
+            last = p
+            p += OPARITY[ops[p]] + 1
+        if ops[last] == OP_JUMP and last + ops[last+1] in ends:
+            stop = last
+        bodies[start] = decompile(code, start, stop, ends)
+    pairs = [(keys[start], bodies[start]) for start in starts if start in keys]
+    return ("case", key, pairs, bodies.get(default))
+
+def close(cond, stack):
+    """Replaces everything `cond` left on `stack` with its node."""
+    _, height, pairs = cond
+    if len(stack) > height:
+        # whatever follows the last pair runs when no test held
+        pairs.append((("atom", True), stack[height:]))
+        del stack[height:]
+    stack.append(("cond", pairs))
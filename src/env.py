@@ -0,0 +1,63 @@
+# The environment model. Names are resolved by the parser at compile time, so at runtime
+# nothing here is ever looked up by string:
+#
+# - every global name is interned once into `SYMBOLS`, and its index there is the index
+#   of its cell in each VM's `globals` list;
+# - every lambda call gets its own `Frame`, a flat list of slots holding its parameters
+#   (and anything it `define`s), linked to the frame the lambda was *created* in. A
+#   reference to an enclosing lambda's variable compiles to a (depth, slot) pair.
+#
+# This means a call costs as much as its parameter list, not as much as everything
+# that happens to be defined at the time.
+
+from itertools import count
+import sys
+import threading
+
+# Marks a global cell or local slot that has not been bound (yet). Never a language value.
+UNBOUND = type("Unbound", (), {"__repr__": lambda self: "<unbound>"})()
+
+class Symbols:
+    """The interned symbol table shared by every parser and VM in this process."""
+
+    def __init__(self):
+        self.names = [] # index -> name
+        self.index = {} # name -> index
+        self.lock = threading.Lock() # held while adding, as threads may compile at once
+
+    def intern(self, name):
+        """Returns the index of `name`, adding it to the table if it's new."""
+        idx = self.index.get(name)
+        if idx is None:
+            with self.lock:
+                idx = self.index.get(name)
+                if idx is None:
+                    name = sys.intern(name)
+                    idx = len(self.names)
+                    self.names.append(name)
+                    self.index[name] = idx
+        return idx
+
+    def __len__(self):
+        return len(self.names)
+
+SYMBOLS = Symbols()
+
+# Where the versions of VMs' globals come from: each VM's `version` is one of these, and
+# every time any of its globals changes it takes the next one. Code that remembers what it
+# found in the globals (see `ops.opFindEval`) remembers the version too, and can trust
+# what it remembered as long as the version is the same. Versions are never reused, not
+# even by another VM, so that's all it has to check.
+VERSIONS = count()
+
+# Where the indexes of call sites come from: the parser gives every call of a global one
+# of these (see `ops.opFindEval`), and each VM keeps the inline cache of a call at that
+# index in its `sites`. Like globals' indexes, they're only valid within one process.
+SITES = count()
+
+class Frame:
+    __slots__ = ("slots", "parent")
+
+    def __init__(self, slots, parent=None):
+        self.slots = slots   # a list of values, indexed by the slot numbers the parser assigned
+        self.parent = parent # enclosing frame, None for lambdas created at the top level
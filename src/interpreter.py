@@ -0,0 +1,136 @@
+from os.path import dirname, join
+import threading
+
+from lex import Lexer
+from parse import Parser
+from optimize import optimize
+from vm import VM
+import jit as jitmod
+
+# The interpreter as a library, for Python programs that want to run awrwydr code rather
+# than have someone type it in:
+#
+#     interp = Interpreter()                       # with the prelude loaded
+#     interp.load("(define double (λ (x) (* x 2)))")
+#     program = interp.compile("(double 21)")      # compiled once...
+#     interp.run(program)                          # ...run as often as you like: 42
+#     interp.call("double", 4)                     # 8
+#
+# An interpreter has a global environment, its *base*: the prelude, and whatever `load`
+# and `define` add to it. `run` and `call` run code against a copy of the base, so what
+# the code `define`s is gone once it's done, and never seen by anything else running at
+# the same time. That makes them safe to call from many threads at once, with programs
+# compiled by any of them: each thread runs on a VM of its own (kept for the next run, so
+# the JIT's work isn't lost), which is reset to the base before every run. The values in
+# the base themselves are shared, and code is expected not to mutate them; as lists are
+# immutable and lambdas only change as the JIT compiles them, that's everything short of
+# natives with state of their own, like memoized lambdas.
+#
+# `load` and `define` change the base, and are for setting things up: they shouldn't be
+# called while other threads are running code. Runs that start after they return see the
+# new base.
+#
+# Compilation is safe from any thread too. A `CompiledProgram` holds nothing but the code
+# (global names in it are resolved through the symbol table every parser and VM in the
+# process shares), so it can be run by any interpreter, not only the one that compiled it.
+#
+# `run` and `call` take a `budget.Budget` to limit what the code may do, for code that
+# can't be trusted to finish: going over it raises `budget.BudgetExceeded`, and either way
+# the budget says what the code used once it's done.
+
+PRELUDE_PATH = join(dirname(__file__), "prelude.lisp")
+
+class CompiledProgram:
+    """Compiled source, ready to be run by `Interpreter.run`."""
+    __slots__ = ("code", "source")
+
+    def __init__(self, code, source):
+        self.code = code     # the `bytecode.Code` of the whole program
+        self.source = source # what it was compiled from, for reference
+
+    def __setattr__(self, name, val):
+        if hasattr(self, "source"):
+            raise AttributeError("compiled programs can't be changed")
+        object.__setattr__(self, name, val)
+
+    def __repr__(self):
+        return f"<program {len(self.code)} words>"
+
+class Interpreter:
+    def __init__(self, backend="stack", jit=jitmod.THRESHOLD, optimize=False, prelude=True):
+        self.backend = backend
+        self.jit = jit
+        self.optimizing = optimize
+        self.base = VM(backend=backend, jit=jit) # holds the base, and runs `load`
+        self.local = threading.local() # each thread's idle VMs and parser
+        if prelude:
+            with open(PRELUDE_PATH) as f:
+                self.load(f.read())
+
+    def parser(self):
+        # a parser compiles one program at a time, so each thread has its own
+        parser = getattr(self.local, "parser", None)
+        if parser is None:
+            parser = self.local.parser = Parser()
+        return parser
+
+    def compile(self, source):
+        """Compiles `source`, a string, into a `CompiledProgram`."""
+        code = self.parser().parse(Lexer().lex(source))
+        return CompiledProgram(optimize(code) if self.optimizing else code, source)
+
+    def program(self, program):
+        return program if type(program) is CompiledProgram else self.compile(program)
+
+    def vm(self):
+        """Takes one of this thread's idle VMs, reset to the base; a new one if there's none
+        (as when code running on the thread's VM calls back into the interpreter)."""
+        idle = getattr(self.local, "idle", None)
+        if idle is None:
+            idle = self.local.idle = []
+        vm = idle.pop() if idle else VM(backend=self.backend, jit=self.jit)
+        vm.restore(self.base.globals)
+        return vm
+
+    def done(self, vm):
+        vm.stack = []
+        self.local.idle.append(vm)
+
+    def run(self, program, budget=None):
+        """Runs a `CompiledProgram` (or source, compiling it first) against a copy of the
+        base, and returns what its last expression evaluates to (None if nothing)."""
+        program = self.program(program)
+        vm = self.vm()
+        try:
+            vm.run(program.code, budget)
+            return vm.stack[-1] if vm.stack else None
+        finally:
+            self.done(vm)
+
+    def call(self, fn, *args, budget=None):
+        """Calls a lambda, or the global named `fn`, with `args`, against a copy of the base,
+        and returns its result."""
+        vm = self.vm()
+        try:
+            if type(fn) is str:
+                fn = vm.lookup(fn)
+            if vm.jit is None or budget is not None:
+                return vm.apply(fn, list(args), budget)
+            return jitmod.call(vm, fn, list(args))
+        finally:
+            self.done(vm)
+
+    def load(self, program):
+        """Runs a `CompiledProgram` (or source) right in the base, keeping what it defines,
+        and returns what its last expression evaluates to."""
+        program = self.program(program)
+        self.base.run(program.code)
+        return self.base.stack.pop() if self.base.stack else None
+
+    def define(self, name, val):
+        """Binds a global in the base."""
+        self.base.define(name, val)
+
+    def lookup(self, name):
+        """Returns the value of a global in the base."""
+        return self.base.lookup(name)
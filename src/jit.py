@@ -0,0 +1,591 @@
+import sys
+
+from cons import Cons, hashcons
+from lambdaobj import Lambda, TailCall
+from env import Frame, SYMBOLS, UNBOUND, VERSIONS
+from decompile import decompile
+import native
+from native import NATIVES
+
+# The tiered JIT. Every lambda starts out interpreted (by whichever backend the VM uses),
+# counting its calls; once it's been called `VM.jit` times it is translated into Python
+# source, built with `compile()` and cached on the lambda, and from then on calls go
+# straight to the resulting Python function.
+#
+# The translation works on the trees from decompile.py and produces plain Python: native
+# arithmetic for `+ - * /` (guarded by the same type checks as the natives), `Cons`
+# constructors (or `hashcons` calls, see cons.py) for `cons` and `list`, `if`/`elif`
+# chains for `cond` (and `case`, or a table lookup and a binary search of `if`s on the
+# index it gives, when it has lots of keys), and a `while` loop for self tail calls. Say
+#
+#     (define fib (λ (n) (cond ((eq? n 0) 0) ... (true (+ (fib (- n 1)) (fib (- n 2)))))))
+#
+# becomes, roughly,
+#
+#     def f(vm, env, s0, d):
+#         if d > 500:
+#             return _deep(vm, K[1], env, [s0])
+#         G = vm.globals
+#         while True:
+#             if (s0 == 0):
+#                 return 0
+#             ...
+#             elif True:
+#                 return (t3 + t4 if type(t3 := f(vm, env, ..., d + 1)) is type(t4 := ...) is int else K[0](vm, t3, t4))
+#             return None
+#
+# Note the direct `f(...)` calls: a lambda calling itself through a global is specialized
+# to call its own Python function. That's only right as long as the global still holds
+# the lambda, so the VM is told to watch it, and redefining it throws the compiled code
+# away (deoptimizes), sending the lambda back to the interpreter. Compiled code belongs to
+# the VM it was compiled for; other VMs only use it while those globals hold the same
+# values for them (see `adopt`), and then watch them as well.
+#
+# Anything the translation doesn't handle (creating lambdas, local `define`s, `dis`)
+# leaves the lambda interpreted for good.
+#
+# Compiled code calls itself with Python calls, so unlike the VM (see `ops.start`) it
+# could only recurse as deep as Python lets it. So it keeps count: the last parameter of
+# every compiled function, `d`, is about how many Python frames deep it runs, which goes
+# up by one for every call it makes itself and by a few more for calls through `call`
+# or the VM (`VM.depth` carries it across those, and natives calling lambdas). A call
+# deeper than half Python's recursion limit (as it was when the lambda was compiled)
+# doesn't run compiled: it's handed to the stack VM, with the JIT put aside, which runs
+# it and everything it calls on its own continuation stack (`_deep`). That happens
+# before the call has done anything, so nothing ever runs twice; it's running out of
+# Python stack half-way through a call that can't be recovered from, as whatever it
+# changed so far can't be undone.
+
+# Under a budget (see budget.py) compiled code has to count its calls like the VM does,
+# which would only slow it down the rest of the time, so it comes in two variants, each
+# compiled the first time it's needed (the other being None until then). Counting costs
+# about as much as a small lambda's whole call, so the metered variant does as little of
+# it as it can: its `f` charges the call it's entered by and works out how deep that is,
+# as `l`; then, if it calls itself, it runs a function `g` taking `l` along, which its
+# calls of itself go to directly, each statement charging up front (once, and only on the
+# branch that makes them) for the calls it'll make whatever happens. A self tail call
+# charges for another run, and helpers that may make calls of their own go through
+# `_at`, which tells the budget how deep they are. Lists are built through the natives,
+# which count them. `lookup` hands out whichever variant the VM needs, and a VM starting
+# or ending a budgeted run changes its version, so that no inline cache hands out the
+# other one.
+#
+#     def f(vm, env, s0, d):
+#         B = vm.budget
+#         l = len(vm.conts) + B.level + 1
+#         B.executed += 21
+#         if B.executed > B.horizon or l > B.deepest:
+#             B.settle(l)
+#         return g(vm, env, s0, d + 1, l)
+#     def g(vm, env, s0, d, l):
+#         ...
+#             elif True:
+#                 B = vm.budget
+#                 B.executed += 42
+#                 if B.executed > B.horizon or l >= B.deepest:
+#                     B.settle(l + 1)
+#                 return (... g(vm, env, ..., d + 1, l + 1) ... g(vm, env, ..., d + 1, l + 1) ...)
+
+THRESHOLD = 100 # calls before a lambda is compiled, the default for `VM.jit`
+
+# Up to how many keys a `case` is compiled to a chain of comparisons rather than a lookup
+# in its table, which only pays off once there are more of them than that.
+LINEAR = 8
+
+class Unsupported(Exception):
+    pass
+
+def lookup(vm, fn):
+    """Counts a call of `fn` and returns its compiled Python function (the metered variant
+    under a budget), if it has one."""
+    if type(fn) is not Lambda:
+        return None
+    compiled = fn.jit
+    if compiled is None:
+        if fn.calls < 0:
+            return None
+        fn.calls += 1
+        if fn.calls < vm.jit:
+            return None
+        return translate(vm, fn, vm.budget is not None)
+    if compiled[0] is not vm and not adopt(vm, fn):
+        return None
+    func = compiled[1] if vm.budget is None else compiled[3]
+    return func if func is not None else variant(fn, vm.budget is not None)
+
+def variant(fn, metered):
+    """Compiles the variant of `fn` (metered or not) it hasn't been compiled to yet, and
+    returns it."""
+    compiled = fn.jit
+    owner, func, deps, counting = compiled
+    new = build(Generator(owner, fn, metered))
+    if fn.jit is compiled: # not deoptimized meanwhile
+        fn.jit = (owner, func, deps, new) if metered else (owner, new, deps, counting)
+    return new
+
+def adopt(vm, fn):
+    """Returns whether `vm` can use what `fn` was compiled to for another VM, which it can
+    when the globals the translation relies on hold the same values in both (as they do
+    for VMs sharing a base environment, see interpreter.py); `vm` then watches them too."""
+    owner, _, deps, _ = fn.jit
+    for idx in deps:
+        if idx >= len(vm.globals) or vm.globals[idx] is not owner.globals[idx]:
+            return False
+    for idx in deps:
+        watching = vm.watchers.setdefault(idx, [])
+        if fn not in watching:
+            watching.append(fn)
+    return True
+
+def call(vm, fn, args, depth=None):
+    """Calls `fn` with `args` (in parameter order), compiled if possible; `depth` is how
+    deep the compiled code making the call is, `vm.depth` if it isn't any."""
+    if depth is None:
+        depth = vm.depth
+    while True:
+        func = lookup(vm, fn)
+        if func is None:
+            saved = vm.depth
+            vm.depth = depth + 4 # this, `VM.apply`, `VM.call` and `VM.loop`
+            try:
+                return vm.apply(fn, args)
+            finally:
+                vm.depth = saved
+        if len(args) != fn.code.nparams:
+            raise Exception(f"lambda/{fn.code.nparams}: invalid number of arguments")
+        val = func(vm, fn.env, *args, depth + 2)
+        if type(val) is not TailCall:
+            return val
+        fn, args = val.fn, val.args
+
+def resolve(vm, val, depth=None):
+    """Runs the pending call if `val` is a `TailCall`."""
+    if type(val) is TailCall:
+        return call(vm, val.fn, val.args, depth)
+    return val
+
+def translate(vm, fn, metered=False):
+    """Compiles `fn` for `vm` (the `metered` variant, or the other) and caches it, or marks
+    it as not compilable. Returns what it was compiled to, if anything."""
+    gen = Generator(vm, fn, metered)
+    try:
+        func = build(gen)
+    except Unsupported:
+        fn.calls = -1
+        return None
+
+    fn.jit = (vm, None, tuple(gen.deps), func) if metered else (vm, func, tuple(gen.deps), None)
+    for idx in gen.deps:
+        vm.watchers.setdefault(idx, []).append(fn)
+    return func
+
+def build(gen):
+    """Returns the Python function the source from `gen` defines."""
+    src = gen.function()
+    namespace = dict(HELPERS, K=gen.consts)
+    exec(compile(src, f"<jit {gen.fn.params}{' metered' if gen.metered else ''}>", "exec"), namespace)
+    return namespace["f"]
+
+class Generator:
+    """Turns the decompiled body of one lambda into the source of a Python function."""
+
+    def __init__(self, vm, fn, metered=False):
+        self.vm = vm
+        self.fn = fn
+        self.metered = metered # whether to charge the VM's budget (see above)
+        self.code = fn.code
+        self.consts = [] # values the source refers to as `K[i]`
+        self.deps = set() # global indexes the translation relies on
+        self.temps = 0
+        self.nests = False # whether it calls anything that may make calls of its own
+        self.recursing = False # whether it calls itself other than in tail position
+        # in metered code, how many calls of itself the statement being generated makes
+        # whatever happens, which it charges for up front; None outside of one
+        self.prepaid = None
+
+    def function(self):
+        body = decompile(self.code)
+        if len(body) != 1:
+            raise Unsupported()
+
+        params = "".join(f", s{slot}" for slot in range(self.code.nparams))
+        lines = ["    G = vm.globals", "    while True:"] + self.statement(body[0], "        ")
+        if self.nests:
+            # too deep to go on in Python; one that doesn't nest calls can't go deeper
+            slots = ", ".join(f"s{slot}" for slot in range(self.code.nparams))
+            deep = self.outside("_deep", f"vm, {self.const(self.code)}, env, [{slots}]", "l - 1")
+            lines = [f"    if d > {sys.getrecursionlimit() // 2}:", f"        return {deep}"] + lines
+        if not self.metered:
+            return "\n".join([f"def f(vm, env{params}, d):"] + lines) + "\n"
+
+        # the call's own run, charged as it starts, with how deep it is (as `l`); the
+        # body is a function of its own if it calls itself, which it does directly
+        entry = [f"def f(vm, env{params}, d):", "    B = vm.budget", "    l = len(vm.conts) + B.level + 1",
+                 f"    B.executed += {self.code.cost}", "    if B.executed > B.horizon or l > B.deepest:",
+                 "        B.settle(l)"]
+        if not self.recursing:
+            return "\n".join(entry + lines) + "\n"
+        return "\n".join(entry + [f"    return g(vm, env{params}, d + 1, l)", f"def g(vm, env{params}, d, l):"] + lines) + "\n"
+
+    def temp(self):
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def const(self, val):
+        if type(val) in (int, float, str, bool) or val is None:
+            return repr(val)
+        self.consts.append(val)
+        return f"K[{len(self.consts) - 1}]"
+
+    def recursive(self, node, argc):
+        """Whether `node` reads the global that currently holds the lambda being compiled,
+        called with `argc` arguments."""
+        if node[0] == "find" and self.vm.globals[node[1]] is self.fn:
+            if argc != self.code.nparams:
+                raise Unsupported() # leave the arity error to the interpreter
+            self.deps.add(node[1])
+            return True
+        return False
+
+    def statement(self, node, indent):
+        """Returns the lines that make the function return the value of `node`."""
+        if node[0] == "cond":
+            lines = []
+            for i, (test, body) in enumerate(node[1]):
+                if len(body) != 1:
+                    raise Unsupported()
+                lines.append(f"{indent}{'if' if i == 0 else 'elif'} {self.expr(test)}:")
+                lines += self.statement(body[0], indent + "    ")
+            lines.append(f"{indent}return None")
+            return lines
+
+        if node[0] == "case":
+            t = self.temp()
+            table, key, bodies = self.case(node)
+            lines = [f"{indent}{t} = {key}"]
+            if len(table) <= LINEAR:
+                for i, keys in enumerate(self.keys(table, len(bodies) - 1)):
+                    lines.append(f"{indent}{'if' if i == 0 else 'elif'} {self.comparisons(keys, t, t)}:")
+                    lines += self.branch(bodies[i], indent + "    ")
+                if len(bodies) == 1:
+                    return lines + self.branch(bodies[-1], indent)
+                return lines + [f"{indent}else:"] + self.branch(bodies[-1], indent + "    ")
+
+            # the lookup inline, as the helper `expr` uses costs a call
+            lines += [f"{indent}try:", f"{indent}    {t} = {self.const(table)}.get({t}, {len(bodies) - 1})",
+                      f"{indent}except TypeError:", f"{indent}    {t} = {len(bodies) - 1}"]
+            def dispatch(lo, hi, indent):
+                if hi - lo == 1:
+                    return self.branch(bodies[lo], indent)
+                mid = (lo + hi) // 2
+                return [f"{indent}if {t} < {mid}:", *dispatch(lo, mid, indent + "    "),
+                        f"{indent}else:", *dispatch(mid, hi, indent + "    ")]
+            return lines + dispatch(0, len(bodies), indent)
+
+        if node[0] == "call" and node[3]:
+            _, fn, args, _ = node
+            if self.recursive(fn, len(args)):
+                # a self tail call is just another iteration
+                if not args:
+                    return self.charge(indent, 0, 1) + [f"{indent}continue"]
+                self.prepaid = 0
+                args = self.ordered(args)[::-1]
+                params = ", ".join(f"s{slot}" for slot in range(len(args)))
+                return self.charge(indent, self.prepaid, 1) + [f"{indent}{params} = {', '.join(args)}", f"{indent}continue"]
+            self.prepaid = 0
+            *args, fn = self.ordered(args + [fn])
+            return self.charge(indent, self.prepaid) + [f"{indent}return TailCall({fn}, [{', '.join(reversed(args))}])"]
+
+        self.prepaid = 0
+        val = self.expr(node)
+        return self.charge(indent, self.prepaid) + [f"{indent}return {val}"]
+
+    def charge(self, indent, calls, runs=0):
+        """Returns the lines charging the budget, in metered code, for `calls` calls the
+        lambda makes of itself and `runs` more runs of its code (self tail calls), which go
+        before the statement making them, and resets `prepaid`, done with by then."""
+        self.prepaid = None
+        if not self.metered or calls + runs == 0:
+            return []
+        lines = [f"{indent}B = vm.budget", f"{indent}B.executed += {(calls + runs) * self.code.cost}"]
+        if not calls:
+            return lines + [f"{indent}if B.executed > B.horizon:", f"{indent}    B.settle()"]
+        return lines + [f"{indent}if B.executed > B.horizon or l >= B.deepest:", f"{indent}    B.settle(l + 1)"]
+
+    def outside(self, helper, args, depth="l"):
+        """Returns the call of `helper`, one of the functions below that may make calls of
+        their own, with `args`; in metered code, through `_at`, telling those how deep they
+        are (one deeper than `depth`)."""
+        if not self.metered:
+            return f"{helper}({args})"
+        return f"_at(vm, {depth}, {helper}, {args})"
+
+    def expr(self, node):
+        """Returns a Python expression computing the value of `node`."""
+        tag = node[0]
+        if tag in ("cond", "case") and self.prepaid is not None:
+            # parts of these may not be evaluated, so their calls can't be charged up front
+            prepaid, self.prepaid = self.prepaid, None
+            try:
+                return self.expr(node)
+            finally:
+                self.prepaid = prepaid
+        if tag == "atom":
+            return self.const(node[1])
+        elif tag == "find":
+            t = self.temp()
+            return f"({t} if ({t} := G[{node[1]}]) is not UNBOUND else _undef({node[1]}))"
+        elif tag == "local":
+            if node[1] >= self.code.nparams:
+                raise Unsupported()
+            return f"s{node[1]}"
+        elif tag == "deref":
+            # depth 1 is the lambda's own `env`
+            return f"_deref(env, {node[1] - 1}, {node[2]}, {self.const(node[3])})"
+        elif tag == "native":
+            return self.native(node[1], node[2])
+        elif tag == "call":
+            _, fn, args, _ = node
+            self.nests = True
+            if self.recursive(fn, len(args)):
+                args = self.ordered(args)[::-1]
+                t = self.temp()
+                if not self.metered:
+                    call = f"f(vm, env{''.join(', ' + arg for arg in args)}, d + 1)"
+                else:
+                    # charged for up front if the statement makes it for sure, else right here
+                    self.recursing = True
+                    if self.prepaid is not None:
+                        self.prepaid += 1
+                        depth = "l + 1"
+                    else:
+                        depth = f"_charged(vm.budget, {self.code.cost}, l + 1)"
+                    call = f"g(vm, env{''.join(', ' + arg for arg in args)}, d + 1, {depth})"
+                return f"({t} if type({t} := {call}) is not TailCall else {self.outside('_resolve', f'vm, {t}, d')})"
+            *args, fn = self.ordered(args + [fn])
+            return self.outside("_call", f"vm, {fn}, [{', '.join(reversed(args))}], d")
+        elif tag == "cond":
+            res = "None"
+            for test, body in reversed(node[1]):
+                if len(body) != 1:
+                    raise Unsupported()
+                res = f"({self.expr(body[0])} if {self.expr(test)} else {res})"
+            return res
+        elif tag == "case":
+            t = self.temp()
+            table, key, bodies = self.case(node)
+            if len(bodies) < 2:
+                raise Unsupported()
+            vals = [self.expr(body) if body else "None" for body in bodies]
+            if len(table) <= LINEAR:
+                res = vals[-1]
+                for i, keys in reversed(list(enumerate(self.keys(table, len(bodies) - 1)))):
+                    # the first comparison is the first thing evaluated, so it evaluates the key
+                    res = f"({vals[i]} if {self.comparisons(keys, f'({t} := {key})' if i == 0 else t, t)} else {res})"
+                return res
+            def dispatch(lo, hi, test):
+                if hi - lo == 1:
+                    return vals[lo]
+                mid = (lo + hi) // 2
+                return f"({dispatch(lo, mid, t)} if {test} < {mid} else {dispatch(mid, hi, t)})"
+            return dispatch(0, len(bodies), f"({t} := _switch({self.const(table)}, {key}, {len(bodies) - 1}))")
+        raise Unsupported()
+
+    def case(self, node):
+        """Returns the table of a `case` node, mapping its keys to the indexes of their
+        bodies, the expression of its key and the bodies by index (the default last, None
+        if there isn't one)."""
+        _, key, pairs, default = node
+        table, bodies = {}, []
+        for keys, body in pairs + [((), default)]:
+            if body is not None and len(body) != 1:
+                raise Unsupported()
+            for k in keys:
+                table[k] = len(bodies)
+            bodies.append(body[0] if body is not None else None)
+        return table, self.expr(key), bodies
+
+    def keys(self, table, count):
+        """Returns the keys of the first `count` bodies in a `case` table."""
+        keys = [[] for _ in range(count)]
+        for k, i in table.items():
+            keys[i].append(k)
+        return keys
+
+    def comparisons(self, keys, first, t):
+        """Returns the test of whether `t` is one of `keys`, referring to it as `first` in
+        the first comparison."""
+        return " or ".join(f"{first if i == 0 else t} == {self.const(k)}" for i, k in enumerate(keys))
+
+    def branch(self, body, indent):
+        """Returns the lines of `statement` for a body of a `case`, which may be None."""
+        return self.statement(body, indent) if body is not None else [f"{indent}return None"]
+
+    def cons(self):
+        """Returns what builds a cell."""
+        return "hashcons" if native.HASHCONS else "Cons"
+
+    def operand(self, node, val):
+        """Returns how to refer to the value of `node` (compiled to `val`) in an expression
+        that also checks its type, and the expression that gives that type (None for int
+        constants). Anything not trivially cheap to evaluate twice goes into a temporary."""
+        if node[0] == "atom" and type(node[1]) is int:
+            return val, None
+        if node[0] == "local":
+            return val, f"type({val})"
+        t = self.temp()
+        return t, f"type({t} := {val})"
+
+    def ordered(self, nodes):
+        """Returns the values of `nodes`, which the VM evaluates in that order (arguments
+        last to first, then what's called), to be used in the opposite order, the last one
+        first. If more than one of them can fail or have effects, the last one evaluates
+        them all, binding the others to temporaries first, so that the first error is the
+        same one the VM would have stopped at (see `quiet`)."""
+        vals = [self.expr(node) for node in nodes]
+        effects = [i for i, node in enumerate(nodes) if not quiet(node)]
+        if len(effects) < 2:
+            return vals
+        binds = []
+        for i in effects:
+            if i != len(vals) - 1:
+                t = self.temp()
+                binds.append(f"{t} := {vals[i]}")
+                vals[i] = t
+        vals[-1] = f"({', '.join(binds)}, {vals[-1]})[-1]"
+        return vals
+
+    def native(self, name, args):
+        if name in ("+", "-", "*", "/", "eq?"):
+            vals = [self.expr(arg) for arg in args][::-1]
+        else:
+            vals = self.ordered(args)[::-1]
+        args = args[::-1] # in source order from here on
+
+        if name in ("+", "-", "*", "/") and vals:
+            operands = [self.operand(arg, val) for arg, val in zip(args, vals)]
+            res = f" {name} ".join(use for use, _ in operands)
+            # the checks come first, last operand first, as the VM evaluates them
+            checks = [check for _, check in operands if check is not None][::-1]
+            if not checks:
+                return f"({res})"
+            # anything but ints goes through the native, which knows about vectors
+            fallback = f"{self.const(NATIVES[name].fn)}(vm, {', '.join(use for use, _ in operands)})"
+            return f"({res} if {' is '.join(checks)} is int else {fallback})"
+        elif name == "eq?":
+            # `eq?` is only structural when both sides are lists (constant ones included,
+            # which optimize.py folds quoted lists into)
+            if any(arg[0] == "atom" and type(arg[1]) is not Cons for arg in args):
+                return f"({vals[0]} == {vals[1]})"
+            a, b = self.temp(), self.temp()
+            return f"({a} == {b} if type({b} := {vals[1]}) is type({a} := {vals[0]}) is int else _eq({a}, {b}))"
+        elif name == "atom?":
+            return f"(type({vals[0]}) in (int, str))"
+        elif name == "nil?":
+            if args[0][0] == "atom":
+                # known already; besides, `1 is None` makes Python warn about `is` with a literal
+                return repr(args[0][1] is None)
+            return f"({vals[0]} is None)"
+        elif name == "cons" and not self.metered: # the natives count what they make
+            return f"{self.cons()}({vals[0]}, {vals[1]})"
+        elif name == "list" and not self.metered:
+            return "".join(f"{self.cons()}({val}, " for val in vals) + "None" + ")" * len(vals)
+        elif name in ("car", "cdr"):
+            t = self.temp()
+            return f"({t}.{name} if type({t} := {vals[0]}) is Cons else _badcxr('{name}'))"
+
+        # anything else goes through the native itself; one that isn't pure may call
+        # lambdas, which need to know how deep this call is
+        if not NATIVES[name].pure:
+            self.nests = True
+            return self.outside("_impure", f"vm, d, {self.const(NATIVES[name].fn)}{''.join(', ' + val for val in vals)}")
+        return f"{self.const(NATIVES[name].fn)}(vm, {', '.join(vals)})"
+
+# Natives that can't fail or have effects whatever their arguments.
+QUIET = {"cons", "list", "eq?", "atom?", "nil?"}
+
+def quiet(node):
+    """Whether evaluating `node` can't fail or have effects, so when it happens doesn't matter."""
+    if node[0] == "native":
+        return node[1] in QUIET and all(quiet(arg) for arg in node[2])
+    return node[0] in ("atom", "local")
+
+# What the generated source can refer to besides `K`.
+
+def _undef(idx):
+    raise Exception(f"symbol \"{SYMBOLS.names[idx]}\" not defined")
+
+def _deref(frame, depth, slot, name):
+    for _ in range(depth):
+        frame = frame.parent
+    val = frame.slots[slot]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{name}\" not defined in enclosing lambda")
+    return val
+
+def _deep(vm, code, env, args):
+    """Runs the code of a compiled lambda with `args` on the stack VM, with the JIT put
+    aside, and returns the result."""
+    if vm.budget is not None:
+        vm.budget.executed -= code.cost # charged already, and `VM.call` charges it again
+    saved = vm.jit
+    vm.jit = None
+    vm.version = next(VERSIONS) # inline caches may hold compiled functions
+    try:
+        vm.call(code, Frame(args + [UNBOUND] * (code.nlocals - len(args)), env))
+        return vm.stack.pop()
+    finally:
+        vm.jit = saved
+        vm.version = next(VERSIONS)
+
+def _at(vm, depth, helper, *args):
+    """Calls `helper` with `args` from metered code running `depth` calls deep (see
+    `Generator.outside`), as the calls it makes don't otherwise know."""
+    budget = vm.budget
+    saved = budget.level
+    budget.level = depth - len(vm.conts)
+    try:
+        return helper(*args)
+    finally:
+        budget.level = saved
+
+def _charged(budget, cost, depth):
+    """Charges `budget` for running code costing `cost` in a call `depth` deep, and returns
+    the depth."""
+    budget.charge(cost, depth)
+    return depth
+
+def _impure(vm, depth, fn, *args):
+    saved = vm.depth
+    vm.depth = depth + 2 # this and the native
+    try:
+        return fn(vm, *args)
+    finally:
+        vm.depth = saved
+
+def _switch(table, key, default):
+    try:
+        return table.get(key, default)
+    except TypeError:
+        return default # an unhashable key
+
+def _badcxr(name):
+    raise Exception(f"Invalid type for internal function `{name}`")
+
+HELPERS = {
+    "Cons": Cons,
+    "hashcons": hashcons,
+    "TailCall": TailCall,
+    "UNBOUND": UNBOUND,
+    "_undef": _undef,
+    "_deref": _deref,
+    "_deep": _deep,
+    "_at": _at,
+    "_charged": _charged,
+    "_impure": _impure,
+    "_badcxr": _badcxr,
+    "_switch": _switch,
+    "_eq": native.equal,
+    "_call": call,
+    "_resolve": resolve,
+}
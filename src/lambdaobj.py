@@ -1,6 +1,25 @@
-# This class describes a lambda object; i.e. an expression
-# with parameters (`params`).
+# This class describes a lambda object; i.e. a compiled expression (`code`, a
+# `bytecode.Code` whose first slots are its parameters), closed over the frame
+# it was created in (`env`).
 class Lambda:
-    def __init__(self, params, code):
-        self.params = params # a list of strings (names of parameters)
-        self.code = code     # executable VM microcode
\ No newline at end of file
+    __slots__ = ("code", "env", "calls", "jit")
+
+    def __init__(self, code, env=None):
+        self.code = code # executable VM microcode
+        self.env = env   # the defining `env.Frame`, None at the top level
+        self.calls = 0   # how many times it was interpreted, -1 if it can't be JIT-compiled
+        self.jit = None  # (VM, Python function, globals it relies on, metered variant) once JIT-compiled, see jit.py
+
+    @property
+    def params(self):
+        return self.code.params # a tuple of strings (names of parameters)
+
+# A call to `fn` with `args` (in parameter order) that the callee should make in place of
+# its caller; returned by compiled code for calls in tail position so that whoever drives
+# the call can run it without growing the Python stack.
+class TailCall:
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
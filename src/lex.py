@@ -1,105 +1,169 @@
-import cons
+from codecs import getincrementaldecoder
+import re
+import sys
+
+from cons import Cons
+import pvector
+
+# The lexer turns source code into top-level expressions: `Cons` lists for s-expressions
+# and raw lexemes (ints, symbol strings, `True`, `False`, `None`) for atoms. FWIW at
+# lex-time we don't actually check if these s-expressions make any sense; they can be
+# gibberish but as long as they're not ill-formed they're making it through. Brackets read
+# as persistent vectors (see pvector.py) of what's between them, `[1 (a b)]` being a
+# vector of an int and a list.
+#
+# The buffer is split into tokens by a single `findall` with the cheap `TOKEN` regex: a
+# paren (or bracket), a comment or a run of anything else. A run is then classified once per distinct
+# token (and the result cached) against the stricter `LEXEME`, which is also used to split
+# runs like `12ab` into their lexemes and to point at the first unknown character.
+#
+# Source code can also be lexed as it's read, piece by piece, so a script of any size is
+# run one top-level expression at a time, in bounded memory, without waiting for the rest
+# of it. Only the pieces spanned by the expression being read are kept, to report errors.
+
+TOKEN = re.compile(r"[()\[\]]|%[^\n]*|[^\s()\[\]%]+")
+
+SYMBOL = r"(?:[^\W\d_]|[-+*/])(?:[^\W\d_]|[-+*/?])*"
+
+LEXEME = re.compile(rf"""
+    (?: \s+ | %[^\n]* )*          # whitespace and comments, skipped
+    (
+        \( | \) | \[ | \]
+      | \d+                       # TODO: decimal-point support
+      | {SYMBOL}
+      | .
+    )?
+""", re.VERBOSE)
+
+IS_SYMBOL = re.compile(SYMBOL)
+
+KEYWORDS = {"true": True, "false": False, "nil": None}
+
+BRACKET = object() # the first element of `curr` when it's the inside of brackets
+
+CHUNK = 1 << 16 # how many bytes of a stream `chunks` reads at a time
+
+class LexError(Exception):
+    """A lexing error, with the (1-based) position it occurred at."""
+
+    def __init__(self, msg, line, column):
+        super().__init__(msg)
+        self.line = line
+        self.column = column
+
+def position(code, offset, first=1):
+    """Returns the 1-based (line, column) of `offset` in `code`, which starts on line
+    `first`."""
+    line = code.count('\n', 0, offset) + first
+    return line, offset - code.rfind('\n', 0, offset)
 
 class Lexer:
-    def __init__(self):
-        self.code = None
-        self.cursor = 0
-
     def lex(self, code):
-        self.__init__() # just for good measure
-        self.code = code
-        
-        res = [] # a Python list of Awrwydr `Cons`es and raw lexemes
-
-        while not self.isAtEnd():
-            expr = self.expr(self.advance())
-            if expr is not None:
-                res.append(expr)
-
-        return res
-
-    def expr(self, lexeme):
-        # for when we call recursively, obviously this won't fire from the `Lexer.lex` loop
-        # if self.isAtEnd(): raise Exception("unexpected end of input")
-
-        # lexeme = self.advance()
-
-        if lexeme == '%':
-            while not self.isAtEnd() and self.curr() != '\n':
-                self.cursor += 1 # stupid but alr
-            return None
-
-        # FWIW at lex-time we don't actually check if these s-expressions make any sense.
-        # they can be gibberish but as long as they're not ill-formed they're making it through
-        elif lexeme == '(':
-            sexpr = cons.Cons(None, None)
-            while True:
-                lexeme = self.advance()
-                if lexeme == ')': break
-                sexpr.append(self.expr(lexeme))
-
-                # this is cleaner than putting it in the loop condition (i think)
-                if self.isAtEnd(): raise Exception("unterminated s-expression")
-
-            return sexpr
-
-        elif lexeme == ')':
-            raise Exception("unexpected closing paren `)`")
-
-        else:
-            return lexeme
-
-    def curr(self):
-        """Returns the character currently being inspected."""
-        return self.code[self.cursor]
-
-    def isAtEnd(self):
-        """Returns true if there are no more characters to be read from the input."""
-        return self.cursor >= len(self.code)
-
-    def advance(self):
-        """Returns the next discernible token in the source code. Assumes cursor is not at end! Do not call when unsure"""
-
-        # skip any kind of whitespace, we don't really care as long as it's
-        # all differentiable from each other.
-        # there might also be a trailing newline from a comment
-        while self.cursor < len(self.code) and self.curr().isspace(): self.cursor += 1
-
-        # skip comments, starting at '%' and ending at nearest newline
-        if self.curr() == '%':
-            return '%' # we only begin ignoring comments inside `Lexer.expr()`
-
-        # '('
-        if self.curr() == '(':
-            self.cursor += 1
-            return '('
-
-        # ')'
-        elif self.curr() == ')':
-            self.cursor += 1
-            return ')'
-
-        # a number literal
-        elif self.curr().isdigit():
-            lexeme = ""
-
-            # TODO: decimal-point support
-            while not self.isAtEnd() and self.curr().isdigit():
-                lexeme += self.curr()
-                self.cursor += 1
-            return int(lexeme)
-
-        # a symbol atom
-        elif self.curr().isalpha() or self.curr() in ['+', '-', '*', '/']:
-            lexeme = ""
-            while not self.isAtEnd() and (self.curr().isalpha() or self.curr() in ['+', '-', '*', '/', '?']):
-                lexeme += self.curr()
-                self.cursor += 1
-            if lexeme == "true": return True
-            elif lexeme == "false": return False
-            elif lexeme == "nil": return None
-            return lexeme
-
-        # nothing matched so we should probably report an error
-        else:
-            raise Exception(f"`{self.curr()}`: unknown lexeme")
\ No newline at end of file
+        """Lexes a whole program, returning a Python list of its top-level expressions."""
+        return list(self.read((code,)))
+
+    def read(self, chunks):
+        """Lexes a program arriving in pieces, yielding its top-level expressions as they're
+        read. Every piece but the last must end at a line break, so that no token is split
+        between two (see `chunks`); each piece is lexed in one go, and the expressions that
+        end in it are yielded once it's done."""
+        res = []   # a Python list of Awrwydr `Cons`es and raw lexemes
+        curr = res # the elements of the innermost s-expression being read...
+        outer = [] # ...and of the ones around it
+        line = 1   # the line the next piece starts on
+        pending = [] # the pieces the unfinished top-level expression spans, for errors
+
+        for code in chunks:
+            if not outer:
+                pending, first = [], line
+            pending.append(code)
+            atoms = {} # token -> lexeme, so each distinct one is only converted once
+
+            for token in TOKEN.findall(code):
+                if token == '(':
+                    outer.append(curr)
+                    curr = []
+                elif token == ')':
+                    if not outer or (curr and curr[0] is BRACKET):
+                        raise self.error("".join(pending), first)
+                    sexpr = None
+                    for el in reversed(curr):
+                        sexpr = Cons(el, sexpr)
+                    curr = outer.pop()
+                    curr.append(sexpr if sexpr is not None else Cons(None, None)) # `()`
+                elif token == '[':
+                    outer.append(curr)
+                    curr = [BRACKET]
+                elif token == ']':
+                    if not outer or not curr or curr[0] is not BRACKET:
+                        raise self.error("".join(pending), first)
+                    vec = pvector.make(curr[1:])
+                    curr = outer.pop()
+                    curr.append(vec)
+                elif token in atoms:
+                    curr.append(atoms[token])
+                elif token[0] != '%':
+                    lexemes = LEXEME.findall(token)
+                    vals = []
+                    for lexeme in filter(None, lexemes): # the last match is always empty
+                        if lexeme[0].isdecimal():
+                            vals.append(int(lexeme))
+                        elif lexeme in KEYWORDS:
+                            vals.append(KEYWORDS[lexeme])
+                        elif IS_SYMBOL.match(lexeme):
+                            vals.append(sys.intern(lexeme))
+                        else:
+                            raise self.error("".join(pending), first)
+                    if len(vals) == 1:
+                        atoms[token] = vals[0]
+                    curr += vals
+
+            line += code.count('\n')
+            yield from res
+            res.clear() # in place, as it's also the bottom of `outer`
+
+        if outer:
+            raise self.error("".join(pending), first)
+
+    def error(self, code, first=1):
+        """Finds the first error in `code`, which starts on line `first` outside of any
+        s-expression, and returns it as a `LexError` with its position. This is only called
+        once we know there is one, so it can afford to go slowly."""
+        opened = [] # offsets and closing tokens of the unclosed parens and brackets
+        for match in LEXEME.finditer(code):
+            token = match.group(1)
+            if not token:
+                continue
+            offset = match.start(1)
+            if token == '(' or token == '[':
+                opened.append((offset, ')' if token == '(' else ']'))
+            elif token == ')' or token == ']':
+                if not opened or opened[-1][1] != token:
+                    kind = "paren" if token == ')' else "bracket"
+                    return LexError(f"unexpected closing {kind} `{token}`", *position(code, offset, first))
+                opened.pop()
+            elif not token[0].isdecimal() and not IS_SYMBOL.match(token):
+                return LexError(f"`{token}`: unknown lexeme", *position(code, offset, first))
+        return LexError("unterminated s-expression", *position(code, opened[-1][0], first))
+
+def chunks(stream, size=CHUNK):
+    """Reads a binary stream in pieces of about `size` bytes, taking whatever is available
+    rather than waiting for a full piece, and yields them decoded and cut at line breaks
+    (see `Lexer.read`)."""
+    decoder = getincrementaldecoder("utf-8")()
+    read = getattr(stream, "read1", stream.read)
+    rest = [] # what was read after the last line break so far
+    while True:
+        data = read(size)
+        text = decoder.decode(data, final=not data)
+        cut = text.rfind('\n') + 1
+        if cut:
+            rest.append(text[:cut])
+            yield "".join(rest)
+            rest = []
+        if text[cut:]:
+            rest.append(text[cut:])
+        if not data:
+            break
+    if rest:
+        yield "".join(rest)
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+import threading
+
+from bytecode import Code
+from cons import Cons
+from lambdaobj import Lambda
+from pvector import PVector
+from native import native, NATIVES
+from ops import OP_ATOM, OP_CALL, OP_EVAL, OP_JIF, OP_JUMP, OP_LOCAL, OP_LOCAL_CALL1, OP_SET_LOCAL
+
+# Memoization. `(memo FN)` returns a lambda taking the same arguments as [FN] that
+# remembers what [FN] returned for each combination of them, and only calls [FN] for ones
+# it hasn't seen. It only makes sense for lambdas whose result depends on nothing but
+# their arguments, which is up to whoever memoizes them:
+#
+#     (define fib (memo (λ (n) (cond ... (true (+ (fib (- n 1)) (fib (- n 2))))))))
+#
+# `(memo FN SIZE)` keeps at most [SIZE] results, forgetting the least recently used one
+# when it's full. `(memo-stats FN)` tells how well the cache is doing, and `(memo-clear FN)`
+# empties it.
+#
+# The returned lambda is an ordinary one, whose code looks its arguments up in the cache
+# and only calls [FN] if they're not there, as if it were
+#
+#     (λ (ARGS...)
+#         (define value (<memo> CACHE ARGS...))
+#         (cond ((<memo-missed?> value) (<memo-store> CACHE ARGS... (FN ARGS...)))
+#               (true value)))
+#
+# so it can be called and stored by every backend without any of them knowing about
+# memoization, and calls that hit the cache never start running [FN]. A miss is an
+# ordinary call, which the stack VM makes on its continuation stack like any other (see
+# `ops.start`), storing the result when [FN] returns, so memoized lambdas can recurse as
+# deep as others. (The natives can't be written in source code, their names being no
+# valid symbols; and the lambda isn't JIT-compiled, the JIT not handling `define`s.)
+#
+# Arguments are looked up by value: lists (and persistent vectors) are equal when their
+# elements are, as with `eq?`, and atoms when they are of the same type, so that `1` and
+# `true` stay apart. Arguments that can't be looked up at all (unhashable Python values
+# passed in through `Interpreter.call`, say) just make the call go to [FN] uncached.
+#
+# A memoized lambda is a value like any other, so an `Interpreter`'s threads may share
+# one: each cache has a lock, held while it's read or changed (but not while [FN] runs).
+
+SIZE = 1024 # how many results a memoized lambda keeps by default
+
+# What `<memo>` returns for arguments it has no result for. Never a language value: it
+# only ever goes from there to `<memo-missed?>`.
+MISSED = type("Missed", (), {"__repr__": lambda self: "<missed>"})()
+
+class Memo:
+    """The cache of a memoized lambda."""
+    __slots__ = ("fn", "limit", "results", "hits", "misses", "evictions", "lock")
+
+    def __init__(self, fn, limit):
+        self.fn = fn # the lambda being memoized
+        self.limit = limit
+        self.results = OrderedDict() # argument key -> result, least recently used first
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<memo {self.hits}/{self.hits + self.misses}>"
+
+    def lookup(self, args):
+        """Returns the result for `args`, or `MISSED`."""
+        k = tuple(key(arg) for arg in args)
+        with self.lock:
+            try:
+                val = self.results.get(k, MISSED)
+            except TypeError: # unhashable, so never stored either
+                val = MISSED
+            if val is MISSED:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.results.move_to_end(k)
+            return val
+
+    def store(self, args, val):
+        """Remembers `val` as the result for `args` (if they can be looked up), and returns it."""
+        k = tuple(key(arg) for arg in args)
+        with self.lock:
+            try:
+                self.results[k] = val
+            except TypeError:
+                return val
+            if len(self.results) > self.limit:
+                self.results.popitem(last=False)
+                self.evictions += 1
+        return val
+
+def key(val):
+    """Returns what stands for `val` in a cache key."""
+    if type(val) is Cons:
+        items = []
+        while type(val) is Cons:
+            items.append(key(val.car))
+            val = val.cdr
+        return (Cons, tuple(items), key(val))
+    if type(val) is PVector:
+        return (PVector, tuple(key(item) for item in val))
+    return (type(val), val)
+
+def cache(fn):
+    """Returns the `Memo` of a memoized lambda."""
+    if type(fn) is Lambda and fn.code.consts and type(fn.code.consts[0]) is Memo:
+        return fn.code.consts[0]
+    raise Exception(f"{fn}: not a memoized lambda")
+
+@native("<memo>", -1, pure=False) # looks arguments up in a memoized lambda's cache
+def lookup(vm, memo, *args):
+    return memo.lookup(args)
+
+@native("<memo-missed?>", 1, pure=False) # whether `<memo>` found nothing
+def missed(vm, val):
+    return val is MISSED
+
+@native("<memo-store>", -1, pure=False) # remembers what a memoized lambda returned
+def store(vm, memo, *args):
+    return memo.store(args[:-1], args[-1])
+
+@native("memo", -1, pure=False) # memoizes a lambda
+def memo(vm, *args):
+    if len(args) not in (1, 2):
+        raise Exception("memo/1-2: invalid number of arguments")
+    fn, limit = args[0], args[1] if len(args) == 2 else SIZE
+    if type(fn) is not Lambda:
+        raise Exception(f"{fn}: not a lambda")
+    if type(limit) is not int or limit < 1:
+        raise Exception("memo/2: the size must be a positive int")
+
+    # the code of the lambda described above, `value` being the slot after the parameters
+    nparams = fn.code.nparams
+    args = []
+    for slot in reversed(range(nparams)):
+        args += (OP_LOCAL, slot)
+    call = args + [OP_ATOM, 1, OP_EVAL, nparams] + args + [OP_ATOM, 0, OP_CALL, NATIVES["<memo-store>"].index, nparams + 2]
+    ops = args + [OP_ATOM, 0, OP_CALL, NATIVES["<memo>"].index, nparams + 1, OP_SET_LOCAL, nparams,
+                  OP_LOCAL_CALL1, nparams, NATIVES["<memo-missed?>"].index,
+                  OP_JIF, 2 + len(call) + 2, *call, OP_JUMP, 2 + 2,
+                  OP_LOCAL, nparams]
+    return Lambda(Code(ops, (Memo(fn, limit), fn), nparams, fn.code.params + ("value",)))
+
+@native("memo-stats", 1, pure=False) # how a memoized lambda's cache is doing
+def stats(vm, fn):
+    memo = cache(fn)
+    with memo.lock:
+        counts = (("hits", memo.hits), ("misses", memo.misses), ("evictions", memo.evictions),
+                  ("size", len(memo.results)), ("limit", memo.limit))
+    res = None
+    for name, val in reversed(counts):
+        res = Cons(Cons(name, Cons(val, None)), res)
+    return res
+
+@native("memo-clear", 1, pure=False) # forgets everything a memoized lambda remembers
+def clear(vm, fn):
+    memo = cache(fn)
+    with memo.lock:
+        memo.results.clear()
+        memo.hits = memo.misses = memo.evictions = 0
+    return None
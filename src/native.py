@@ -1,103 +1,196 @@
 from functools import reduce
-from copy import copy
 
-from cons import Cons
-
-# If a function is variadic, like `add`, it means it has to be some sort of
+from cons import Cons, hashcons
+
+# The native functions, i.e. the ones built into the language rather than defined in it.
+# This is the one registry of them: the parser looks natives up here to check their arity
+# and compiles calls to them into instructions that refer to them by `index`, and the VM
+# (and every other backend) calls them through that index without ever looking at a name.
+#
+# A native is a plain Python function taking the VM and its arguments in source order,
+# returning its result.
+#
+# If a function is variadic, like `+`, it means it has to be some sort of
 # reducing action, i.e. a function that is defined for some specified number
 # of arguments (in the case of basic arithmetic operators, 2), but can be
 # recursively applied to a list of arguments of arbitrary length equal to or greater
-# than the mentioned default.
-# The reduction is done simply with Python's `reduce`. Only in-built functions are
-# variadic, because the original McCarthian Lisp did not feature any mechanisms for
-# defining variadic functions.
-
-def add(vm):
-    size = vm.argstarts.pop()
-    args = []
-    while len(vm.stack) != size:
-        el = vm.stack.pop()
-        if not type(el) is int:
-            raise Exception("`+/n`: invalid argument type")
-        args.append(el)
-
-    vm.push(reduce(lambda a, b: a+b, args))
-
-def sub(vm):
-    size = vm.argstarts.pop()
-    args = []
-    while len(vm.stack) != size:
-        el = vm.stack.pop()
-        if not type(el) is int:
-            raise Exception("`-/n`: invalid argument type")
-        args.append(el)
-
-    vm.push(reduce(lambda a, b: a-b, args))
-
-def mul(vm):
-    size = vm.argstarts.pop()
-    args = []
-    while len(vm.stack) != size:
-        el = vm.stack.pop()
-        if not type(el) is int:
-            raise Exception("`*/n`: invalid argument type")
-        args.append(el)
-
-    vm.push(reduce(lambda a, b: a*b, args))
-
-def div(vm):
-    size = vm.argstarts.pop()
-    args = []
-    while len(vm.stack) != size:
-        el = vm.stack.pop()
-        if not type(el) is int:
-            raise Exception("`//n`: invalid argument type")
-        args.append(el)
-
-    vm.push(reduce(lambda a, b: a/b, args))
-
-def list(vm):
-    size = vm.argstarts.pop()
-    args = []
-    while len(vm.stack) != size:
-        el = vm.stack.pop()
-        args.append(el)
-
-    args.reverse() # :/
-    vm.push(reduce(lambda a, b: Cons(b, a), args, None))
-
-def eqq(vm):
-    def eq(a, b):
-        if type(a) is Cons and type(b) is Cons:
-            return eq(a.car, b.car) and eq(a.cdr, b.cdr)
-        return a == b
-
-    a = vm.stack.pop()
-    b = vm.stack.pop()
-    
-    vm.push(eq(a, b))
-
-def atomq(vm):
-    el = vm.stack.pop()
-    vm.push(type(el) is int or type(el) is str)
-
-def nilq(vm):
-    el = vm.stack.pop()
-    vm.push(el is None)
-
-def cons(vm):
-    a = vm.stack.pop()
-    b = vm.stack.pop()
-    vm.push(Cons(a, b))
-
-def car(vm):
-    el = vm.stack.pop()
+# than the mentioned default. Those may also come with a `binary` version that only
+# handles exactly two arguments, and is used whenever a call passes exactly two.
+# Only in-built functions are variadic, because the original McCarthian Lisp did not
+# feature any mechanisms for defining variadic functions.
+
+class Native:
+    __slots__ = ("name", "arity", "fn", "binary", "pure", "index")
+
+    def __init__(self, name, arity, fn, pure):
+        self.name = name
+        self.arity = arity   # how many arguments it takes, -1 for variadic
+        self.fn = fn
+        self.binary = fn     # what calls with exactly two arguments use
+        self.pure = pure     # whether it only computes its result from its arguments
+        self.index = len(TABLE)
+
+    def __repr__(self):
+        return self.name
+
+NATIVES = {} # name -> `Native`
+TABLE = []   # index -> `Native`
+
+def native(name, arity, pure=True):
+    """Registers the decorated function as the native `name`."""
+    def register(fn):
+        NATIVES[name] = entry = Native(name, arity, fn, pure)
+        TABLE.append(entry)
+        return fn
+    return register
+
+def binary(name):
+    """Registers the decorated function as the two-argument version of the native `name`."""
+    def register(fn):
+        NATIVES[name].binary = fn
+        return fn
+    return register
+
+# The arithmetic natives compute on ints. Other types can make them work on their values
+# too, by registering a function here that does it: when an argument isn't an int, the
+# function registered for its type gets the native's name and all the arguments, and
+# returns the result (see vector.py).
+ARITHMETIC = {} # type -> function(name, args)
+
+def ints(name, args):
+    """Whether `args` are all ints (as opposed to values of types in `ARITHMETIC`)."""
+    if not args:
+        raise Exception(f"`{name}/n`: invalid number of arguments")
+    for arg in args:
+        if not type(arg) is int:
+            return False
+    return True
+
+def arithmetic(name, args):
+    """Hands `args` to the function registered for the type of the first one that isn't
+    an int."""
+    for arg in args:
+        if type(arg) is not int and type(arg) in ARITHMETIC:
+            return ARITHMETIC[type(arg)](name, args)
+    raise Exception(f"`{name}/n`: invalid argument type")
+
+@native("+", -1) # adds some numbers
+def add(vm, *args):
+    if not ints("+", args):
+        return arithmetic("+", args)
+    return sum(args)
+
+@binary("+")
+def add2(vm, a, b):
+    if type(a) is int and type(b) is int:
+        return a + b
+    return arithmetic("+", (a, b))
+
+@native("-", -1) # subtracts some numbers
+def sub(vm, *args):
+    if not ints("-", args):
+        return arithmetic("-", args)
+    return reduce(lambda a, b: a-b, args)
+
+@binary("-")
+def sub2(vm, a, b):
+    if type(a) is int and type(b) is int:
+        return a - b
+    return arithmetic("-", (a, b))
+
+@native("*", -1) # multiplies some numbers
+def mul(vm, *args):
+    if not ints("*", args):
+        return arithmetic("*", args)
+    return reduce(lambda a, b: a*b, args)
+
+@binary("*")
+def mul2(vm, a, b):
+    if type(a) is int and type(b) is int:
+        return a * b
+    return arithmetic("*", (a, b))
+
+@native("/", -1) # divides some numbers
+def div(vm, *args):
+    if not ints("/", args):
+        return arithmetic("/", args)
+    return reduce(lambda a, b: a/b, args)
+
+@binary("/")
+def div2(vm, a, b):
+    if type(a) is int and type(b) is int:
+        return a / b
+    return arithmetic("/", (a, b))
+
+def equal(a, b):
+    """Structural equality, as seen by `eq?` (see `Cons.__eq__`)."""
+    return a is b or a == b
+
+@native("eq?", 2) # whether two expressions are equal
+def eqq(vm, a, b):
+    return equal(a, b)
+
+@native("atom?", 1) # whether an expression is an atom
+def atomq(vm, el):
+    return type(el) is int or type(el) is str
+
+@native("nil?", 1) # whether an expression is nil
+def nilq(vm, el):
+    return el is None
+
+# The natives building lists count the cells they make against the budget of the code
+# calling them, if it has one (see budget.py); `vm` is None when the optimizer calls them.
+
+@native("cons", 2) # creates a cons pair
+def cons(vm, a, b):
+    if vm is not None and vm.budget is not None:
+        vm.budget.allocated += 1
+    return Cons(a, b)
+
+@native("list", -1) # creates a list from cons pairs
+def list(vm, *args):
+    if vm is not None and vm.budget is not None:
+        vm.budget.allocated += len(args)
+    lst = None
+    for el in reversed(args):
+        lst = Cons(el, lst)
+    return lst
+
+@native("car", 1) # returns the first element of a list expression (PN) / quote (RPN)
+def car(vm, el):
     if not type(el) is Cons:
         raise Exception("Invalid type for internal function `car`")
-    vm.push(el.car)
+    return el.car
 
-def cdr(vm):
-    el = vm.stack.pop()
+@native("cdr", 1) # returns the tail of a list expression (PN) / quote (RPN)
+def cdr(vm, el):
     if not type(el) is Cons:
         raise Exception("Invalid type for internal function `cdr`")
-    vm.push(el.cdr)
+    return el.cdr
+
+# Hash-consed versions of the natives above that build lists (see cons.py), swapped in by
+# `hashconsing`.
+
+def hcons(vm, a, b):
+    if vm is not None and vm.budget is not None:
+        vm.budget.allocated += 1 # or none, if the cell existed already
+    return hashcons(a, b)
+
+def hlist(vm, *args):
+    if vm is not None and vm.budget is not None:
+        vm.budget.allocated += len(args)
+    lst = None
+    for el in reversed(args):
+        lst = hashcons(el, lst)
+    return lst
+
+HASHCONS = False # whether lists are hash-consed
+
+def hashconsing(on=True):
+    """Makes the natives building lists hash-cons them, or stop doing so. Meant to be called
+    before any code is compiled, as the parser, the closure compiler and the JIT all
+    decide how to build lists as they translate code."""
+    global HASHCONS
+    HASHCONS = on
+    NATIVES["cons"].fn = NATIVES["cons"].binary = hcons if on else cons
+    NATIVES["list"].fn = NATIVES["list"].binary = hlist if on else list
@@ -1,26 +1,81 @@
 from lambdaobj import *
-from copy import deepcopy
-import vm as vmmod
+from env import Frame, SYMBOLS, UNBOUND, VERSIONS
+from native import TABLE
 
 # This is the module where everything regarding how to execute our stack-based code lies.
 # We begin with definitions of the integer representations of each primitive VM opcode;
 # the ones that interact with it and its stack on a very basic level. These are NOT built-in
-# functions; those are called with OP_CALL and are defined in "native.py".
+# functions; those are called with OP_CALL and its variants and are defined in "native.py".
 #
 # Each "op{Name}" function returns a positive integer which is the number the VM PC should
 # be increased by, i.e. its operator's positional arity + 1.
+#
+# Positional arguments are always ints stored right after the opcode in a `bytecode.Code`'s
+# instruction stream: indexes into its constant pool, frame slot numbers, indexes into the
+# global symbol table (`env.SYMBOLS`), indexes into the native registry (`native.TABLE`),
+# argument counts or jump offsets.
 
 OP_ATOM = 0
 OP_CALL = 1
 OP_DEFINE = 2
 OP_FIND = 3
-OP_START_ARGS = 4
+OP_CALL1 = 4
 OP_UP_DIS = 5
 OP_DOWN_DIS = 6
 OP_JUMP = 7
 OP_JIF = 8
 OP_LAMBDA = 9
 OP_EVAL = 10
+OP_TAIL_EVAL = 11
+OP_LOCAL = 12
+OP_SET_LOCAL = 13
+OP_DEREF = 14
+OP_CALL2 = 15
+
+# Superinstructions: an argument and the native call it goes to, fused into one instruction.
+OP_LOCAL_CALL1 = 16
+OP_LOCAL_CALL2 = 17
+OP_FIND_CALL1 = 18
+OP_FIND_CALL2 = 19
+OP_ATOM_CALL2 = 20
+
+OP_SWITCH = 21
+
+# Superinstructions for calls of lambdas bound to globals: OP_FIND and the call after it.
+OP_FIND_EVAL = 22
+OP_FIND_TAIL_EVAL = 23
+
+# Not an instruction: never in code, it's what the VM runs when it gets to the end of the
+# code of a lambda it called, to return to the caller (see `VM.loop`).
+OP_RETURN = 24
+
+# The version of the instruction set. Bump it whenever an opcode is added, removed or
+# changes meaning, or the parser compiles something differently, so that code cached by
+# an older interpreter (see cache.py) is recompiled rather than run.
+VERSION = 6
+
+# Names and positional arities of the opcodes above, by opcode.
+OPNAMES = ["OP_ATOM", "OP_CALL", "OP_DEFINE", "OP_FIND", "OP_CALL1", "OP_UP_DIS", "OP_DOWN_DIS",
+           "OP_JUMP", "OP_JIF", "OP_LAMBDA", "OP_EVAL", "OP_TAIL_EVAL", "OP_LOCAL", "OP_SET_LOCAL", "OP_DEREF",
+           "OP_CALL2", "OP_LOCAL_CALL1", "OP_LOCAL_CALL2", "OP_FIND_CALL1", "OP_FIND_CALL2", "OP_ATOM_CALL2",
+           "OP_SWITCH", "OP_FIND_EVAL", "OP_FIND_TAIL_EVAL", "OP_RETURN"]
+OPARITY = [1, 2, 1, 1, 1, 0, 0, 1, 1, 1, 1, 1, 1, 1, 3, 1, 2, 2, 2, 2, 2, 3, 3, 3, 0]
+
+# The instructions that call a native, and how many of their arguments they take off the
+# stack (None: as many as their second positional argument says).
+CALLS = {OP_CALL: None, OP_CALL1: 1, OP_CALL2: 2, OP_LOCAL_CALL1: 0, OP_LOCAL_CALL2: 1,
+         OP_FIND_CALL1: 0, OP_FIND_CALL2: 1, OP_ATOM_CALL2: 1}
+
+# The superinstructions, and the instruction each one has fused in front of its call.
+FUSED = {OP_LOCAL_CALL1: OP_LOCAL, OP_LOCAL_CALL2: OP_LOCAL, OP_FIND_CALL1: OP_FIND,
+         OP_FIND_CALL2: OP_FIND, OP_ATOM_CALL2: OP_ATOM}
+
+# The other way around: the superinstruction for an instruction and a call taking as many
+# arguments, the first one of them pushed by that instruction.
+FUSE = {(FUSED[op], CALLS[op] + 1): op for op in FUSED}
+
+# The superinstructions calling a global, and the call each one has fused behind its OP_FIND.
+EVALS = {OP_FIND_EVAL: OP_EVAL, OP_FIND_TAIL_EVAL: OP_TAIL_EVAL}
 
 # Documentation syntax:
 #
@@ -28,37 +83,135 @@ OP_EVAL = 10
 # <description>
 
 # OP_ATOM/1
-# Pushes an atomic value (first positional argument) onto the stack.
+# Pushes a constant (indexed by the first positional argument) onto the stack.
 def opAtom(vm):
-    vm.push(vm.pcval(1))
+    vm.stack.append(vm.consts[vm.ops[vm.pc+1]])
     return 2
 
-# OP_CALL/1
-# Calls an internal function based on an atomic symbol identifier (first positional argument).
+# OP_CALL/2 (n)
+# Calls the native indexed by the first positional argument on as many stack-wise
+# arguments as the second positional argument says, pushing its result.
 def opCall(vm):
-    vm.fns[vm.pcval(1)](vm)
+    argc = vm.ops[vm.pc+2]
+    stack = vm.stack
+    args = stack[len(stack)-argc:]
+    del stack[len(stack)-argc:]
+    args.reverse()
+    stack.append(TABLE[vm.ops[vm.pc+1]].fn(vm, *args))
+    return 3
+
+# OP_CALL1/1 (1)
+# Calls the native indexed by the first positional argument on the stack top, replacing it
+# with the result.
+def opCall1(vm):
+    stack = vm.stack
+    stack[-1] = TABLE[vm.ops[vm.pc+1]].fn(vm, stack[-1])
+    return 2
+
+# OP_CALL2/1 (2)
+# Calls the native indexed by the first positional argument on the two values on top of
+# the stack, replacing them with the result.
+def opCall2(vm):
+    stack = vm.stack
+    a = stack.pop()
+    stack[-1] = TABLE[vm.ops[vm.pc+1]].binary(vm, a, stack[-1])
     return 2
 
 # OP_DEFINE/1 (1)
-# Binds a value (stack top) to a symbol (first positional argument).
+# Binds a value (stack top) to a global symbol (first positional argument).
 def opDefine(vm):
-    vm.defs[vm.pcval(1)] = vm.stack.pop()
+    idx = vm.ops[vm.pc+1]
+    vm.globals[idx] = vm.stack.pop()
+    vm.version = next(VERSIONS)
+    if idx in vm.watchers:
+        vm.redefined(idx) # JIT-compiled code may have relied on the old value
     return 2
 
 # OP_FIND/1
-# Finds a symbol (first positional argument) in the symbol table and pushes it onto the stack.
+# Pushes the value of a global symbol (first positional argument) onto the stack.
 def opFind(vm):
-    name = vm.pcval(1)
-    if name not in vm.defs:
-        raise Exception(f"symbol \"{name}\" not defined")
-    vm.push(vm.defs[name])
+    val = vm.globals[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{SYMBOLS.names[vm.ops[vm.pc+1]]}\" not defined")
+    vm.stack.append(val)
     return 2
 
-# OP_START_ARGS/0
-# Creates a new marker for vararg function calls.
-def opStartArgs(vm):
-    vm.argstarts.append(len(vm.stack))
-    return 1
+# OP_LOCAL/1
+# Pushes the value of a slot (first positional argument) of the current frame onto the stack.
+def opLocal(vm):
+    val = vm.frame.slots[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{vm.code.locals[vm.ops[vm.pc+1]]}\" not defined")
+    vm.stack.append(val)
+    return 2
+
+# OP_SET_LOCAL/1 (1)
+# Binds a value (stack top) to a slot (first positional argument) of the current frame.
+def opSetLocal(vm):
+    vm.frame.slots[vm.ops[vm.pc+1]] = vm.stack.pop()
+    return 2
+
+# OP_DEREF/3
+# Pushes the value of a slot (second positional argument) of an enclosing frame, the first
+# positional argument being how many frames outwards it is. The third is the constant
+# holding the name of the slot, only there for the error if it isn't bound.
+def opDeref(vm):
+    frame = vm.frame
+    for _ in range(vm.ops[vm.pc+1]):
+        frame = frame.parent
+    val = frame.slots[vm.ops[vm.pc+2]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{vm.consts[vm.ops[vm.pc+3]]}\" not defined in enclosing lambda")
+    vm.stack.append(val)
+    return 4
+
+# OP_LOCAL_CALL1/2
+# OP_LOCAL followed by OP_CALL1: calls the native indexed by the second positional argument
+# on a slot of the current frame (first positional argument), pushing the result.
+def opLocalCall1(vm):
+    val = vm.frame.slots[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{vm.code.locals[vm.ops[vm.pc+1]]}\" not defined")
+    vm.stack.append(TABLE[vm.ops[vm.pc+2]].fn(vm, val))
+    return 3
+
+# OP_LOCAL_CALL2/2 (1)
+# OP_LOCAL followed by OP_CALL2: calls the native indexed by the second positional argument
+# on a slot of the current frame (first positional argument) and the stack top, replacing
+# the latter with the result.
+def opLocalCall2(vm):
+    val = vm.frame.slots[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{vm.code.locals[vm.ops[vm.pc+1]]}\" not defined")
+    stack = vm.stack
+    stack[-1] = TABLE[vm.ops[vm.pc+2]].binary(vm, val, stack[-1])
+    return 3
+
+# OP_FIND_CALL1/2
+# OP_FIND followed by OP_CALL1.
+def opFindCall1(vm):
+    val = vm.globals[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{SYMBOLS.names[vm.ops[vm.pc+1]]}\" not defined")
+    vm.stack.append(TABLE[vm.ops[vm.pc+2]].fn(vm, val))
+    return 3
+
+# OP_FIND_CALL2/2 (1)
+# OP_FIND followed by OP_CALL2.
+def opFindCall2(vm):
+    val = vm.globals[vm.ops[vm.pc+1]]
+    if val is UNBOUND:
+        raise Exception(f"symbol \"{SYMBOLS.names[vm.ops[vm.pc+1]]}\" not defined")
+    stack = vm.stack
+    stack[-1] = TABLE[vm.ops[vm.pc+2]].binary(vm, val, stack[-1])
+    return 3
+
+# OP_ATOM_CALL2/2 (1)
+# OP_ATOM followed by OP_CALL2.
+def opAtomCall2(vm):
+    stack = vm.stack
+    stack[-1] = TABLE[vm.ops[vm.pc+2]].binary(vm, vm.consts[vm.ops[vm.pc+1]], stack[-1])
+    return 3
 
 # OP_UP_DIS/0
 # Makes the VM start disassembling if starting from 0.
@@ -70,75 +223,316 @@ def opUpDis(vm):
 # OP_JUMP/1
 # Advances the PC by the value of the first positional argument.
 def opJump(vm):
-    return vm.pcval(1)
+    return vm.ops[vm.pc+1]
 
 # OP_JIF/1 (1)
 # Jumps to the first positional argument if the top of the stack is false.
 def opJif(vm):
     if not vm.stack.pop():
-        return vm.pcval(1)
+        return vm.ops[vm.pc+1]
     return 2
 
-# OP_LAMBDA/2
-# Creates a lambda object from the first positional argument (a list of parameter names) and the
-# second positional argument (a list of VM microcode).
+# OP_SWITCH/3 (1)
+# Jumps to where the stack top's entry in a table (the dict constant indexed by the first
+# positional argument) says, or by the second positional argument if it has none. The
+# table maps keys to jump offsets; this is `case` (see `Parser.caseForm`), which is one
+# lookup however many keys there are. The third positional argument is the offset of the
+# end of the whole `case`: never jumped to by the instruction itself, it's what makes the
+# bodies of the `case` easy to find again (see decompile.py).
+def opSwitch(vm):
+    key = vm.stack.pop()
+    try:
+        return vm.consts[vm.ops[vm.pc+1]].get(key, vm.ops[vm.pc+2])
+    except TypeError:
+        return vm.ops[vm.pc+2] # unhashable, so it can't be any of the keys
+
+# OP_LAMBDA/1
+# Creates a lambda object from a code object (the constant indexed by the first positional
+# argument). The lambda captures the current frame, and counts against the budget of the
+# code running, if it has one (see budget.py).
 def opLambda(vm):
-    vm.push(Lambda(vm.pcval(1), vm.pcval(2)))
-    return 3
+    if vm.budget is not None:
+        vm.budget.allocated += 1
+    vm.stack.append(Lambda(vm.consts[vm.ops[vm.pc+1]], vm.frame))
+    return 2
 
-# OP_EVAL/0 (1)
-# Evaluates a lambda object (first stack-wise argument).
+def bind(vm, fn, argc):
+    """Pops `fn`'s `argc` arguments off the stack into a fresh frame linked to `fn`'s own."""
+    if type(fn) is not Lambda:
+        raise Exception(f"{fn}: not a lambda")
+    if argc != fn.code.nparams:
+        raise Exception(f"lambda/{fn.code.nparams}: invalid number of arguments")
+    return enter(vm, fn, argc)
+
+def enter(vm, fn, argc):
+    """`bind`, for a call already known to be of a lambda with `argc` parameters."""
+    slots = [UNBOUND] * fn.code.nlocals
+    for i in range(argc):
+        slots[i] = vm.stack.pop()
+    return Frame(slots, fn.env)
+
+# Calls don't nest Python calls: the VM keeps a stack of continuations of its own,
+# `VM.conts`, each saying where to go back to when a call returns: the code, the PC
+# after the call, the frame, and the height of the stack when the call was made, so that
+# exactly one result is left above it (see `opReturn`). A call pushes one and jumps to
+# the start of the lambda's code, all within the same `VM.loop`, so how deep calls go
+# is only limited by memory.
+
+def start(vm, fn, frame, skip):
+    """Makes the VM run `fn` in `frame`, and come back `skip` words past the PC when
+    it's done. Returns the skip for the calling instruction to return."""
+    budget = vm.budget
+    if budget is not None:
+        charge(budget, fn, len(vm.conts) + 1 + budget.level)
+    vm.conts.append((vm.code, vm.pc + skip, vm.frame, len(vm.stack)))
+    vm.frame = frame
+    vm.load(fn.code)
+    return 0
+
+def charge(budget, fn, depth):
+    """`Budget.charge` for a call of `fn`, `depth` deep, made right here in the common
+    case, that being on every call."""
+    budget.executed += fn.code.cost
+    if budget.executed > budget.horizon or depth > budget.deepest:
+        budget.settle(depth)
+
+# OP_EVAL/1 (1)
+# Evaluates a lambda object (first stack-wise argument) in a fresh frame linked to the one
+# the lambda was created in. Arguments are the following stack-wise values, and there are
+# as many of them as the first positional argument says.
 def opEval(vm):
     fn = vm.stack.pop()
-    defs = deepcopy(vm.defs)
-    for name in fn.params:
-        defs[name] = vm.stack.pop()
-    temp = vmmod.VM(defs)
-    temp.run(fn.code)
-    if len(temp.stack) == 0:
-        vm.push(None)
+    if vm.jit is not None and vm.jitcall(fn, vm.ops[vm.pc+1]):
+        return 2
+    return start(vm, fn, bind(vm, fn, vm.ops[vm.pc+1]), 2)
+
+# OP_TAIL_EVAL/1 (1)
+# Like OP_EVAL, but emitted for calls in tail position: instead of pushing a continuation
+# to come back to, it replaces the code and frame currently being executed and restarts
+# the PC, so the callee returns straight to the caller's caller, and tail-recursive loops
+# run in constant memory.
+# A JIT-compiled callee is simply called instead; being in tail position, all that's
+# left to do after it is jump to the end of the code, result on the stack.
+def opTailEval(vm):
+    fn = vm.stack.pop()
+    if vm.jit is not None and vm.jitcall(fn, vm.ops[vm.pc+1], True):
+        return 2
+    vm.frame = bind(vm, fn, vm.ops[vm.pc+1])
+    if vm.budget is not None:
+        charge(vm.budget, fn, 0) # as deep as the call it replaces
+    vm.load(fn.code)
+    return 0
+
+# OP_RETURN/0
+# Run by the VM rather than found in code: at the end of the code of a lambda that was
+# called, goes back to where the call left off (popping its continuation), leaving the
+# value the lambda evaluated to last on the stack, or nil if nothing.
+def opReturn(vm):
+    code, pc, frame, base = vm.conts.pop()
+    stack = vm.stack
+    if len(stack) != base + 1:
+        if len(stack) == base:
+            stack.append(None) # a body that evaluates to nothing (e.g. a `define`)
+        else:
+            result = stack.pop()
+            del stack[base:]
+            stack.append(result)
+    vm.code = code
+    vm.ops = code.ops
+    vm.consts = code.consts
+    vm.pc = pc
+    vm.frame = frame
+
+# Calls of globals come with an inline cache. The first time an OP_FIND_EVAL runs, it
+# looks up the global and checks that it's a lambda taking as many arguments as the call
+# passes, as OP_FIND and OP_EVAL would, and then remembers what it found in a slot of the
+# VM's `sites`: the lambda and, if it's JIT-compiled, the Python function it was compiled
+# to. From then on the instruction goes straight to those, as long as no global has
+# changed since: the slot also holds the VM's `version` of its globals, which every
+# `define` replaces with a new one (see `env.VERSIONS`).
+#
+# The slot is the one at the index the parser gave the call (see `env.SITES`), its third
+# positional argument, so finding it is as cheap as indexing a list, and checking it as
+# cheap as an `is`. The slots are the VM's rather than the code's, as code is shared
+# between VMs (by all the threads of an `Interpreter`, say), and VMs taking turns at a
+# call would keep replacing each other's. Two calls sharing an index (in copies of the
+# same code, say) share a slot, which is fine, as what's in it only depends on the
+# global and how many arguments there are.
+#
+# A lambda still being counted towards JIT compilation (see jit.py) isn't remembered, as
+# the count has to go on.
+
+class Site:
+    """The inline cache of a call of a global, in one VM."""
+    __slots__ = ("version", "fn", "func", "padding")
+
+    def __init__(self, version=None, fn=None, func=None):
+        self.version = version # the VM's `version` when it was filled in
+        self.fn = fn           # the lambda called
+        self.func = func       # what it was JIT-compiled to, or None
+        # what its frame's slots start with after the arguments: its `define`s, unbound
+        self.padding = [UNBOUND] * (fn.code.nlocals - fn.code.nparams) if fn is not None else []
+
+EMPTY = Site() # what's in the slots nothing has been remembered in yet
+
+def site(vm):
+    """Returns the slot for the call at the PC, filled in anew (or a `Site` of its own, if
+    it's not to be remembered). Raises what OP_FIND and OP_EVAL would on a bad call."""
+    fn = vm.globals[vm.ops[vm.pc+1]]
+    if fn is UNBOUND:
+        raise Exception(f"symbol \"{SYMBOLS.names[vm.ops[vm.pc+1]]}\" not defined")
+    if type(fn) is not Lambda:
+        raise Exception(f"{fn}: not a lambda")
+    if fn.code.nparams != vm.ops[vm.pc+2]:
+        raise Exception(f"lambda/{fn.code.nparams}: invalid number of arguments")
+    func = vm.compiled(fn) if vm.jit is not None else None
+    if not (func is not None or vm.jit is None or fn.calls < 0):
+        return Site(None, fn, func)
+    idx, sites = vm.ops[vm.pc+3], vm.sites
+    if idx >= len(sites):
+        sites.extend([EMPTY] * (idx + 1 - len(sites)))
+    slot = sites[idx]
+    if slot is EMPTY:
+        slot = sites[idx] = Site()
+    if slot.fn is not fn:
+        slot.padding = [UNBOUND] * (fn.code.nlocals - fn.code.nparams)
+    slot.version, slot.fn, slot.func = vm.version, fn, func
+    return slot
+
+def cached(vm):
+    """Whether the call at the PC will use its slot (see profiler.py)."""
+    idx = vm.ops[vm.pc+3]
+    return idx < len(vm.sites) and vm.sites[idx].version is vm.version
+
+# OP_FIND_EVAL/3 (n)
+# OP_FIND followed by OP_EVAL: calls the lambda bound to a global (first positional
+# argument) with as many stack-wise arguments as the second positional argument says.
+# The third is the index of the call's inline cache. What `enter` and `start` do is done
+# right here, that being most of what a call costs once it's cached.
+def opFindEval(vm):
+    try:
+        slot = vm.sites[vm.ops[vm.pc+3]]
+    except IndexError:
+        slot = EMPTY
+    if slot.version is not vm.version:
+        slot = site(vm)
+    fn = slot.fn
+    if slot.func is not None:
+        vm.invoke(fn, slot.func, vm.ops[vm.pc+2])
+        return 4
+    stack = vm.stack
+    argc = vm.ops[vm.pc+2]
+    if argc:
+        slots = stack[-argc:]
+        del stack[-argc:]
+        slots.reverse()
+        slots += slot.padding
     else:
-        vm.push(temp.stack.pop())
-    return 1
+        slots = slot.padding[:]
+    budget = vm.budget
+    if budget is not None:
+        budget.executed += fn.code.cost
+        depth = len(vm.conts) + 1 + budget.level
+        if budget.executed > budget.horizon or depth > budget.deepest:
+            budget.settle(depth)
+    vm.conts.append((vm.code, vm.pc + 4, vm.frame, len(stack)))
+    vm.frame = Frame(slots, fn.env)
+    code = vm.code = fn.code
+    vm.ops = code.ops
+    vm.consts = code.consts
+    vm.pc = 0
+    return 0
 
+# OP_FIND_TAIL_EVAL/3 (n)
+# OP_FIND followed by OP_TAIL_EVAL.
+def opFindTailEval(vm):
+    try:
+        slot = vm.sites[vm.ops[vm.pc+3]]
+    except IndexError:
+        slot = EMPTY
+    if slot.version is not vm.version:
+        slot = site(vm)
+    fn = slot.fn
+    if slot.func is not None:
+        vm.invoke(fn, slot.func, vm.ops[vm.pc+2], True)
+        return 4
+    stack = vm.stack
+    argc = vm.ops[vm.pc+2]
+    if argc:
+        slots = stack[-argc:]
+        del stack[-argc:]
+        slots.reverse()
+        slots += slot.padding
+    else:
+        slots = slot.padding[:]
+    if vm.budget is not None:
+        charge(vm.budget, fn, 0) # as deep as the call it replaces
+    vm.frame = Frame(slots, fn.env)
+    code = vm.code = fn.code
+    vm.ops = code.ops
+    vm.consts = code.consts
+    vm.pc = 0
+    return 0
 
-# These are the disassembled versions of each of the VM's opcodes. They will be executed
-# instead of their default counterparts above when in disassembly mode.
 
-def disAtom(vm):
-    print(f"{vm.pc:03} -- OP_ATOM   {str(vm.pcval(1))}")
-    return 2
+# These are the disassembled versions of the VM's opcodes. They will be executed instead of
+# their default counterparts above when in disassembly mode. Apart from the two that steer
+# disassembly mode itself, they all just print the instruction under the PC.
 
-def disCall(vm):
-    print(f"{vm.pc:03} -- OP_CALL   {vm.pcval(1)}")
-    return 2
+def operand(code, op, arg):
+    """Renders the positional argument of a one-argument instruction."""
+    if op == OP_ATOM:
+        return code.consts[arg]
+    elif op in (OP_DEFINE, OP_FIND):
+        return SYMBOLS.names[arg]
+    elif op in (OP_LOCAL, OP_SET_LOCAL):
+        return code.locals[arg]
+    elif op == OP_LAMBDA:
+        return f"({' '.join(code.consts[arg].params)})"
+    elif op in (OP_CALL1, OP_CALL2):
+        return TABLE[arg].name
+    return arg
 
-def disDefine(vm):
-    print(f"{vm.pc:03} -- OP_DEFINE {vm.pcval(1)}")
-    return 2
+def describe(code, pc):
+    """Renders the instruction at `pc` of `code` as a line of text."""
+    op = code.ops[pc]
+    args = code.ops[pc+1:pc+1+OPARITY[op]]
+    if op in FUSED:
+        # the argument as its own instruction would show it, then the native
+        args = [operand(code, FUSED[op], args[0]), TABLE[args[1]].name]
+    elif op == OP_CALL:
+        args = [TABLE[args[0]].name, args[1]]
+    elif op in EVALS:
+        args = [SYMBOLS.names[args[0]], args[1]] # the call site index means nothing to a reader
+    elif op == OP_DEREF:
+        args = [args[0], args[1], code.consts[args[2]]]
+    elif op == OP_SWITCH:
+        # key:offset for every entry in the table, then the default and the end
+        args = [" ".join(f"{key}:{off}" for key, off in code.consts[args[0]].items()) or "{}", args[1], args[2]]
+    elif len(args) == 1:
+        args = [operand(code, op, args[0])]
+    return f"{pc:03} -- {OPNAMES[op]:<14} {' '.join(str(arg) for arg in args)}".rstrip()
 
-def disFind(vm):
-    print(f"{vm.pc:03} -- OP_FIND   {vm.pcval(1)} ")
-    return 2
+def disassemble(code, indent=""):
+    """Returns the listing of `code`, including the bodies of the lambdas it creates."""
+    lines = []
+    pc = 0
+    while pc < len(code.ops):
+        lines.append(indent + describe(code, pc))
+        if code.ops[pc] == OP_LAMBDA:
+            lines += disassemble(code.consts[code.ops[pc+1]], indent + "    ")
+        pc += OPARITY[code.ops[pc]] + 1
+    return lines
 
-def disStartArgs(vm):
-    print(f"{vm.pc:03} -- OP_START_ARGS")
-    return 1
+def disInstr(vm):
+    print(describe(vm.code, vm.pc))
+    return OPARITY[vm.ops[vm.pc]] + 1
 
 def disUpDis(vm):
     vm.disstate += 1
-    print(f"{vm.pc:03} -- OP_UP_DIS")
+    print(describe(vm.code, vm.pc))
     return 1
 
-def disJump(vm):
-    print(f"{vm.pc:03} -- OP_JUMP   {vm.pcval(1)}")
-    return 2
-
-
-def disJif(vm):
-    print(f"{vm.pc:03} -- OP_JIF    {vm.pcval(1)}")
-    return 2
-
 # OP_DOWN_DIS/0
 # Makes the VM end disassembling if vm.disstate reaches 0. This is the only opcode that does not have
 # two optable-dependent variants -- there is no logical way in which we could encounter
@@ -146,18 +540,20 @@ def disJif(vm):
 def disDownDis(vm):
     vm.disstate -= 1
     if vm.disstate == 0:
-        vm.optable = OPTABLE
+        vm.optable = vm.runtable
     else:
-        print(f"{vm.pc:03} -- OP_DOWN_DIS")
+        print(describe(vm.code, vm.pc))
     return 1
 
 def disLambda(vm):
-    print(f"{vm.pc:03} -- OP_LAMBDA {vm.pcval(1)} {vm.pcval(2)}")
-    return 3
-
-def disEval(vm):
-    print(f"{vm.pc:03} -- OP_EVAL")
-    return 1
+    print(describe(vm.code, vm.pc))
+    for line in disassemble(vm.consts[vm.ops[vm.pc+1]], "    "):
+        print(line)
+    return 2
 
-OPTABLE = [opAtom, opCall, opDefine, opFind, opStartArgs, opUpDis, disDownDis, opJump, opJif, opLambda, opEval]
-DISOPTABLE = [disAtom, disCall, disDefine, disFind, disStartArgs, disUpDis, disDownDis, disJump, disJif, disLambda, disEval]
\ No newline at end of file
+OPTABLE = [opAtom, opCall, opDefine, opFind, opCall1, opUpDis, disDownDis, opJump, opJif, opLambda, opEval, opTailEval,
+           opLocal, opSetLocal, opDeref, opCall2, opLocalCall1, opLocalCall2, opFindCall1, opFindCall2, opAtomCall2,
+           opSwitch, opFindEval, opFindTailEval, opReturn]
+DISOPTABLE = [disInstr, disInstr, disInstr, disInstr, disInstr, disUpDis, disDownDis, disInstr, disInstr, disLambda, disInstr, disInstr,
+              disInstr, disInstr, disInstr, disInstr, disInstr, disInstr, disInstr, disInstr, disInstr,
+              disInstr, disInstr, disInstr, opReturn]
@@ -0,0 +1,283 @@
+from bytecode import Code
+from cons import Cons
+from env import SITES
+from native import TABLE
+from ops import *
+
+# An optional optimizer for compiled code, run between `Parser.parse` and `VM.run`. It
+# rewrites the microcode of a code object (and of every lambda body in it) without
+# changing what it evaluates to:
+#
+# - constant folding: a pure native called on constants is called right here, once, and
+#   replaced by its result, so `(+ 1 2 3)` becomes a single OP_ATOM. Quoted lists are
+#   folded the same way, since `quote` compiles to `cons` calls. A call that would fail
+#   is left alone so it still fails when (and only if) it runs;
+# - dead branches: an OP_JIF on a constant either always falls through or always jumps,
+#   so `(cond (true X))` loses its test, and code nothing jumps to after an unconditional
+#   jump is dropped. An OP_SWITCH on a constant becomes a jump to where it would go;
+# - peephole rewrites: a jump to an OP_JUMP goes straight to where that one goes, and an
+#   OP_JUMP to the very next instruction is removed. Once everything else is done, calls
+#   that have become fusable into superinstructions are fused.
+#
+# Code inside `dis` is left exactly as compiled, since it is only ever printed.
+#
+# Dead code is dropped before anything is folded (and lambda bodies are only optimized
+# once it's known they're not in dead code), as folding runs natives, and there's no
+# point running ones, slow or big as they may be, that never would.
+#
+# To make all that easy the instruction stream is first decoded into a list of `Instr`s
+# whose jumps point at other `Instr`s instead of holding offsets, and superinstructions
+# are split back into their parts; it's all re-encoded at the end. An OP_SWITCH's table
+# maps its keys to `Instr`s too, its `target` is where it goes for other keys and its
+# second argument the `Instr` at the end of its `case`. Those are never threaded, so the
+# `case` keeps the shape decompile.py looks for.
+
+# What jumps to the end of the code point at.
+END = None
+
+class Instr:
+    __slots__ = ("op", "args", "target", "frozen")
+
+    def __init__(self, op, args, frozen):
+        self.op = op
+        self.args = args     # the positional arguments, with constant indexes replaced by the constants
+        self.target = END    # for jumps (and switches, with no matching key), the `Instr` jumped to
+        self.frozen = frozen # whether this is part of a `dis`, not to be touched
+
+def optimize(code):
+    """Returns an optimized copy of `code`."""
+    instrs = decode(code)
+    while True:
+        while branches(instrs) | jumps(instrs):
+            instrs = [instr for instr in instrs if instr.op is not None]
+        if not fold(instrs):
+            break
+        instrs = [instr for instr in instrs if instr.op is not None]
+    for instr in instrs:
+        if instr.op == OP_LAMBDA and not instr.frozen:
+            instr.args[0] = optimize(instr.args[0])
+    fuse(instrs)
+    return encode([instr for instr in instrs if instr.op is not None], code)
+
+def decode(code):
+    ops, consts = code.ops, code.consts
+    instrs, at = [], {} # `at` maps pcs to the `Instr`s there
+    depth = pc = 0
+    while pc < len(ops):
+        op = ops[pc]
+        args = list(ops[pc+1:pc+1+OPARITY[op]])
+        if op == OP_UP_DIS:
+            depth += 1
+        if op in FUSED and depth == 0:
+            # back to the instruction and the call
+            at[pc] = instr = Instr(FUSED[op], args[:1], False)
+            instrs += (instr, Instr(OP_CALL1 if CALLS[op] == 0 else OP_CALL2, args[1:], False))
+        elif op in EVALS and depth == 0:
+            at[pc] = instr = Instr(OP_FIND, args[:1], False)
+            instrs += (instr, Instr(EVALS[op], args[1:2], False)) # its cache goes, see `fuse`
+        else:
+            at[pc] = instr = Instr(op, args, depth > 0)
+            instrs.append(instr)
+        if op in (OP_ATOM, OP_LAMBDA, OP_ATOM_CALL2):
+            instr.args[0] = consts[args[0]]
+        elif op == OP_DEREF:
+            instr.args[2] = consts[args[2]]
+        if op == OP_DOWN_DIS:
+            depth -= 1
+        pc += OPARITY[op] + 1
+
+    for pc, instr in at.items():
+        if instr.op in (OP_JUMP, OP_JIF):
+            instr.target = at.get(pc + instr.args[0], END)
+        elif instr.op == OP_SWITCH:
+            table, default, end = instr.args
+            instr.args = [{key: at.get(pc + off, END) for key, off in consts[table].items()}, at.get(pc + end, END)]
+            instr.target = at.get(pc + default, END)
+    return instrs
+
+def encode(instrs, code):
+    pcs, pc = {}, 0
+    for instr in instrs:
+        pcs[instr] = pc
+        pc += OPARITY[instr.op] + 1
+    pcs[END] = pc
+
+    ops, consts, constidx = [], [], {}
+    for instr in instrs:
+        args = list(instr.args)
+        if instr.op in (OP_ATOM, OP_LAMBDA, OP_ATOM_CALL2):
+            # keyed like `parse.Unit.const`, so `true` and `1` stay apart
+            key = (type(args[0]), args[0]) if type(args[0]) not in (Code, Cons) else id(args[0])
+            if key not in constidx:
+                constidx[key] = len(consts)
+                consts.append(args[0])
+            args[0] = constidx[key]
+        elif instr.op == OP_DEREF:
+            key = (str, args[2])
+            if key not in constidx:
+                constidx[key] = len(consts)
+                consts.append(args[2])
+            args[2] = constidx[key]
+        elif instr.op in (OP_JUMP, OP_JIF):
+            args[0] = pcs[instr.target] - pcs[instr]
+        elif instr.op == OP_SWITCH:
+            table, end = args
+            consts.append({key: pcs[target] - pcs[instr] for key, target in table.items()})
+            args = [len(consts) - 1, pcs[instr.target] - pcs[instr], pcs[end] - pcs[instr]]
+        ops += [instr.op] + args
+    return Code(ops, consts, code.nparams, code.locals)
+
+def targets(instrs):
+    """Returns the `Instr`s something jumps to (or a `case` ends at)."""
+    jumped = set()
+    for instr in instrs:
+        jumped.update(destinations(instr))
+        if instr.op == OP_SWITCH:
+            jumped.add(instr.args[1])
+    return jumped
+
+def destinations(instr):
+    """Returns the `Instr`s `instr` can jump to."""
+    if instr.op in (OP_JUMP, OP_JIF):
+        return [instr.target]
+    if instr.op == OP_SWITCH:
+        return [*instr.args[0].values(), instr.target]
+    return []
+
+def remove(instrs, dead):
+    """Marks the `Instr`s in `dead` as removed, moving whatever jumps to one of them to the
+    first following instruction that stays."""
+    if not dead:
+        return False
+    forward, following = {}, END
+    for instr in reversed(instrs):
+        if instr in dead:
+            forward[instr] = following
+        else:
+            following = instr
+    for instr in instrs:
+        if instr.op in (OP_JUMP, OP_JIF, OP_SWITCH) and instr.target in forward:
+            instr.target = forward[instr.target]
+        if instr.op == OP_SWITCH:
+            table, end = instr.args
+            instr.args = [{key: forward.get(target, target) for key, target in table.items()}, forward.get(end, end)]
+    for instr in dead:
+        instr.op = None
+    return True
+
+def fold(instrs):
+    """Replaces pure native calls on constant arguments with their results. Stops at the
+    first one that makes the condition of a jump constant, as that may make the code
+    after it dead."""
+    jumped = targets(instrs)
+    dead = set()
+    live = [] # the instructions kept so far, the last ones possibly being folded next
+    for i, instr in enumerate(instrs):
+        live.append(instr)
+        if instr.op not in (OP_CALL, OP_CALL1, OP_CALL2) or instr.frozen or instr in jumped:
+            continue
+        native = TABLE[instr.args[0]]
+        argc = instr.args[1] if instr.op == OP_CALL else CALLS[instr.op]
+        if not native.pure:
+            continue
+
+        # the call and the constants it takes
+        if len(live) < argc + 1:
+            continue
+        run = live[len(live)-1-argc:]
+        if any(i.op != OP_ATOM or i.frozen for i in run[:-1]):
+            continue
+        if any(i in jumped for i in run[1:]):
+            continue
+
+        args = [i.args[0] for i in run[:-1]][::-1] # in source order
+        try:
+            val = native.fn(None, *args)
+        except Exception:
+            continue # it fails at runtime too
+
+        # the first instruction becomes the result, so jumps to it still land right
+        run[0].op, run[0].args = OP_ATOM, [val]
+        dead.update(run[1:])
+        del live[len(live)-argc:]
+        if i + 1 < len(instrs) and instrs[i+1].op in (OP_JIF, OP_SWITCH):
+            break
+    return remove(instrs, dead)
+
+def branches(instrs):
+    """Resolves jumps on constant conditions and drops unreachable code."""
+    instrs = [instr for instr in instrs if instr.op is not None]
+    jumped = targets(instrs)
+    dead = set()
+    for test, jif in zip(instrs, instrs[1:]):
+        if test.op == OP_ATOM and jif.op == OP_JIF and not jif.frozen and jif not in jumped and test not in dead:
+            if test.args[0]:
+                dead.update((test, jif))
+            else:
+                test.op, test.args, test.target = OP_JUMP, [0], jif.target
+                dead.add(jif)
+        elif test.op == OP_ATOM and jif.op == OP_SWITCH and not jif.frozen and jif not in jumped and test not in dead:
+            try:
+                target = jif.args[0].get(test.args[0], jif.target)
+            except TypeError:
+                target = jif.target
+            test.op, test.args, test.target = OP_JUMP, [0], target
+            dead.add(jif)
+    changed = remove(instrs, dead)
+    live = [instr for instr in instrs if instr.op is not None]
+
+    # everything not reachable from the start
+    index = {instr: i for i, instr in enumerate(live)}
+    reached, todo = set(), [0] if live else []
+    while todo:
+        i = todo.pop()
+        if i in reached or i >= len(live):
+            continue
+        reached.add(i)
+        instr = live[i]
+        # inside a `dis` instructions are only printed, one after the other
+        if instr.frozen or instr.op not in (OP_JUMP, OP_SWITCH):
+            todo.append(i + 1)
+        if not instr.frozen:
+            todo += (index[target] for target in destinations(instr) if target is not END)
+            if instr.op == OP_SWITCH and instr.args[1] is not END:
+                # kept even if its bodies all jump past it, as it marks where they end
+                todo.append(index[instr.args[1]])
+    return remove(live, {instr for i, instr in enumerate(live) if i not in reached}) or changed
+
+def jumps(instrs):
+    """Threads jumps through OP_JUMPs and removes OP_JUMPs to the next instruction."""
+    changed = False
+    for instr in instrs:
+        if instr.op not in (OP_JUMP, OP_JIF) or instr.frozen:
+            continue
+        seen = {instr}
+        while instr.target is not END and instr.target.op == OP_JUMP and instr.target not in seen:
+            seen.add(instr.target)
+            instr.target = instr.target.target
+            changed = True
+
+    live = [instr for instr in instrs if instr.op is not None]
+    dead = set()
+    for instr, following in zip(live, live[1:] + [END]):
+        if instr.op == OP_JUMP and not instr.frozen and instr.target is following:
+            dead.add(instr)
+    return remove(live, dead) or changed
+
+def fuse(instrs):
+    """Fuses instructions and the calls right after them into superinstructions."""
+    jumped = targets(instrs)
+    for instr, call in zip(instrs, instrs[1:]):
+        if instr.op is None or instr.frozen or call.frozen or call in jumped:
+            continue
+        if instr.op == OP_FIND and call.op in (OP_EVAL, OP_TAIL_EVAL):
+            instr.op = OP_FIND_EVAL if call.op == OP_EVAL else OP_FIND_TAIL_EVAL
+            instr.args = instr.args + call.args + [next(SITES)]
+            call.op = None
+            continue
+        if call.op not in (OP_CALL1, OP_CALL2):
+            continue
+        op = FUSE.get((instr.op, CALLS[call.op]))
+        if op is not None:
+            instr.op, instr.args = op, instr.args + call.args
+            call.op = None
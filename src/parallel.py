@@ -0,0 +1,211 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os.path import dirname, join
+import copyreg
+import io
+import multiprocessing
+import os
+import pickle
+
+from bytecode import Code
+from cons import Cons, hashcons
+from env import SYMBOLS, UNBOUND
+from lambdaobj import Lambda
+from native import native, NATIVES
+from ops import OPARITY
+import cache
+import jit
+import native as natives
+
+# Parallel natives, running a lambda over the elements of a list in a pool of worker
+# processes:
+#
+# - `(pmap FN LIST)` is the list of [FN] applied to each element of [LIST], in order;
+# - `(preduce FN INIT LIST)` folds [LIST] into [INIT] from the left with [FN], which
+#   has to be associative: each worker folds a run of elements, and the results of the
+#   runs are folded together once they're back.
+#
+# The workers are forked the first time they're needed, each with a VM of its own that
+# has the prelude loaded, and are reused from then on. The list is cut into a few chunks
+# per worker, so each one is sent and returned in one go; short lists (and lambdas that
+# can't be sent, see below) aren't worth it and are simply run here. So is everything
+# under a budget: the workers couldn't be held to it, and what they ran wouldn't count
+# against it.
+#
+# Everything crosses the process boundary pickled, with a few special cases (`REDUCERS`):
+# code objects go through the code cache's format (see cache.py), which refers to globals
+# and natives by name, since the worker's symbol table doesn't match ours; long lists are
+# flattened, so they don't recurse; lambdas are sent as their code and the frame they
+# closed over, without anything the JIT made of them. Along with a lambda go the values
+# of the globals its code (and the code of the lambdas it reaches) refers to, which the
+# worker defines before running it.
+
+MIN_ITEMS = 128       # lists shorter than this are mapped here
+WORKERS = os.cpu_count() or 1
+CHUNKS = 4            # how many chunks per worker a list is cut into
+
+PRELUDE_PATH = join(dirname(__file__), "prelude.lisp")
+
+POOL = None     # the worker pool...
+SETTINGS = None # ...and the VM settings its workers were made with
+
+# In a worker: its VM, and the lambdas (and globals) it was sent, by payload.
+WORKER = None
+RECEIVED = {}
+
+def dumps(obj):
+    buf = io.BytesIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = REDUCERS
+    pickler.dump(obj)
+    return buf.getvalue()
+
+def loads(data):
+    return pickle.loads(data)
+
+def load_code(data):
+    return cache.loads(data)
+
+def load_list(items, tail):
+    make = hashcons if natives.HASHCONS else Cons
+    lst = tail
+    for item in reversed(items):
+        lst = make(item, lst)
+    return lst
+
+def reduce_list(lst):
+    items = []
+    while type(lst) is Cons:
+        items.append(lst.car)
+        lst = lst.cdr
+    return load_list, (items, lst)
+
+REDUCERS = copyreg.dispatch_table.copy()
+REDUCERS[Code] = lambda code: (load_code, (cache.dumps(code),))
+REDUCERS[Cons] = reduce_list
+REDUCERS[Lambda] = lambda fn: (Lambda, (fn.code, fn.env))
+REDUCERS[type(UNBOUND)] = lambda _: "UNBOUND" # the one in env.py
+
+def dependencies(vm, fn):
+    """Returns the globals `fn` may need, by name: the ones its code refers to, and the
+    ones the code of the lambdas among those (and in its frames) refers to."""
+    needed = {}
+    todo, seen = [fn], set()
+    while todo:
+        val = todo.pop()
+        if type(val) is not Lambda or id(val) in seen:
+            continue
+        seen.add(id(val))
+        frame = val.env
+        while frame is not None:
+            todo += frame.slots
+            frame = frame.parent
+        codes = [val.code]
+        while codes:
+            code = codes.pop()
+            codes += [const for const in code.consts if type(const) is Code]
+            pc = 0
+            while pc < len(code.ops):
+                op = code.ops[pc]
+                if op in cache.GLOBAL_OPERAND:
+                    idx = code.ops[pc + 1 + cache.GLOBAL_OPERAND[op]]
+                    if idx < len(vm.globals) and vm.globals[idx] is not UNBOUND:
+                        needed[SYMBOLS.names[idx]] = vm.globals[idx]
+                        todo.append(vm.globals[idx])
+                pc += OPARITY[op] + 1
+    return needed
+
+def pool(vm):
+    """Returns the worker pool, starting it if needed."""
+    global POOL, SETTINGS
+    if POOL is None or SETTINGS != (vm.backend, vm.jit):
+        if POOL is not None:
+            POOL.shutdown()
+        # forked, as the main script isn't safe to import again
+        context = multiprocessing.get_context("fork")
+        POOL = ProcessPoolExecutor(WORKERS, context, initializer=start, initargs=(vm.backend, vm.jit))
+        SETTINGS = (vm.backend, vm.jit)
+    return POOL
+
+def start(backend, threshold):
+    """Sets up a worker."""
+    global WORKER
+    from lex import Lexer
+    from parse import Parser
+    from vm import VM
+    WORKER = VM(backend=backend, jit=threshold)
+    with open(PRELUDE_PATH) as f:
+        WORKER.run(Parser().parse(Lexer().lex(f.read())))
+
+def call(vm, fn, args):
+    return jit.call(vm, fn, args) if vm.jit is not None else vm.apply(fn, args)
+
+def fold(vm, fn, acc, items):
+    for item in items:
+        acc = call(vm, fn, [acc, item])
+    return acc
+
+def work(payload, chunk, folding):
+    """Runs in a worker: maps (or folds) a chunk of elements with the lambda in `payload`."""
+    if payload not in RECEIVED:
+        if len(RECEIVED) > 16:
+            RECEIVED.clear()
+        RECEIVED[payload] = loads(payload)
+    fn, needed = RECEIVED[payload]
+    for name, val in needed.items():
+        idx = SYMBOLS.intern(name)
+        WORKER.reserve()
+        if WORKER.globals[idx] is not val:
+            WORKER.define(name, val)
+
+    items = loads(chunk)
+    if folding:
+        return dumps(fold(WORKER, fn, items[0], items[1:]))
+    return dumps([call(WORKER, fn, [item]) for item in items])
+
+def distribute(vm, name, fn, items, folding):
+    """Sends chunks of `items` to the workers, returning what each one gave back, in order;
+    or None if it's better to do it all here."""
+    if type(fn) is not Lambda:
+        raise Exception(f"{fn}: not a lambda")
+    if len(items) < MIN_ITEMS or WORKERS < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    if vm.budget is not None:
+        return None # run on the metered VM, so it all counts
+    try:
+        payload = dumps((fn, dependencies(vm, fn)))
+    except (ValueError, TypeError, pickle.PicklingError):
+        return None # holding something that can't be sent, like a memoized lambda
+
+    size = -(-len(items) // (WORKERS * CHUNKS))
+    try:
+        futures = [pool(vm).submit(work, payload, dumps(items[i:i+size]), folding)
+                   for i in range(0, len(items), size)]
+        return [loads(future.result()) for future in futures]
+    except BrokenProcessPool:
+        raise Exception(f"{name}: a worker process died")
+
+def items(name, lst):
+    if lst is None:
+        return []
+    if type(lst) is not Cons:
+        raise Exception(f"{name}: invalid argument type")
+    return lst.items()
+
+@native("pmap", 2, pure=False) # applies a lambda to each element of a list, in parallel
+def pmap(vm, fn, lst):
+    elements = items("pmap/2", lst)
+    chunks = distribute(vm, "pmap/2", fn, elements, False)
+    if chunks is None:
+        results = [call(vm, fn, [el]) for el in elements]
+    else:
+        results = [res for chunk in chunks for res in chunk]
+    return NATIVES["list"].fn(vm, *results)
+
+@native("preduce", 3, pure=False) # folds a list with an associative lambda, in parallel
+def preduce(vm, fn, init, lst):
+    elements = items("preduce/3", lst)
+    chunks = distribute(vm, "preduce/3", fn, [init] + elements, True)
+    if chunks is None:
+        return fold(vm, fn, init, elements)
+    return fold(vm, fn, chunks[0], chunks[1:])
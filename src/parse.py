@@ -1,6 +1,13 @@
 from cons import *
 from ops import *
-from lambdaobj import *
+from bytecode import Code
+from env import SITES, SYMBOLS
+from native import NATIVES
+from pvector import PVector
+import native
+import memo # registers the natives defined there
+import parallel # same
+import vector # same
 
 # As mentioned in the readme and the name of this project suggests, the process
 # of taking some cons- (or Polish notation) code and turning it into RPN-compliant
@@ -17,22 +24,93 @@ from lambdaobj import *
 # on the other hand RPN code (the one we're compiling *to*) has only one level of nestation
 # -- each instruction in a list encountered by the stack-based VM can be executed
 # instantly.
+#
+# Every lambda body (and the top-level program) is compiled into its own `bytecode.Code`
+# by a `Unit`. Names are resolved right here rather than at runtime: a lambda's parameters
+# and everything it `define`s get numbered frame slots, names from enclosing lambdas become
+# (depth, slot) pairs (plus the name, as a constant, for error messages) and anything else is a global, referred to by its `env.SYMBOLS` index.
+#
+# Compilation is a single pass that appends straight to the unit's `code` buffer; nothing
+# is compiled twice and no code is ever copied from one list into another. Jumps target
+# labels, which are resolved against the unit's own buffer once it is complete, so nested
+# `cond`s (and `cond`s inside lambdas inside `cond`s) can't get in each other's way.
+
+# How many pairs of a `cond` have to test the same variable against constants before they
+# are compiled like a `case` (see `Parser.condForm`).
+SWITCH_MIN = 4
+
+class Unit:
+    """The state of one code object being compiled."""
+
+    def __init__(self, parent=None, locals=()):
+        self.parent = parent        # the enclosing unit, None for the top level
+        self.locals = list(locals)  # slot -> name
+        self.slots = {name: slot for slot, name in enumerate(self.locals)}
+        self.consts = []
+        self.constidx = {}          # (type, value) -> index, to dedupe atoms
+        self.code = []              # the instruction stream emitted so far
+        self.labels = []            # label -> its position in `code`, once placed
+        self.patches = []           # (operand position, label) of every jump
+        self.switches = []          # (position, table, default label, end label) of every OP_SWITCH
+        self.unquoting = 0          # how many `unquote`s deep in this unit's code we are
+
+    def const(self, val):
+        """Returns the index of `val` in the constant pool, adding it if necessary."""
+        # keyed on type too, or `true` and `1` would be merged; lists and vectors, which
+        # compare structurally, by identity for the same reason; code objects and switch
+        # tables are never shared
+        key = (type(val), val) if type(val) not in (Code, Cons, PVector, dict) else None if type(val) in (Code, dict) else id(val)
+        if key is not None and key in self.constidx:
+            return self.constidx[key]
+        self.consts.append(val)
+        if key is not None:
+            self.constidx[key] = len(self.consts) - 1
+        return len(self.consts) - 1
+
+    def label(self):
+        """Returns a new, not yet placed, jump target."""
+        self.labels.append(None)
+        return len(self.labels) - 1
+
+    def place(self, label):
+        """Makes `label` refer to the next instruction emitted."""
+        self.labels[label] = len(self.code)
+
+    def jump(self, op, label):
+        """Emits the jump instruction `op` to `label`."""
+        self.code += (op, 0)
+        self.patches.append((len(self.code) - 1, label))
+
+    def switch(self, table, default, end):
+        """Emits an OP_SWITCH with `table`, a dict of keys to labels, jumping to `default`
+        for any other key; `end` is where the whole `case` ends."""
+        self.code += (OP_SWITCH, self.const(table), 0, 0)
+        self.switches.append((len(self.code) - 4, table, default, end))
+
+    def finish(self, nparams=0):
+        """Resolves the jumps and returns the finished code object."""
+        code = self.code
+        for patch, label in self.patches:
+            # jump offsets are relative to the jump instruction itself
+            code[patch] = self.labels[label] - (patch - 1)
+        for pos, table, default, end in self.switches:
+            for key, label in table.items():
+                table[key] = self.labels[label] - pos
+            code[pos+2], code[pos+3] = self.labels[default] - pos, self.labels[end] - pos
+        return Code(code, self.consts, nparams, self.locals)
 
 class Parser:
     def __init__(self):
         # These are all the internal functions (PN) / words (RPN) known to this parser and
-        # the stack-based VM. Each
-        #     (key, value)
-        # pair corresponds to
-        #     (name, arity).
-        # Arity equal to -1 indicates that the function is vararg (variadic argument) and
-        # the parser must mark the start of arguments with the OP_START_ARGS opcode for
-        # the VM to know how many values to take into consideration. Another solution to this
-        # problem is simply counting how many arguments the function takes and emitting that
-        # into the VM microcode, but this is to me seems a bit more intuitive.
+        # the stack-based VM: the registry in native.py, by name.
+        # Arity equal to -1 indicates that the function is vararg (variadic argument), so
+        # the VM needs to be told how many values to take into consideration. This is done
+        # by simply counting how many arguments the function is given and emitting that
+        # into the VM microcode, right in the call instruction. (There used to be an
+        # OP_START_ARGS opcode marking the start of the arguments on the stack instead.)
         # Yet another solution includes noticing that any sort of vararg function is a fold (the one
         # from functional programming); any kind of arithmetic operation is a fold with itself,
-        # `list` is a fold with an expression `lambda a, b: Cons(b, a)`, (as seen in native.py) etc.,
+        # `list` is a fold with an expression `lambda a, b: Cons(b, a)`, etc.,
         # so, possibly, the parser alone could interpret these variadic functions as folds and  
         # repeatedly call a binary function on all of its arguments. As an example take
         # ```
@@ -42,174 +120,370 @@ class Parser:
         # ```
         # 5 4 + 3 + 2 + 1 +
         # ```
-        self.fns = {
-            "+": -1,    # adds some numbers
-            "-": -1,    # subtracts some numbers
-            "*": -1,    # multiplies some numbers
-            "/": -1,    # divides some numbers
-            "eq?": 2,   # whether two expressions are equal
-            "atom?": 1, # whether an expression is an atom
-            "nil?": 1,  # whether an expression is nil
-            "cons": 2,  # creates a cons pair
-            "list": -1, # creates a list from cons pairs
-            "car": 1,   # returns the first element of a list expression (PN) / quote (RPN)
-            "cdr": 1,   # returns the tail of a list expression (PN) / quote (RPN)
-        }
+        self.fns = NATIVES
 
-        # when 0, everything is executed as expected.
-        # when >0, instead every instruction is disassembled.
-        # OP_UPDIS increments this, OP_DOWNDIS decrements — this
-        # allows for nested `dis` expressions
-        self.disstate = 0
-        self.jumppatches = []
+        self.unit = None # the code object being compiled
 
-    def parse(self, lex):
-        res = []
+        # The special forms, by name.
+        self.forms = {
+            "quote": self.quoteForm,
+            "define": self.defineForm,
+            "dis": self.disForm,
+            "cond": self.condForm,
+            "case": self.caseForm,
+            "lambda": self.lambdaForm,
+            "λ": self.lambdaForm,
+        }
 
+    def parse(self, lex):
+        self.unit = Unit()
         for expr in lex:
-            res += self._parse(expr)
-        return res
+            self._parse(expr)
+        return self.unit.finish()
 
-    def _parse(self, expr):
+    def _parse(self, expr, tail=False):
+        # Compiles [EXPR] onto the end of the current unit's code.
+        #
+        # `tail` is true when [EXPR] is the last thing a lambda body evaluates; calls in that
+        # position are emitted as OP_TAIL_EVAL so the VM can reuse the current frame.
         if type(expr) is Cons:
             fn = expr.car
-
-            # `(quote EXPR)`
-            # Takes an expression [EXPR] as an argument and returns it as data.
-            # Identifiers are rendered as Python strings.
-            if fn == 'quote':
-                if len(expr) != 2:
-                    raise Exception("quote/1: invalid number of arguments")
-                return self.quote(expr.cdr.car)
-
-            # `(define NAME VALUE)`
-            # Takes an identifier [NAME] and an expression [VALUE] as arguments and
-            # binds [VALUE] to [NAME], so that every instance of [NAME] past that point
-            # is replaced with [VALUE].
-            elif fn == 'define':
-                if len(expr) != 3:
-                    raise Exception("define/2: invalid number of arguments")
-                name = expr.cdr.car
-                if not type(name) is str:
-                    raise Exception("define/2: invalid symbol")
-                value = self._parse(expr.cdr.cdr.car)
-                return value + [OP_DEFINE, name]
-
-            # `(dis EXPR)`
-            # Takes an expression [EXPR] as an argument and, without evaluating it,
-            # prints out its disassembled microcode form.
-            elif fn == 'dis':
-                if len(expr) != 2:
-                    raise Exception("dis/1: invalid number of arguments")
-
-                return [OP_UP_DIS] + self._parse(expr.cdr.car) + [OP_DOWN_DIS]
-
-            # `(cond (COND1 EXPR1) (COND2 EXPR2) ...)`
-            # Takes a variable number of pairs of expressions as arguments and evaluates them
-            # in order. If [COND] evaluates to true, [EXPR] is evaluated and returned.
-            # If [COND] evaluates to false, the next pair is evaluated.
-            elif fn == 'cond':
-                code = []
-                for pair in expr.cdr:
-                    if not type(pair) is Cons or len(pair) != 2:
-                        raise Exception("cond: invalid syntax")
-                    cond = pair.car
-                    expr = pair.cdr.car
-                    
-                    # The boolean condition and jump-if-false
-                    code += self._parse(cond) + [OP_JIF, 0]
-                    jifpatch = len(code) - 1 # save the patch location
-
-                    # The evaluated expression and unconditional jump
-                    code += self._parse(expr) + [OP_JUMP, 0]
-                    self.jumppatches.append(len(code) - 1) # save the patch location
-
-                    # patch JIF
-                    code[jifpatch] = len(code) - jifpatch + 1
-
-                for patch in self.jumppatches:
-                    code[patch] = len(code) - patch + 1
-                
-                self.jumppatches = []
-                return code
-
-            # `(lambda (param1 param2 ...) EXPR)`
-            # Takes a list of identifiers [param1 param2 ...] and an expression [EXPR]
-            # as arguments and returns a lambda object that takes [param1 param2 ...] as
-            # arguments and evaluates [EXPR] with them bound.
-            elif fn in ['lambda', 'λ']:
-                if len(expr) == 3:
-                    ids = expr.cdr.car
-                    if not type(ids) is Cons:
-                        raise Exception("lambda/2: invalid syntax")
-                    params = []
-                    for param in ids:
-                        if not type(param) is str:
-                            raise Exception("lambda/2: invalid syntax")
-                        params.append(param)
-                    
-                    expr = self._parse(expr.cdr.cdr.car)
-                    return [OP_LAMBDA, params, expr]
-                elif len(expr) == 2:
-                    expr = self._parse(expr.cdr.car)
-                    return [OP_LAMBDA, [], expr]
-                else:
-                    raise Exception("lambda/1-2: invalid number of arguments")
-                
-            # An immediate lambda call.
-            elif self._parse(fn)[0] == OP_LAMBDA:
-                code = []
-                if type(expr.cdr) is Cons:
-                    for el in reversed(expr.cdr):
-                        code += self._parse(el)
-                return code + self._parse(fn) + [OP_EVAL]
+            form = self.forms.get(fn) if type(fn) is str else None
+            if form is not None:
+                form(expr, tail)
 
             # In-built function call.
-            elif fn in self.fns.keys():
-                code = []
-                # if the function is variadic, we need to mark the start of arguments
-                if self.fns[fn] == -1:
-                    code = [OP_START_ARGS]
-                elif len(expr) - 1 != self.fns[fn]: # <list length> - <fn name>
-                    raise Exception(f"{fn}/{self.fns[fn]}: invalid number of arguments")
+            elif fn in self.fns:
+                args = [] if expr.cdr is None else expr.cdr.items()
+                native = self.fns[fn]
+                if native.arity != -1 and len(args) != native.arity:
+                    raise Exception(f"{fn}/{native.arity}: invalid number of arguments")
 
                 # This is the highly anticipated "turning of the hourglass"! First we
                 # add parsed arguments to our code, and only after that do we add the
-                # call opcode with the function name.
-                for el in reversed(list(expr.cdr)):
-                    arg = self._parse(el)
-                    code += arg
-
-                code += [OP_CALL, fn]
-                return code
+                # call opcode with the function.
+                last = None
+                for el in reversed(args):
+                    last = len(self.unit.code)
+                    self._parse(el)
+                self.call(native, len(args), last)
 
-            elif type(fn) is str:
-                code = []
-                if type(expr.cdr) is Cons:
-                    for el in reversed(expr.cdr):
-                        code += self._parse(el)
-                return code + [OP_FIND, fn, OP_EVAL]
+            # A call of a lambda: one bound to a name, an immediate `(λ ...)` or whatever
+            # else the head evaluates to.
+            elif type(fn) in (str, Cons):
+                args = [] if expr.cdr is None else expr.cdr.items()
+                for el in reversed(args):
+                    self._parse(el)
+                code, last = self.unit.code, len(self.unit.code)
+                self._parse(fn)
+                if len(code) - last == 2 and code[last] == OP_FIND:
+                    # a global's lambda: one instruction, with an inline cache (see ops.py)
+                    code[last:] = [OP_FIND_TAIL_EVAL if tail else OP_FIND_EVAL, code[last+1], len(args), next(SITES)]
+                else:
+                    code += (OP_TAIL_EVAL if tail else OP_EVAL, len(args))
 
             else:
                 raise Exception(f"invalid car: {fn}")
 
+        # We solemnly pledge to resolve all identifiers and leave them not
+        # in literal form! (use `quote` for that)
+        elif type(expr) is str:
+            self.find(expr)
+        else:
+            self.unit.code += (OP_ATOM, self.unit.const(expr))
+
+    # What follows are the special forms, each one taking the whole form and `tail`.
+
+    # `(quote EXPR)`
+    # Takes an expression [EXPR] as an argument and returns it as data.
+    # Identifiers are rendered as Python strings.
+    def quoteForm(self, expr, tail):
+        if len(expr) != 2:
+            raise Exception("quote/1: invalid number of arguments")
+        self.quote(expr.cdr.car)
+
+    # `(define NAME VALUE)`
+    # Takes an identifier [NAME] and an expression [VALUE] as arguments and
+    # binds [VALUE] to [NAME], so that every instance of [NAME] past that point
+    # is replaced with [VALUE].
+    def defineForm(self, expr, tail):
+        if len(expr) != 3:
+            raise Exception("define/2: invalid number of arguments")
+        name = expr.cdr.car
+        if not type(name) is str:
+            raise Exception("define/2: invalid symbol")
+        if self.unit.unquoting:
+            # what's unquoted is an element of a list, and a `define` doesn't have a value
+            raise Exception("define/2: can't be unquoted")
+        self._parse(expr.cdr.cdr.car)
+        if self.unit.parent is None:
+            self.unit.code += (OP_DEFINE, SYMBOLS.intern(name))
+        else:
+            self.unit.code += (OP_SET_LOCAL, self.unit.slots[name])
+
+    # `(dis EXPR)`
+    # Takes an expression [EXPR] as an argument and, without evaluating it,
+    # prints out its disassembled microcode form.
+    def disForm(self, expr, tail):
+        if len(expr) != 2:
+            raise Exception("dis/1: invalid number of arguments")
+        self.unit.code.append(OP_UP_DIS)
+        self._parse(expr.cdr.car)
+        self.unit.code.append(OP_DOWN_DIS)
+
+    # `(cond (COND1 EXPR1) (COND2 EXPR2) ...)`
+    # Takes a variable number of pairs of expressions as arguments and evaluates them
+    # in order. If [COND] evaluates to true, [EXPR] is evaluated and returned.
+    # If [COND] evaluates to false, the next pair is evaluated. If none is true, the
+    # `cond` evaluates to nil.
+    #
+    # A `cond` whose first pairs (at least `SWITCH_MIN` of them) all compare the same
+    # variable to constants, `(eq? X 1)`, `(eq? X (quote add))`..., is a `case` in
+    # disguise, and is compiled like one: those pairs become a table, and the rest of the
+    # `cond` its `else`.
+    def condForm(self, expr, tail):
+        pairs = []
+        for pair in expr.cdr or ():
+            if not type(pair) is Cons or len(pair) != 2:
+                raise Exception("cond: invalid syntax")
+            pairs.append((pair.car, pair.cdr.car))
+
+        var, cases = None, []
+        for test, body in pairs:
+            compared = comparison(test)
+            if compared is None or var not in (None, compared[0]):
+                break
+            var = compared[0]
+            cases.append(([compared[1]], body))
+        if len(cases) < SWITCH_MIN:
+            self.cond(pairs, tail)
+            return
+        rest = pairs[len(cases):]
+        self.find(var)
+        self.switch(cases, (lambda: self.cond(rest, tail)) if rest else None, tail)
+
+    # `(case KEY (DATUM EXPR) ((DATUM1 DATUM2 ...) EXPR) ... (else EXPR))`
+    # Evaluates [KEY], then the [EXPR] of the first pair with a [DATUM] `eq?` to it; if
+    # there's none, the `else` pair's [EXPR], and if there's no `else` either, nil, like
+    # a `cond` where no condition holds. The data aren't evaluated: they're numbers,
+    # `true`, `false`, `nil` or symbols, which stand for themselves as if quoted.
+    # Rather than being compared to each [DATUM] in turn, the key is looked up in a table
+    # of them all (OP_SWITCH), which takes as long for a hundred pairs as for two.
+    def caseForm(self, expr, tail):
+        if len(expr) < 2:
+            raise Exception("case: invalid syntax")
+        cases, default = [], None
+        for pair in expr.cdr.cdr or ():
+            if not type(pair) is Cons or len(pair) != 2 or default is not None:
+                raise Exception("case: invalid syntax")
+            if pair.car == "else":
+                default = pair.cdr
+                continue
+            keys = pair.car.items() if type(pair.car) is Cons else [pair.car]
+            for key in keys:
+                if not datum(key):
+                    raise Exception(f"case: invalid datum: {key}")
+            cases.append((keys, pair.cdr.car))
+        self._parse(expr.cdr.car)
+        self.switch(cases, (lambda: self._parse(default.car, tail)) if default is not None else None, tail)
+
+    # `(lambda (param1 param2 ...) EXPR)`
+    # Takes a list of identifiers [param1 param2 ...] and an expression [EXPR]
+    # as arguments and returns a lambda object that takes [param1 param2 ...] as
+    # arguments and evaluates [EXPR] with them bound.
+    def lambdaForm(self, expr, tail):
+        argc = len(expr) - 1
+        if argc == 2:
+            ids = expr.cdr.car
+            if not type(ids) is Cons:
+                raise Exception("lambda/2: invalid syntax")
+            params = []
+            for param in ids:
+                if not type(param) is str:
+                    raise Exception("lambda/2: invalid syntax")
+                params.append(param)
+            self.lambda_(params, expr.cdr.cdr.car)
+        elif argc == 1:
+            self.lambda_([], expr.cdr.car)
+        else:
+            raise Exception("lambda/1-2: invalid number of arguments")
+
+    def call(self, native, argc, last):
+        """Emits a call of `native` on the `argc` values on the stack, `last` being where
+        the code of the last of them (the first argument) starts."""
+        code = self.unit.code
+        if last is not None and len(code) - last == 2 and (code[last], argc) in FUSE:
+            # the first argument is a single instruction, which the call can take over
+            code[last:] = [FUSE[code[last], argc], code[last+1], native.index]
+            return
+        if argc == 1:
+            code += (OP_CALL1, native.index)
+        elif argc == 2:
+            code += (OP_CALL2, native.index)
         else:
-            # We solemnly pledge to resolve all identifiers and leave them not
-            # in literal form! (use `quote` for that)
-            if type(expr) is str:
-                return [OP_FIND, expr]
-            return [OP_ATOM, expr]
-    
+            code += (OP_CALL, native.index, argc)
+
+    def cond(self, pairs, tail):
+        """Emits the tests and jumps of a `cond` with the (test, expression) `pairs`."""
+        unit = self.unit
+        end = unit.label()
+        for test, body in pairs:
+            nextpair = unit.label()
+
+            # The boolean condition and jump-if-false
+            self._parse(test)
+            unit.jump(OP_JIF, nextpair)
+
+            # The evaluated expression and unconditional jump
+            self._parse(body, tail)
+            unit.jump(OP_JUMP, end)
+            unit.place(nextpair)
+        if not pairs or pairs[-1][0] is not True:
+            # no test held: the `cond` still evaluates to something, whatever runs it
+            unit.code += (OP_ATOM, unit.const(None))
+        unit.place(end)
+
+    def switch(self, cases, default, tail):
+        """Emits the OP_SWITCH of a `case` on the key on the stack, and its expressions:
+        `cases` are (keys, expression) pairs, and `default`, if not None, emits what runs
+        when no key matches (nil otherwise)."""
+        unit = self.unit
+        end = unit.label()
+        table, labels = {}, []
+        for keys, body in cases:
+            labels.append(unit.label())
+            for key in keys:
+                # the first pair with a key wins, as in a `cond`, and `eq?` keys (like `1`
+                # and `true`) are one and the same key of a dict too
+                table.setdefault(key, labels[-1])
+        if default is None:
+            default = lambda: self._parse(None)
+        otherwise = unit.label()
+        unit.switch(table, otherwise, end)
+
+        jumped = set(table.values())
+        for (keys, body), label in zip(cases, labels):
+            if label not in jumped:
+                continue # every key of it was taken by an earlier pair
+            unit.place(label)
+            self._parse(body, tail)
+            unit.jump(OP_JUMP, end)
+        unit.place(otherwise)
+        default()
+        unit.place(end)
+
+    def find(self, name):
+        """Compiles a reference to `name`, looking through the enclosing lambdas first."""
+        unit, depth = self.unit, 0
+        while unit.parent is not None:
+            if name in unit.slots:
+                if depth == 0:
+                    self.unit.code += (OP_LOCAL, unit.slots[name])
+                else:
+                    self.unit.code += (OP_DEREF, depth, unit.slots[name], self.unit.const(name))
+                return
+            unit, depth = unit.parent, depth + 1
+        self.unit.code += (OP_FIND, SYMBOLS.intern(name))
+
+    def lambda_(self, params, body):
+        """Compiles a lambda body into its own code object and emits its creation."""
+        unit = Unit(self.unit, params)
+        for name in defines(body):
+            if name not in unit.slots:
+                unit.slots[name] = len(unit.locals)
+                unit.locals.append(name)
+
+        self.unit = unit
+        try:
+            self._parse(body, True)
+        finally:
+            self.unit = unit.parent
+        self.unit.code += (OP_LAMBDA, self.unit.const(unit.finish(len(params))))
+
     def quote(self, expr):
         """Quote an expression into RPN-compliant code."""
+        if native.HASHCONS and type(expr) is Cons:
+            # hash-consed lists are never copied, so a constant one can just be pushed
+            lst = constant(expr)
+            if lst is not None:
+                self.unit.code += (OP_ATOM, self.unit.const(lst))
+                return
+
+        # A list is built back to front: its terminator first, then one `cons` per element.
+        items = []
+        while type(expr) is Cons and expr.car != 'unquote':
+            items.append(expr.car)
+            expr = expr.cdr
+
+        # `(unquote EXPR)`
+        # Usable only in `quote/1`. Weaves the evaluated version of EXPR
+        # into its surrounding quote expression.
         if type(expr) is Cons:
-            # `(unquote EXPR)`
-            # Usable only in `quote/1`. Weaves the evaluated version of EXPR
-            # into its surrounding quote expression.
-            if expr.car == 'unquote':
-                if len(expr) != 2:
-                    raise Exception("unquote/1: invalid number of arguments")
-                return self._parse(expr.cdr.car)
-            return self.quote(expr.cdr) + self.quote(expr.car) + [OP_CALL, 'cons']
+            if len(expr) != 2:
+                raise Exception("unquote/1: invalid number of arguments")
+            self.unit.unquoting += 1
+            try:
+                self._parse(expr.cdr.car)
+            finally:
+                self.unit.unquoting -= 1
         else:
-            return [OP_ATOM, expr]
\ No newline at end of file
+            self.unit.code += (OP_ATOM, self.unit.const(expr))
+
+        for item in reversed(items):
+            last = len(self.unit.code)
+            self.quote(item)
+            self.call(self.fns["cons"], 2, last)
+
+def constant(expr):
+    """Returns the hash-consed version of a quoted list, or None if it has an `unquote`."""
+    items = []
+    while type(expr) is Cons:
+        if expr.car == 'unquote':
+            return None
+        item = constant(expr.car) if type(expr.car) is Cons else expr.car
+        if item is None and expr.car is not None:
+            return None
+        items.append(item)
+        expr = expr.cdr
+    lst = expr
+    for item in reversed(items):
+        lst = hashcons(item, lst)
+    return lst
+
+def datum(val):
+    """Whether `val` can be a key of a `case`."""
+    return val is None or type(val) in (int, str, bool)
+
+def comparison(test):
+    """Returns (name, key) if `test` is `(eq? NAME KEY)` or `(eq? KEY NAME)`, with a
+    constant [KEY] that could be one in a `case`; None otherwise."""
+    if type(test) is not Cons or test.car != "eq?" or len(test) != 3:
+        return None
+    a, b = test.cdr.car, test.cdr.cdr.car
+    if type(b) is str:
+        a, b = b, a
+    if type(a) is not str:
+        return None
+    if type(b) is Cons and b.car == "quote" and len(b) == 2 and type(b.cdr.car) is str:
+        return a, b.cdr.car
+    if type(b) is not str and datum(b):
+        return a, b
+    return None
+
+def defines(expr):
+    """Yields the names `define`d in a lambda body, not counting nested lambdas and quotes."""
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if type(expr) is not Cons or expr.car in ['quote', 'lambda', 'λ']:
+            continue
+        if expr.car == 'define' and type(expr.cdr) is Cons and type(expr.cdr.car) is str:
+            yield expr.cdr.car
+        # only sublists can hold more `define`s; they're visited in source order
+        sublists = []
+        while type(expr) is Cons:
+            if type(expr.car) is Cons:
+                sublists.append(expr.car)
+            expr = expr.cdr
+        sublists.reverse()
+        stack += sublists
@@ -0,0 +1,207 @@
+from time import perf_counter
+
+from bytecode import Code
+from env import SYMBOLS
+from lambdaobj import Lambda
+from native import Native
+from ops import *
+import ops
+
+# A profiler for the stack VM. The VM runs every instruction through its op table, so
+# profiling it is just a matter of giving it another one, the same way disassembly mode
+# does (see `OP_UP_DIS`): `Profiler.start` swaps in a table whose entries count and time
+# the real ones, and `Profiler.stop` swaps the real table back. When not profiling, the
+# VM runs exactly what it always does.
+#
+# Three kinds of things are measured, each with how many times it ran, its cumulative
+# time (everything that happened while it ran, recursive runs counted once) and its self
+# time (the same, minus the time of the things measured inside it):
+#
+# - opcodes, by name;
+# - natives, timed around the instruction that calls them;
+# - lambdas, by code object, timed from the instruction that calls them to their return
+#   (OP_RETURN, which the VM runs through the table like any instruction). A tail call
+#   (OP_TAIL_EVAL) ends the time of the running lambda and starts that of the one it
+#   calls. A JIT-compiled lambda (see jit.py) is timed as a whole, within the
+#   instruction calling it: what it calls isn't seen at all. An error ends the time of
+#   every lambda it cuts short where it leaves `VM.run` or `VM.call` (see `unwinding`).
+#
+# Lambdas bound to globals are reported by name, others by their parameters. Calls of
+# globals also count how often their inline cache (see `ops.opFindEval`) had the lambda
+# ready and how often it had to look it up again.
+#
+#     profiler = Profiler(vm)
+#     profiler.start()
+#     vm.run(code)
+#     profiler.stop()
+#     print(profiler.report())
+
+class Profiler:
+    def __init__(self, vm):
+        if vm.backend != "stack":
+            raise Exception(f"profiling needs the stack backend, not `{vm.backend}`")
+        self.vm = vm
+        self.counters = {} # opcode name, `Native` or `Code` -> [count, cumulative, self, how many times it's running]
+        self.running = []  # [what, when it started, time spent in what was measured inside it]
+        self.caches = [0, 0] # inline cache hits, misses
+        self.table = [self.instrument(op, fn) for op, fn in enumerate(ops.OPTABLE)]
+
+    def start(self):
+        vm = self.vm
+        vm.optable = vm.runtable = self.table
+        vm.run, vm.call = self.unwinding(type(vm).run), self.unwinding(type(vm).call)
+
+    def stop(self):
+        vm = self.vm
+        vm.optable = vm.runtable = ops.OPTABLE
+        del vm.run, vm.call # back to the class's
+
+    def unwinding(self, method):
+        """Returns a VM method, bound to the VM, that ends whatever was measured within it
+        and is still running when it returns. Lambdas are only left on OP_RETURN, so an
+        error leaves the ones it cut short running (and every call of them still running,
+        as far as their cumulative time goes) until it gets here."""
+        vm, running, leave = self.vm, self.running, self.leave
+        def unwinding(*args, **kwargs):
+            mark = len(running)
+            try:
+                return method(vm, *args, **kwargs)
+            finally:
+                while len(running) > mark:
+                    leave()
+        return unwinding
+
+    def counter(self, key):
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [0, 0.0, 0.0, 0]
+        return counter
+
+    def enter(self, key):
+        self.counter(key)[3] += 1
+        self.running.append([key, perf_counter(), 0.0])
+
+    def leave(self):
+        key, start, inside = self.running.pop()
+        elapsed = perf_counter() - start
+        counter = self.counters[key]
+        counter[2] += elapsed - inside
+        counter[3] -= 1
+        if counter[3] == 0:
+            counter[1] += elapsed
+        if self.running:
+            self.running[-1][2] += elapsed
+
+    def instrument(self, op, fn):
+        """Returns a version of the function `fn` running opcode `op` that measures it."""
+        name = OPNAMES[op]
+        counter, enter, leave, running = self.counter, self.enter, self.leave, self.running
+
+        if op in CALLS:
+            where = 1 if op in (OP_CALL, OP_CALL1, OP_CALL2) else 2 # the native's index
+            def timed(vm):
+                native = TABLE[vm.ops[vm.pc+where]]
+                counter(name)[0] += 1
+                counter(native)[0] += 1
+                enter(name)
+                enter(native)
+                try:
+                    return fn(vm)
+                finally:
+                    leave()
+                    leave()
+
+        elif op in (OP_EVAL, OP_TAIL_EVAL, *EVALS):
+            caches = self.caches
+            tail = op in (OP_TAIL_EVAL, OP_FIND_TAIL_EVAL)
+            def timed(vm):
+                if op in EVALS:
+                    callee = vm.globals[vm.ops[vm.pc+1]]
+                    caches[not ops.cached(vm)] += 1
+                else:
+                    callee = vm.stack[-1]
+                # the lambda running the instruction, if we saw it being called
+                level = running and running[-1][0] is vm.code
+                counter(name)[0] += 1
+                enter(name)
+                if type(callee) is Lambda:
+                    counter(callee.code)[0] += 1
+                    enter(callee.code)
+                try:
+                    skip = fn(vm)
+                finally:
+                    if type(callee) is Lambda:
+                        leave()
+                    leave()
+                if skip == 0:
+                    # the VM runs the callee's code now, until OP_RETURN; after a tail
+                    # call, in place of the caller's, whose time ends here
+                    if tail and level:
+                        leave()
+                    enter(vm.code)
+                return skip
+
+        elif op == OP_RETURN:
+            def timed(vm):
+                code = vm.code
+                counter(name)[0] += 1
+                enter(name)
+                try:
+                    fn(vm)
+                finally:
+                    leave()
+                if running and running[-1][0] is code:
+                    leave()
+
+        else:
+            def timed(vm):
+                counter(name)[0] += 1
+                enter(name)
+                try:
+                    return fn(vm)
+                finally:
+                    leave()
+
+        return timed
+
+    def names(self):
+        """Returns the names of the lambdas bound to globals, by code object."""
+        names = {}
+        for idx, val in enumerate(self.vm.globals):
+            if type(val) is Lambda:
+                names.setdefault(val.code, SYMBOLS.names[idx])
+        return names
+
+    def results(self):
+        """Returns what was measured, as a JSON-friendly dict listing the opcodes, natives and
+        lambdas, each with its count and cumulative and self time in seconds, most self time
+        first, and how many calls found their inline cache ready."""
+        names = self.names()
+        results = {"opcodes": [], "natives": [], "lambdas": []}
+        for key, (count, cumulative, own, _) in self.counters.items():
+            if type(key) is Code:
+                kind, name = "lambdas", names.get(key) or f"λ ({' '.join(key.params)})"
+            else:
+                kind, name = ("natives", key.name) if type(key) is Native else ("opcodes", key)
+            results[kind].append({"name": name, "count": count, "cumulative": cumulative, "self": own})
+        for entries in results.values():
+            entries.sort(key=lambda entry: -entry["self"])
+        hits, misses = self.caches
+        results["caches"] = {"hits": hits, "misses": misses, "rate": hits / (hits + misses) if hits + misses else None}
+        return results
+
+    def report(self, limit=20):
+        """Returns the results as a table, the first `limit` rows of each kind."""
+        lines = []
+        results = self.results()
+        caches = results.pop("caches")
+        for kind, entries in results.items():
+            lines.append(f"{kind:<24} {'count':>10} {'cumul (s)':>10} {'self (s)':>10}")
+            for entry in entries[:limit]:
+                lines.append(f"{entry['name'][:24]:<24} {entry['count']:>10} {entry['cumulative']:>10.4f} {entry['self']:>10.4f}")
+            if len(entries) > limit:
+                lines.append(f"... and {len(entries) - limit} more")
+            lines.append("")
+        if caches["rate"] is not None:
+            lines.append(f"inline caches: {caches['hits']} hits, {caches['misses']} misses ({caches['rate']:.1%})")
+        return "\n".join(lines)
@@ -0,0 +1,192 @@
+from cons import Cons
+from native import native
+
+# Persistent vectors: immutable sequences with fast indexing, where making a changed copy
+# (`push`, `update`) shares everything but the path to the change with the original.
+#
+#     [1 2 (a b) c]                  a literal, read like a quoted list: its elements aren't run
+#     (pvector 1 2 3)                a vector of its arguments
+#     (to-pvector LIST)              a vector of the elements of [LIST]...
+#     (to-list PVECTOR)              ...and back (see vector.py)
+#     (pvector-ref PVECTOR I)        the element at [I], from 0
+#     (pvector-length PVECTOR)       how many elements there are
+#     (pvector-push PVECTOR VAL)     a copy with [VAL] added at the end
+#     (pvector-update PVECTOR I VAL) a copy with [VAL] at [I] (at the end if [I] is the length)
+#
+# The layout is Clojure's: a trie of nodes with up to 32 children each, elements in the
+# leaves, indexed by 5 bits of the index per level, so a million elements are at most four
+# levels deep. The last (up to) 32 elements are kept out of the trie in a leaf of their
+# own, the tail, so pushing mostly copies just that leaf; only when it's full does it go
+# into the trie, copying the nodes on its path. Nodes are Python lists, never changed once
+# they're part of a vector.
+#
+# They compare (`eq?`) and hash by their elements, like lists, and print like their literals.
+
+BITS = 5
+WIDTH = 1 << BITS # children per node
+MASK = WIDTH - 1
+
+class PVector:
+    __slots__ = ("count", "shift", "root", "tail", "hash")
+
+    def __init__(self, count, shift, root, tail):
+        self.count = count # how many elements there are
+        self.shift = shift # the level of the root: how many bits of an index are left below it
+        self.root = root   # the trie, holding every element but the tail's
+        self.tail = tail   # the last 1 to WIDTH elements (none if empty)
+        self.hash = None
+
+    def __len__(self):
+        return self.count
+
+    def __eq__(self, other):
+        if type(other) is not PVector:
+            return NotImplemented
+        if self is other:
+            return True
+        if self.count != other.count or (self.hash is not None and other.hash is not None and self.hash != other.hash):
+            return False
+        return all(a is b or a == b for a, b in zip(self, other))
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash(tuple(self))
+        return self.hash
+
+    def __repr__(self):
+        return "[" + " ".join(map(str, self)) + "]"
+
+    def __iter__(self):
+        for leaf in self.leaves():
+            yield from leaf
+
+    def leaves(self):
+        """Yields the leaves, in order, the tail last."""
+        stack = [(self.root, self.shift)] if self.root else []
+        while stack:
+            node, shift = stack.pop()
+            if shift == 0:
+                yield node
+            else:
+                stack += ((child, shift - BITS) for child in reversed(node))
+        yield self.tail
+
+    def items(self):
+        """Returns the elements as a Python list."""
+        items = []
+        for leaf in self.leaves():
+            items += leaf
+        return items
+
+    def nth(self, idx):
+        if idx >= self.count - len(self.tail):
+            return self.tail[idx & MASK]
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node[(idx >> level) & MASK]
+        return node[idx & MASK]
+
+    def push(self, val):
+        if len(self.tail) < WIDTH:
+            return PVector(self.count + 1, self.shift, self.root, self.tail + [val])
+        # the tail is full: it goes into the trie, which grows a level if that's full too
+        if (self.count >> BITS) > (1 << self.shift):
+            root = [self.root, path(self.shift, self.tail)]
+            return PVector(self.count + 1, self.shift + BITS, root, [val])
+        return PVector(self.count + 1, self.shift, insert(self.root, self.shift, self.count - 1, self.tail), [val])
+
+    def update(self, idx, val):
+        if idx == self.count:
+            return self.push(val)
+        if idx >= self.count - len(self.tail):
+            tail = list(self.tail)
+            tail[idx & MASK] = val
+            return PVector(self.count, self.shift, self.root, tail)
+        return PVector(self.count, self.shift, assoc(self.root, self.shift, idx, val), self.tail)
+
+def path(shift, leaf):
+    """Returns a branch of single-child nodes from level `shift` down to `leaf`."""
+    node = leaf
+    for _ in range(0, shift, BITS):
+        node = [node]
+    return node
+
+def insert(node, shift, idx, leaf):
+    """Returns a copy of `node` (at level `shift`) with `leaf` added as the leaf holding
+    `idx`."""
+    node = list(node)
+    child = (idx >> shift) & MASK
+    if shift == BITS:
+        node.append(leaf)
+    elif child < len(node):
+        node[child] = insert(node[child], shift - BITS, idx, leaf)
+    else:
+        node.append(path(shift - BITS, leaf))
+    return node
+
+def assoc(node, shift, idx, val):
+    """Returns a copy of `node` (at level `shift`) with `val` at `idx`."""
+    node = list(node)
+    if shift == 0:
+        node[idx & MASK] = val
+    else:
+        child = (idx >> shift) & MASK
+        node[child] = assoc(node[child], shift - BITS, idx, val)
+    return node
+
+EMPTY = PVector(0, BITS, [], [])
+
+def make(items):
+    """Returns the vector of a Python list of elements, building its trie in one go."""
+    count = len(items)
+    if count == 0:
+        return EMPTY
+    tailoff = (count - 1) & ~MASK
+    nodes = [items[i:i+WIDTH] for i in range(0, tailoff, WIDTH)]
+    shift = BITS
+    while len(nodes) > WIDTH:
+        nodes = [nodes[i:i+WIDTH] for i in range(0, len(nodes), WIDTH)]
+        shift += BITS
+    return PVector(count, shift, nodes, items[tailoff:])
+
+def pvector(name, val):
+    if type(val) is not PVector:
+        raise Exception(f"`{name}`: invalid argument type")
+    return val
+
+def index(name, vec, idx, end=False):
+    """Checks that `idx` is an index into `vec` (or its length, if `end`)."""
+    if type(idx) is not int:
+        raise Exception(f"`{name}`: invalid argument type")
+    if not 0 <= idx < vec.count + end:
+        raise Exception(f"`{name}`: index {idx} out of range")
+
+@native("pvector", -1) # makes a persistent vector of some values
+def pvector_(vm, *args):
+    return make(list(args))
+
+@native("to-pvector", 1) # makes a persistent vector of the elements of a list
+def to_pvector(vm, lst):
+    if lst is None:
+        return EMPTY
+    if type(lst) is not Cons:
+        raise Exception("`to-pvector/1`: invalid argument type")
+    return make(lst.items())
+
+@native("pvector-ref", 2) # the element of a persistent vector at an index, from 0
+def pvector_ref(vm, vec, idx):
+    index("pvector-ref/2", pvector("pvector-ref/2", vec), idx)
+    return vec.nth(idx)
+
+@native("pvector-length", 1) # how many elements a persistent vector has
+def pvector_length(vm, vec):
+    return pvector("pvector-length/1", vec).count
+
+@native("pvector-push", 2) # a persistent vector with a value added at the end
+def pvector_push(vm, vec, val):
+    return pvector("pvector-push/2", vec).push(val)
+
+@native("pvector-update", 3) # a persistent vector with the value at an index replaced
+def pvector_update(vm, vec, idx, val):
+    index("pvector-update/3", pvector("pvector-update/3", vec), idx, end=True)
+    return vec.update(idx, val)
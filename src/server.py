@@ -0,0 +1,212 @@
+from lex import Lexer, LexError
+from parse import Parser
+from optimize import optimize
+from vm import VM
+from budget import Budget
+import asyncio
+import json
+import os
+import signal
+import socket
+
+# An evaluation server, for programs that want lots of small evaluations without starting
+# (and loading the prelude into) an interpreter for each one:
+#
+#     python3 src/awrwydr.py --serve /tmp/awrwydr.sock [--workers N]
+#     python3 src/awrwydr.py --serve 127.0.0.1:7070
+#
+# Clients send requests as lines of JSON and get a line of JSON back for each, in the order
+# they were sent; there's no need to wait for one response before sending the next request:
+#
+#     {"id": 1, "source": "(define x 2) (+ x 1)"}
+#     {"id": 1, "results": ["3"]}
+#
+#     {"id": 2, "source": "(car 1)"}
+#     {"id": 2, "results": [], "error": "<error: ...>"}
+#
+# `id` is optional and just sent back. Every top-level expression in `source` is run in
+# turn and what it evaluates to (if anything) is printed into `results`; if one fails, `error` says why
+# and the rest aren't run.
+#
+# A request can also limit what its evaluation may do with a `budget` (see budget.py), any
+# of `instructions`, `depth` and `allocations`, and then gets back what it used; going over
+# the budget is an error like any other:
+#
+#     {"source": "(define f (λ (x) (f x))) (f 1)", "budget": {"instructions": 100000}}
+#     {"results": [], "error": "<error: instructions budget of 100000 exceeded>",
+#      "usage": {"instructions": 100355, "depth": 1, "allocations": 1}}
+#
+# Each connection has its globals to itself: it starts out with what the prelude defines,
+# keeps what its requests `define`, and nothing it does is seen by other connections. That
+# is done by giving it a VM of its own, taken from a pool of VMs that have the prelude in
+# them already, and reset to it when the connection is closed (which is a copy of the
+# globals, and deoptimizing whatever lambdas the JIT compiled against redefined ones).
+#
+# The listening socket is opened once, then `workers` processes are forked from the one
+# that loaded the prelude, each serving connections on it with an event loop of its own.
+# An evaluation holds its process until it's done, so workers are how many evaluations
+# can run at the same time; a worker's other connections wait meanwhile.
+
+POOL = 8 # idle VMs kept ready in each worker
+
+class Pool:
+    """Ready VMs with the same globals as a template VM."""
+
+    def __init__(self, template, size=POOL):
+        self.template = template
+        self.globals = list(template.globals) # what each VM is reset to
+        self.size = size
+        self.idle = [self.make() for _ in range(size)]
+
+    def make(self):
+        vm = VM(backend=self.template.backend, jit=self.template.jit)
+        vm.globals = list(self.globals)
+        return vm
+
+    def acquire(self):
+        return self.idle.pop() if self.idle else self.make()
+
+    def release(self, vm):
+        if len(self.idle) >= self.size:
+            return
+        vm.restore(self.globals)
+        self.idle.append(vm)
+
+def describe(e):
+    if type(e) is LexError:
+        return f"<error at {e.line}:{e.column}: {e.args[0]}>"
+    return f"<error: {e.args[0] if e.args else type(e).__name__}>"
+
+def address(spec):
+    """Returns the socket family and address for `spec`, a path for a Unix socket or
+    [HOST:]PORT."""
+    host, _, port = spec.rpartition(":")
+    if port.isdigit():
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, spec
+
+def listen(spec):
+    family, addr = address(spec)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        if os.path.exists(addr):
+            os.unlink(addr)
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(addr)
+    sock.listen(128)
+    sock.setblocking(False)
+    return sock
+
+class Worker:
+    """Serves connections on a listening socket, in one process."""
+
+    def __init__(self, vm, optimizing=False):
+        self.pool = Pool(vm)
+        self.optimizing = optimizing
+        self.lexer = Lexer()
+        self.parser = Parser()
+
+    def evaluate(self, vm, source, budget=None):
+        """Runs every expression in `source` (all of them under `budget`, if given),
+        returning their printed values and the error that stopped them, if any."""
+        results = []
+        try:
+            for expr in self.lexer.read((source,)):
+                code = self.parser.parse((expr,))
+                vm.run(optimize(code) if self.optimizing else code, budget)
+                if vm.size() > 0:
+                    results.append(str(vm.stack.pop()))
+        except RecursionError:
+            return results, "<error: maximum recursion depth exceeded>"
+        except Exception as e:
+            return results, describe(e)
+        return results, None
+
+    def respond(self, vm, line):
+        try:
+            request = json.loads(line)
+            source = request["source"]
+            if type(source) is not str:
+                raise TypeError()
+        except (ValueError, TypeError, KeyError):
+            return {"error": "<error: requests are JSON objects with a `source` string>"}
+        budget = None
+        if "budget" in request:
+            try:
+                limits = request["budget"]
+                if type(limits) is not dict or any(type(limit) is not int for limit in limits.values() if limit is not None):
+                    raise TypeError()
+                budget = Budget(**limits)
+            except TypeError:
+                return {"error": "<error: a budget is an object of `instructions`, `depth` and `allocations` limits>"}
+        results, error = self.evaluate(vm, source, budget)
+        response = {"id": request["id"]} if "id" in request else {}
+        response["results"] = results
+        if error is not None:
+            response["error"] = error
+        if budget is not None:
+            response["usage"] = budget.usage()
+        return response
+
+    async def connection(self, reader, writer):
+        vm = self.pool.acquire()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError: # longer than the stream's limit
+                    writer.write(b'{"error": "<error: request too long>"}\n')
+                    break
+                if not line:
+                    break
+                if line.isspace():
+                    continue
+                writer.write(json.dumps(self.respond(vm, line)).encode() + b"\n")
+                # only wait for the client to catch up when it's falling behind, so
+                # pipelined requests are answered in batches
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError): # the client left, or the server is stopping
+            pass
+        finally:
+            self.pool.release(vm)
+            writer.close()
+
+    async def serve(self, sock):
+        """Serves until the process is sent SIGTERM."""
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        server = await asyncio.start_server(self.connection, sock=sock, limit=1 << 24)
+        async with server:
+            await stopping.wait()
+
+def serve(spec, vm, workers=1, optimizing=False):
+    """Serves evaluations on `spec` (see `address`) with `workers` processes, each starting
+    out with the globals of `vm`. Returns when interrupted or terminated."""
+    sock = listen(spec)
+    family, addr = address(spec)
+    worker = Worker(vm, optimizing)
+    children = []
+    try:
+        for _ in range(workers - 1 if workers > 1 else 0):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                try:
+                    asyncio.run(worker.serve(sock))
+                finally:
+                    os._exit(0)
+            children.append(pid)
+        # the last worker is this process
+        asyncio.run(worker.serve(sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        sock.close()
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.unlink(addr)
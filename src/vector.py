@@ -0,0 +1,244 @@
+from array import array
+from itertools import repeat
+import operator
+
+from cons import Cons
+from pvector import PVector
+from native import native, ARITHMETIC, NATIVES
+
+# Numeric vectors: fixed-length runs of 64-bit ints or floats, stored in one block of memory
+# rather than as a chain of cells, and computed on by whole-vector operations rather than
+# one element at a time by the VM.
+#
+#     (vector 1 2 3)            a vector of its arguments
+#     (to-vector LIST)          a vector of the numbers in [LIST]...
+#     (to-list VECTOR)          ...and back (persistent vectors too, see pvector.py)
+#     (iota N)                  0, 1, ..., N-1
+#     (vector-length VECTOR) (vector-ref VECTOR I) (vector? EXPR)
+#
+# The arithmetic natives work on them elementwise: `(+ A B)` adds two vectors of the same
+# length, `(* A 2)` scales one (see `native.ARITHMETIC`). `(vector-sum V)`, `(vector-min V)`,
+# `(vector-max V)` and `(vector-dot A B)` reduce them (the first three take lists of numbers
+# too). Like every native, these names can't be used for globals: calls to them compile to
+# the native whatever the global holds, hence the prefix.
+#
+# With NumPy around, a vector is a NumPy array and every operation is one NumPy call; without
+# it, it's an `array.array`, and operations are loops over it in C where the standard
+# library has one (`sum`, `min`, `max`, `map` with an `operator` function). Either way,
+# ints are 64-bit, like the ones in NumPy arrays: unlike plain ints, elements can overflow
+# (with NumPy, silently). `/` always makes floats.
+#
+# Vectors are never changed once made, so they're safe to share, fold into constants (see
+# optimize.py) and use as `memo` keys. Two vectors are `eq?` when they hold the same kind
+# of number (ints or floats) and the same values. The natives that make one from scratch
+# (or a list from one) aren't marked pure all the same, as their results can be any size:
+# folded, `(iota 20000000)` would be built while compiling and kept in the code.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # vectors are `array`s then
+
+KINDS = {"int": ("q", "int64"), "float": ("d", "float64")} # kind -> (array typecode, NumPy dtype)
+
+class Vector:
+    __slots__ = ("data", "kind", "hash")
+
+    def __init__(self, data, kind):
+        self.data = data # a NumPy array (made read-only) or an `array.array`
+        self.kind = kind # "int" or "float"
+        self.hash = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        if type(other) is not Vector or other.kind != self.kind or len(other) != len(self):
+            return False
+        if numpy is not None:
+            return bool(numpy.array_equal(self.data, other.data))
+        return self.data == other.data
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash((self.kind, self.data.tobytes()))
+        return self.hash
+
+    def __repr__(self):
+        return "#(" + " ".join(map(str, self.data.tolist())) + ")"
+
+    def items(self):
+        """Returns the elements as plain Python numbers."""
+        return self.data.tolist()
+
+def make(values, kind=None):
+    """Returns a vector of the Python numbers in `values`, of the kind they call for unless
+    `kind` is given."""
+    values = values if type(values) is list else list(values)
+    for val in values:
+        if type(val) is not int and type(val) is not float:
+            raise Exception("vector: elements must be numbers")
+    if kind is None:
+        kind = "float" if any(type(val) is float for val in values) else "int"
+    return wrap(values, kind)
+
+def wrap(values, kind):
+    typecode, dtype = KINDS[kind]
+    try:
+        if numpy is not None:
+            data = numpy.array(values, dtype=dtype)
+            data.flags.writeable = False
+        else:
+            data = values if type(values) is array and values.typecode == typecode else array(typecode, values)
+    except OverflowError:
+        raise Exception("vector: element out of the 64-bit range")
+    return Vector(data, kind)
+
+# Elementwise arithmetic, on two operands, at least one of them a vector.
+
+OPERATORS = {"+": (operator.add, "add"), "-": (operator.sub, "subtract"),
+             "*": (operator.mul, "multiply"), "/": (operator.truediv, "true_divide")}
+
+def operand(name, val):
+    if type(val) is Vector:
+        return val.data, val.kind
+    if type(val) is int or type(val) is float:
+        return val, "float" if type(val) is float else "int"
+    raise Exception(f"`{name}/n`: invalid argument type")
+
+def elementwise(name, a, b):
+    a, akind = operand(name, a)
+    b, bkind = operand(name, b)
+    kind = "float" if name == "/" or "float" in (akind, bkind) else "int"
+    fn, ufunc = OPERATORS[name]
+    avec, bvec = type(a) is not int and type(a) is not float, type(b) is not int and type(b) is not float
+    if avec and bvec and len(a) != len(b):
+        raise Exception(f"`{name}/n`: vectors of different lengths")
+
+    if numpy is not None:
+        with numpy.errstate(divide="raise", invalid="raise"):
+            try:
+                data = getattr(numpy, ufunc)(a, b)
+            except FloatingPointError:
+                raise Exception(f"`{name}/n`: division by zero")
+            except OverflowError:
+                raise Exception(f"`{name}/n`: element out of the 64-bit range")
+        if data.dtype != KINDS[kind][1]:
+            data = data.astype(KINDS[kind][1])
+        data.flags.writeable = False
+        return Vector(data, kind)
+
+    try:
+        if avec and bvec:
+            values = map(fn, a, b)
+        elif avec:
+            values = map(fn, a, repeat(b))
+        else:
+            values = map(fn, repeat(a), b)
+        return wrap(array(KINDS[kind][0], values), kind)
+    except ZeroDivisionError:
+        raise Exception(f"`{name}/n`: division by zero")
+    except OverflowError:
+        raise Exception(f"`{name}/n`: element out of the 64-bit range")
+
+def arithmetic(name, args):
+    """Folds `args` with the arithmetic native `name`, elementwise (see `native.ARITHMETIC`)."""
+    acc = args[0]
+    operand(name, acc)
+    for arg in args[1:]:
+        acc = elementwise(name, acc, arg)
+    return acc
+
+ARITHMETIC[Vector] = arithmetic
+
+def vector(name, val):
+    if type(val) is not Vector:
+        raise Exception(f"`{name}`: invalid argument type")
+    return val
+
+def numbers(name, val):
+    """Returns the elements of a vector or list of numbers, as an `array` or NumPy array."""
+    if type(val) is Vector:
+        return val.data
+    if type(val) is Cons or val is None:
+        return make(val.items() if val is not None else []).data
+    raise Exception(f"`{name}`: invalid argument type")
+
+def scalar(val):
+    """Turns an element (possibly a NumPy one) into a plain Python number."""
+    return val.item() if numpy is not None and isinstance(val, numpy.generic) else val
+
+@native("vector", -1, pure=False) # makes a vector of some numbers
+def vector_(vm, *args):
+    return make(args)
+
+@native("to-vector", 1, pure=False) # makes a vector of the numbers in a list
+def to_vector(vm, lst):
+    if lst is None:
+        return make([])
+    if type(lst) is not Cons:
+        raise Exception("`to-vector/1`: invalid argument type")
+    return make(lst.items())
+
+@native("to-list", 1, pure=False) # makes a list of the elements of a vector, numeric or persistent
+def to_list(vm, vec):
+    if type(vec) is not PVector:
+        vector("to-list/1", vec)
+    return NATIVES["list"].fn(vm, *vec.items())
+
+@native("iota", 1, pure=False) # the vector of 0, 1, ..., N-1
+def iota(vm, n):
+    if type(n) is not int or n < 0:
+        raise Exception("`iota/1`: invalid argument type")
+    if numpy is not None:
+        data = numpy.arange(n, dtype="int64")
+        data.flags.writeable = False
+        return Vector(data, "int")
+    return wrap(array("q", range(n)), "int")
+
+@native("vector?", 1) # whether an expression is a vector
+def vectorq(vm, val):
+    return type(val) is Vector
+
+@native("vector-length", 1) # how many elements a vector has
+def vector_length(vm, vec):
+    return len(vector("vector-length/1", vec))
+
+@native("vector-ref", 2) # the element of a vector at an index, from 0
+def vector_ref(vm, vec, idx):
+    data = vector("vector-ref/2", vec).data
+    if type(idx) is not int:
+        raise Exception("`vector-ref/2`: invalid argument type")
+    if not 0 <= idx < len(data):
+        raise Exception(f"`vector-ref/2`: index {idx} out of range")
+    return scalar(data[idx])
+
+@native("vector-sum", 1) # the sum of a vector (or list) of numbers
+def sum_(vm, val):
+    data = numbers("vector-sum/1", val)
+    if numpy is not None:
+        return scalar(data.sum())
+    return sum(data)
+
+@native("vector-min", 1) # the least of a vector (or list) of numbers
+def min_(vm, val):
+    data = numbers("vector-min/1", val)
+    if not len(data):
+        raise Exception("`vector-min/1`: no elements")
+    return scalar(data.min() if numpy is not None else min(data))
+
+@native("vector-max", 1) # the greatest of a vector (or list) of numbers
+def max_(vm, val):
+    data = numbers("vector-max/1", val)
+    if not len(data):
+        raise Exception("`vector-max/1`: no elements")
+    return scalar(data.max() if numpy is not None else max(data))
+
+@native("vector-dot", 2) # the dot product of two vectors
+def dot(vm, a, b):
+    a, b = vector("vector-dot/2", a).data, vector("vector-dot/2", b).data
+    if len(a) != len(b):
+        raise Exception("`vector-dot/2`: vectors of different lengths")
+    if numpy is not None:
+        return scalar(numpy.dot(a, b))
+    return sum(map(operator.mul, a, b))
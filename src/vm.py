@@ -1,41 +1,59 @@
 import ops
 import native
+import closures
+import jit as jitmod
 from lambdaobj import *
+from env import SYMBOLS, UNBOUND, VERSIONS
 
 
 # Our stack-based VM! All of its opcodes are defined in `ops.py`
 # Other than that it relies on native functions (native.py) for
 # all of its internal behavior.
+#
+# `backend` picks how code is executed: "stack" runs it through the opcode table,
+# "closure" compiles it into Python closures first (see closures.py). Both give the
+# same results and share globals, natives and lambda objects.
+#
+# `jit` is how many times a lambda has to be called before it is compiled to Python
+# (see jit.py), or None to never do that.
+#
+# `run` and `apply` take an optional `budget.Budget`, limiting how much the code may do
+# (see budget.py).
+
+BACKENDS = ["stack", "closure"]
 
 class VM:
-    def __init__(self, defs={}):
+    def __init__(self, defs=None, backend="stack", jit=jitmod.THRESHOLD):
+        if backend not in BACKENDS:
+            raise Exception(f"unknown backend `{backend}`")
+        self.backend = backend
+        self.jit = jit
+        self.watchers = {} # global index -> JIT-compiled lambdas relying on its value
         self.stack = []
-        self.argstarts = []
-        # Each (key, value) pair corresponds to
-        #   (name, Python equivalent)
-        # of a native function.
-        self.fns = {
-            "+": native.add,
-            "-": native.sub,
-            "*": native.mul,
-            "/": native.div,
-            "eq?": native.eqq,
-            "atom?": native.atomq,
-            "nil?": native.nilq,
-            "cons": native.cons,
-            "list": native.list,
-            "car": native.car,
-            "cdr": native.cdr,
-        }
-        self.defs = defs # definitions added with `define/2` as well as lambda arguments
-
-        self.code = None
+        # The native functions, by name (see native.py). Code refers to them by index.
+        self.fns = native.NATIVES
+        # Global definitions added with `define/2`: one cell per interned symbol, indexed
+        # the same way as `env.SYMBOLS`. `defs` optionally maps names to initial values.
+        self.globals = []
+        self.version = next(VERSIONS) # replaced whenever a global changes, see `env.VERSIONS`
+        self.sites = [] # call site index -> its inline cache (see `ops.site`)
+        for name, val in (defs or {}).items():
+            self.define(name, val)
+
+        self.code = None   # the `bytecode.Code` being executed...
+        self.ops = None    # ...its instruction stream...
+        self.consts = None # ...and its constant pool
         self.pc = 0
+        self.frame = None  # the frame of the lambda being executed, None at the top level
+        self.conts = []    # where to go back to when calls return, innermost last (see `ops.start`)
+        self.depth = 0     # how deep calls into JIT-compiled code are nested (see jit.py)
         self.optable = ops.OPTABLE
+        self.runtable = ops.OPTABLE # what `optable` is when not disassembling (see profiler.py)
         self.disstate = 0
+        self.budget = None # the `budget.Budget` of the code running, if it has one
 
     def pcval(self, offset=0):
-        return self.code[self.pc+offset]
+        return self.ops[self.pc+offset]
 
     def size(self):
         return len(self.stack)
@@ -43,11 +61,174 @@ class VM:
     def push(self, val):
         self.stack.append(val)
 
-    def run(self, code):
+    def reserve(self):
+        """Makes sure there's a global cell for every symbol interned so far."""
+        if len(self.globals) < len(SYMBOLS):
+            self.globals.extend([UNBOUND] * (len(SYMBOLS) - len(self.globals)))
+
+    def define(self, name, val):
+        """Binds a global from Python."""
+        idx = SYMBOLS.intern(name)
+        self.reserve()
+        self.globals[idx] = val
+        self.version = next(VERSIONS)
+        if idx in self.watchers:
+            self.redefined(idx)
+
+    def restore(self, globals):
+        """Replaces the globals with a copy of `globals` (say, ones saved before running
+        something), deoptimizing the JIT-compiled lambdas that relied on any that change."""
+        for idx in list(self.watchers):
+            if idx >= len(globals) or idx >= len(self.globals) or self.globals[idx] is not globals[idx]:
+                self.redefined(idx)
+        self.globals = list(globals)
+        self.version = next(VERSIONS)
+        self.stack = []
+
+    def redefined(self, idx):
+        """Deoptimizes the JIT-compiled lambdas that relied on the old value of a global."""
+        for fn in self.watchers.pop(idx, ()):
+            fn.jit = None
+            fn.calls = 0
+
+    def lookup(self, name):
+        """Returns the value of a global from Python, or raises if it's not defined."""
+        idx = SYMBOLS.index.get(name)
+        if idx is None or idx >= len(self.globals) or self.globals[idx] is UNBOUND:
+            raise Exception(f"symbol \"{name}\" not defined")
+        return self.globals[idx]
+
+    def load(self, code):
+        """Points the PC at the start of `code`."""
         self.code = code
+        self.ops = code.ops
+        self.consts = code.consts
         self.pc = 0
+
+    def run(self, code, budget=None):
+        self.reserve() # `code` may have been compiled with new global names
         self.stack = []
-        length = len(self.code)
-        while self.pc < length:
-            skip = self.optable[self.pcval()](self) # cool, huh? no internal opcode branching needed!
-            self.pc += skip
\ No newline at end of file
+        self.frame = None
+        self.conts = []
+        self.depth = 0
+        if budget is not None:
+            saved = self.limit(budget)
+            try:
+                budget.charge(code.cost, 0)
+                self.execute(code)
+            finally:
+                self.unlimit(saved)
+            budget.check() # what ran since the last check
+            return
+        self.execute(code)
+
+    def execute(self, code):
+        if self.backend == "closure":
+            closures.run(self, code)
+            return
+        self.load(code)
+        self.loop()
+
+    def call(self, code, frame):
+        """Runs `code` in `frame` on this VM and leaves exactly one result on the stack. For
+        Python code calling into the VM: calls within it don't come back through here."""
+        saved = (self.code, self.ops, self.consts, self.pc, self.frame)
+        base = len(self.stack)
+        conts = len(self.conts)
+        budget = self.budget
+        self.load(code)
+        self.frame = frame
+        try:
+            if budget is not None:
+                # a call, but not on the continuation stack
+                budget.level += 1
+                budget.charge(code.cost, conts + budget.level)
+            self.loop()
+        finally:
+            # restored as they were rather than `load`ed: called from Python, there may be no code
+            self.code, self.ops, self.consts, self.pc, self.frame = saved
+            del self.conts[conts:] # those of calls an error cut short
+            if budget is not None:
+                budget.level -= 1
+
+        # a body that evaluates to nothing (e.g. a `define`) returns nil
+        if len(self.stack) == base:
+            self.push(None)
+        elif len(self.stack) > base + 1:
+            result = self.stack.pop()
+            del self.stack[base:]
+            self.push(result)
+
+    def apply(self, fn, args, budget=None):
+        """Calls a lambda with a list of arguments from Python and returns its result."""
+        if budget is not None:
+            saved = self.limit(budget)
+            try:
+                val = self.apply(fn, args)
+            finally:
+                self.unlimit(saved)
+            budget.check()
+            return val
+        if self.backend == "closure":
+            return closures.apply(self, fn, list(args))
+        self.stack.extend(reversed(args))
+        self.call(fn.code, ops.bind(self, fn, len(args)))
+        return self.stack.pop()
+
+    def limit(self, budget):
+        """Starts running code under `budget`, returning what `unlimit` needs to stop."""
+        saved = self.budget
+        self.budget = budget
+        # inline caches may hold JIT-compiled functions, which don't count (see jit.py)
+        self.version = next(VERSIONS)
+        return saved
+
+    def unlimit(self, saved):
+        self.budget = saved
+        self.version = next(VERSIONS)
+
+    def compiled(self, fn):
+        """Counts a call of `fn` and returns its JIT-compiled Python function, if it has one."""
+        return jitmod.lookup(self, fn)
+
+    def resolve(self, val):
+        """Runs the pending call if `val` is a `TailCall` a compiled lambda returned."""
+        return jitmod.resolve(self, val)
+
+    def jitcall(self, fn, argc, tail=False):
+        """Runs a call through the JIT if `fn` is compiled (or just got hot enough to be),
+        leaving its result on the stack. Returns whether it did."""
+        func = jitmod.lookup(self, fn)
+        if func is None:
+            return False
+        if argc != fn.code.nparams:
+            raise Exception(f"lambda/{fn.code.nparams}: invalid number of arguments")
+        self.invoke(fn, func, argc, tail)
+        return True
+
+    def invoke(self, fn, func, argc, tail=False):
+        """Calls `func`, what `fn` was JIT-compiled to, on `argc` arguments off the stack,
+        leaving its result there. A `tail` call is made in place of the running lambda,
+        which under a budget means as deep as it."""
+        args = [self.stack.pop() for _ in range(argc)]
+        if tail and self.budget is not None:
+            self.budget.level -= 1
+            try:
+                val = func(self, fn.env, *args, self.depth + 3)
+                self.push(val if type(val) is not TailCall else jitmod.resolve(self, val))
+            finally:
+                self.budget.level += 1
+            return
+        val = func(self, fn.env, *args, self.depth + 3) # the instruction, this and `func`
+        self.push(val if type(val) is not TailCall else jitmod.resolve(self, val))
+
+    def loop(self):
+        base = len(self.conts) # calls made before the loop started return elsewhere
+        while True:
+            # `self.ops` is re-read every step because calls swap the running code in place
+            while self.pc < len(self.ops):
+                skip = self.optable[self.ops[self.pc]](self) # cool, huh? no internal opcode branching needed!
+                self.pc += skip
+            if len(self.conts) == base:
+                return
+            self.optable[ops.OP_RETURN](self)
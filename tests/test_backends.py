@@ -0,0 +1,141 @@
+from os.path import dirname, join
+import glob
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+
+# Runs the same programs every way there is of running them, and checks they agree: the
+# stack VM and the closure backend, each without the JIT, with it compiling lambdas on
+# their first call and with it waiting for them to get hot, each with and without `-O`.
+
+CONFIGS = [(backend, jit, optimize) for backend in ("stack", "closure")
+           for jit in (None, 1, 100) for optimize in (False, True)]
+
+PROGRAMS = [
+    ("(+ 1 2 3)", "6"),
+    ("(- 10 3 2)", "5"),
+    ("(* 2 3 4)", "24"),
+    ("(/ 8 2)", "4.0"),
+    ("(cons 1 2)", "(1 . 2)"),
+    ("(list 1 2 3)", "(1 2 3)"),
+    ("(car (list 1 2 3))", "1"),
+    ("(cdr (list 1 2 3))", "(2 3)"),
+    ("(list)", "None"),
+    ("(quote (a b (c d)))", "(a b (c d))"),
+    ("(quote (1 (unquote (+ 1 1)) 3))", "(1 2 3)"),
+    ("(quote x)", "x"),
+    ("(eq? (list 1 2) (list 1 2))", "True"),
+    ("(atom? 1)", "True"),
+    ("(nil? nil)", "True"),
+    ("(nil? 1)", "False"),
+    ("(cons? (list 1))", "True"),
+    ("(cadr (list 1 2 3))", "2"),
+    ("(ff (quote ((a b) c)))", "a"),
+    ("(among (quote (1 (2 3))) 3)", "True"),
+    ("(among (quote (1 (2 3))) 4)", "False"),
+    ("(and? true false)", "False"),
+    ("(not? false)", "True"),
+    ("((λ (x y) (- x y)) 10 4)", "6"),
+    ("(define x 5) x", "5"),
+    ("(define f (λ 42)) (f)", "42"),
+    ("(define adder (λ (x) (λ (y) (+ x y)))) ((adder 10) 5)", "15"),
+    ("(define k (λ (x) (λ (y) (λ (z) (+ x y z))))) (((k 1) 2) 3)", "6"),
+    ("(cond (false 1))", "None"),
+    ("(cond (false 1) (true 2))", "2"),
+    ("(cond ((cond (false 1) (true false)) 1) (true (cond (false 3) (true 4))))", "4"),
+    ("(define f (λ (x) (cond ((eq? x 1) 10)))) (list (f 1) (f 2) (f 1))", "(10 None 10)"),
+    ("(case 2 ((1) 10) ((2 3) 20) (else 30))", "20"),
+    ("(case 9 ((1) 10) (else 30))", "30"),
+    ("(case 9 ((1) 10))", "None"),
+    ("(case (list 1) ((1) 10) (else 30))", "30"),
+    ("(define f (λ (x) (case x ((1) 10) ((2) 20)))) (list (f 1) (f 2) (f 3))", "(10 20 None)"),
+    ("(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))"
+     " (fib 15)", "610"),
+    ("(define loop (λ (n acc) (cond ((eq? n 0) acc) (true (loop (- n 1) (+ acc 1)))))) (loop 20000 0)",
+     "20000"),
+    ("(define f (λ (x) x)) (define g (λ (x) (f x))) (g 1) (define f (λ (x) (+ x 1))) (g 1)", "2"),
+    ("(define fib (memo (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2))))))))"
+     " (fib 60)", "1548008755920"),
+    ("(define sq (memo (λ (n) (* n n)) 2)) (list (sq 2) (sq 3) (sq 2) (sq 4) (sq 2))", "(4 9 4 16 4)"),
+    ("(vector-sum (* (iota 10) 2))", "90"),
+    ("(to-list (vector 1 2 3))", "(1 2 3)"),
+    ("(pvector-ref (pvector-update (to-pvector (list 1 2 3)) 1 9) 1)", "9"),
+    ("(pmap (λ (x) (* x x)) (list 1 2 3))", "(1 4 9)"),
+]
+
+ERRORS = [
+    "(car 1)",
+    "undefinedsym",
+    "(+ 1 (quote a))",
+    "(define f (λ (x) x)) (f 1 2)",
+    "(1 2)",
+    "(define f (λ (x) (λ (y) z))) ((f 1) 2)",
+    "(case (+ 1 (quote a)) ((1) 10) (else 30))",
+    # arguments are evaluated last to first, so it's the last one that fails first
+    "(define f (λ (a) (cons (car a) (undefinedsym)))) (f 1)",
+    "(define f (λ (a) (list (car a) (cdr a) (undefinedsym)))) (f 1)",
+    "(define f (λ (a) (+ (car a) (undefinedsym)))) (f 1)",
+    "(define f (λ (a) (eq? (car a) (undefinedsym)))) (f 1)",
+    "(define g (λ (x y) x)) (define f (λ (a) (g (car a) (undefinedsym)))) (f 1)",
+    "(define f (λ (a) (cond ((eq? a 0) 0) (true (f (car a) (undefinedsym)))))) (f 1)",
+    "(define f (λ (a) (undefinedfn (car a)))) (f 1)",
+]
+
+def expected(source):
+    for line in source.splitlines():
+        if line.startswith("% expect:"):
+            return line[len("% expect:"):].strip()
+    return None
+
+class BackendsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.interpreters = {config: Interpreter(*config) for config in CONFIGS}
+
+    def results(self, source):
+        """What `source` evaluates to in every configuration, printed."""
+        results = {}
+        for config, interp in self.interpreters.items():
+            try:
+                results[config] = str(interp.run(source))
+            except Exception as e:
+                results[config] = f"error: {e}"
+        return results
+
+    def test_programs(self):
+        for source, want in PROGRAMS:
+            for config, result in self.results(source).items():
+                with self.subTest(source=source, config=config):
+                    self.assertEqual(result, want)
+
+    def test_errors(self):
+        # the same error everywhere, not just some error
+        for source in ERRORS:
+            results = self.results(source)
+            want = results[CONFIGS[0]]
+            self.assertTrue(want.startswith("error: "), want)
+            for config, result in results.items():
+                with self.subTest(source=source, config=config):
+                    self.assertEqual(result, want)
+
+    def test_benchmark_programs(self):
+        for path in sorted(glob.glob(join(dirname(__file__), "..", "benchmarks", "programs", "*.lisp"))):
+            with open(path) as f:
+                source = f.read()
+            for config, result in self.results(source).items():
+                with self.subTest(program=path, config=config):
+                    self.assertEqual(result, expected(source))
+
+    def test_deep_recursion(self):
+        # calls don't nest Python calls on the stack VM, whatever the JIT does
+        source = ("(define count (λ (n) (cond ((eq? n 0) 0) (true (+ 1 (count (- n 1)))))))"
+                  f" (count {sys.getrecursionlimit() * 5})")
+        for jit in (None, 1, 100):
+            with self.subTest(jit=jit):
+                self.assertEqual(Interpreter(jit=jit).run(source), sys.getrecursionlimit() * 5)
+
+if __name__ == "__main__":
+    unittest.main()
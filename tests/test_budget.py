@@ -0,0 +1,94 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from budget import BATCH, Budget, BudgetExceeded
+from interpreter import Interpreter
+import parallel
+
+# Budgets have to hold whatever runs the code: either backend, with or without the JIT,
+# natives calling lambdas and work that could have gone to other processes.
+
+DEFS = """
+(define loop (λ (x) (loop x)))
+(define count (λ (n) (cond ((eq? n 0) 0) (true (+ 1 (count (- n 1)))))))
+(define build (λ (n acc) (cond ((eq? n 0) acc) (true (build (- n 1) (cons n acc))))))
+(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))
+"""
+
+class BudgetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.interpreters = [Interpreter(backend, jit) for backend in ("stack", "closure") for jit in (None, 1)]
+        for interp in cls.interpreters:
+            interp.load(DEFS)
+
+    def exceeds(self, source, budget, limit):
+        for interp in self.interpreters:
+            with self.subTest(source=source, backend=interp.base.backend, jit=interp.base.jit):
+                with self.assertRaises(BudgetExceeded) as raised:
+                    interp.run(source, budget())
+                self.assertEqual(raised.exception.limit, limit)
+
+    def test_instructions(self):
+        self.exceeds("(loop 1)", lambda: Budget(instructions=10000), "instructions")
+
+    def test_depth(self):
+        self.exceeds("(count 1000)", lambda: Budget(depth=100), "depth")
+
+    def test_allocations(self):
+        self.exceeds("(build 100000 nil)", lambda: Budget(allocations=1000), "allocations")
+
+    def test_within(self):
+        for interp in self.interpreters:
+            with self.subTest(backend=interp.base.backend, jit=interp.base.jit):
+                budget = Budget(instructions=10**6, depth=100, allocations=1000)
+                self.assertEqual(interp.run("(count 50)", budget), 50)
+                usage = budget.usage()
+                self.assertTrue(0 < usage["instructions"] <= 10**6)
+                self.assertEqual(usage["depth"], 51)
+                self.assertEqual(interp.run("(count 200)"), 200) # no budget left behind
+
+    def test_usage(self):
+        # counted the same whatever runs the code
+        usages = []
+        for interp in self.interpreters:
+            budget = Budget()
+            interp.run("(list (fib 12) (count 30) (build 20 nil))", budget)
+            usages.append(budget.usage())
+        self.assertEqual(usages, [usages[0]] * len(usages))
+
+    def test_compiled(self):
+        # budgeted code still runs what the JIT compiled, in a variant that counts
+        for interp in self.interpreters[1::2]:
+            with self.subTest(backend=interp.base.backend):
+                interp.run("(fib 10)", Budget())
+                self.assertIsNotNone(interp.run("fib").jit[3])
+
+    def test_natives_calling_lambdas(self):
+        self.exceeds("(pmap (λ (x) (fib 12)) (build 200 nil))", lambda: Budget(instructions=100000),
+                     "instructions")
+
+    def test_workers(self):
+        # what would otherwise have run in other processes counts too
+        workers = parallel.WORKERS
+        parallel.WORKERS = 4
+        try:
+            budget = Budget()
+            self.interpreters[0].run("(pmap (λ (x) (fib 12)) (build 200 nil))", budget)
+            self.assertGreater(budget.usage()["instructions"], 200 * 1000)
+        finally:
+            parallel.WORKERS = workers
+
+    def test_shared(self):
+        # a budget passed to several runs limits them all together
+        budget = Budget(instructions=3 * BATCH)
+        interp = self.interpreters[0]
+        with self.assertRaises(BudgetExceeded):
+            for _ in range(100):
+                interp.run("(count 100)", budget)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+from os.path import dirname, exists, join
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from bytecode import Code
+from lex import Lexer
+from ops import OPARITY
+from optimize import optimize
+from parse import Parser
+from vm import VM
+import cache
+
+# Code read back from the code cache has to run just like the code that was saved, and a
+# cache file is only trusted when everything it was made from is still the same.
+
+PRELUDE_PATH = join(dirname(__file__), "..", "src", "prelude.lisp")
+MAIN_PATH = join(dirname(__file__), "..", "src", "awrwydr.py")
+
+SOURCE = """
+(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))
+(define adder (λ (x) (λ (y) (+ x y))))
+(define kind (λ (x) (case x ((1 2) (quote small)) ((3) (quote three)) (else (quote big)))))
+(list (fib 10) ((adder 1) 2) (kind 2) (kind 3) (kind 9) (quote (a (b c))) (cadr (list 1 2 3))
+      (cond (false 1)) (vector-sum (iota 4)))
+"""
+
+def compile(source):
+    return Parser().parse(Lexer().lex(source))
+
+def run(code):
+    vm = VM(jit=None)
+    with open(PRELUDE_PATH) as f:
+        vm.run(compile(f.read()))
+    vm.run(code)
+    return str(vm.stack[-1])
+
+def sites(code):
+    """The instructions of `code` and the lambdas in it, with the call site indexes taken
+    out, and those indexes."""
+    ops, indexes = list(code.ops), []
+    pc = 0
+    while pc < len(ops):
+        if ops[pc] in cache.SITE_OPERAND:
+            indexes.append(ops[pc + 1 + cache.SITE_OPERAND[ops[pc]]])
+            ops[pc + 1 + cache.SITE_OPERAND[ops[pc]]] = None
+        pc += OPARITY[ops[pc]] + 1
+    for const in code.consts:
+        if type(const) is Code:
+            inner, more = sites(const)
+            ops.append(inner)
+            indexes += more
+    return ops, indexes
+
+class CacheTest(unittest.TestCase):
+    def test_round_trip(self):
+        for optimized in (False, True):
+            with self.subTest(optimized=optimized):
+                code = optimize(compile(SOURCE)) if optimized else compile(SOURCE)
+                loaded = cache.loads(cache.dumps(code))
+                self.assertEqual(sites(loaded)[0], sites(code)[0])
+                # calls are given call sites of their own, not those of the code saved
+                self.assertFalse(set(sites(loaded)[1]) & set(sites(code)[1]))
+                self.assertEqual(run(loaded), run(code))
+
+    def test_load(self):
+        compiled = []
+        def build(source):
+            compiled.append(source)
+            return compile(source)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = join(tmp, "program.lisp")
+            with open(path, "w") as f:
+                f.write(SOURCE)
+            want = run(compile(SOURCE))
+
+            self.assertEqual(run(cache.load(path, build, "1")), want)
+            self.assertTrue(exists(cache.location(path)))
+            self.assertEqual(run(cache.load(path, build, "1")), want)
+            self.assertEqual(len(compiled), 1) # the second time, from the cache
+
+            cache.load(path, build, "2")
+            cache.load(path, build, "2", "O")
+            self.assertEqual(len(compiled), 3) # another version or flags won't do
+
+            with open(path, "a") as f:
+                f.write("(fib 5)")
+            self.assertEqual(run(cache.load(path, build, "2", "O")), "5")
+            self.assertEqual(len(compiled), 4) # nor another source
+
+            with open(cache.location(path), "r+b") as f:
+                f.seek(-8, 2)
+                f.write(b"garbage!")
+            self.assertEqual(run(cache.load(path, build, "2", "O")), "5")
+            self.assertEqual(len(compiled), 5) # nor a corrupt file
+
+    def test_scripts(self):
+        def awrwydr(*args):
+            return subprocess.run([sys.executable, MAIN_PATH, *args], capture_output=True, text=True).stdout
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = join(tmp, "script.lisp")
+            with open(path, "w") as f:
+                f.write(SOURCE + "(fib 5)\n")
+            want = awrwydr("--no-cache", path)
+            self.assertEqual(want.count("::"), 2) # a line per expression with a value
+            self.assertFalse(exists(cache.location(path)))
+
+            self.assertEqual(awrwydr(path), want)
+            written = os.stat(cache.location(path)).st_mtime_ns
+            self.assertEqual(awrwydr(path), want)
+            self.assertEqual(os.stat(cache.location(path)).st_mtime_ns, written) # read, not rewritten
+            self.assertEqual(awrwydr("--hashcons", path), want)
+            self.assertNotEqual(os.stat(cache.location(path)).st_mtime_ns, written)
+
+            # a script that fails isn't cached, and prints what it got to first either way
+            failing = join(tmp, "failing.lisp")
+            with open(failing, "w") as f:
+                f.write("(+ 1 2)\n(car 1)\n")
+            self.assertTrue(awrwydr(failing).startswith(":: 3\n"))
+            self.assertFalse(exists(cache.location(failing)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from cons import Cons, ListBuilder
+
+# Lists of any length have to be iterated, measured, compared, hashed and printed without
+# recursing, and built front to back in linear time.
+
+N = 100000 # well past the recursion limit
+
+def make(items, last=None):
+    lst = last
+    for item in reversed(items):
+        lst = Cons(item, lst)
+    return lst
+
+class ConsTest(unittest.TestCase):
+    def test_long(self):
+        items = list(range(N))
+        lst = make(items)
+        self.assertEqual(len(lst), N)
+        self.assertEqual(list(lst), items)
+        self.assertEqual(lst.items(), items)
+        self.assertEqual(list(reversed(lst)), items[::-1])
+        self.assertEqual(repr(lst), "(" + " ".join(map(str, items)) + ")")
+        other = make(items)
+        self.assertEqual(lst, other)
+        self.assertEqual(hash(lst), hash(other))
+        self.assertNotEqual(lst, make(items[:-1] + [0]))
+        self.assertEqual({lst: 1}[other], 1)
+
+    def test_improper(self):
+        lst = make([1, 2], 3)
+        self.assertEqual(repr(lst), "(1 2 . 3)")
+        self.assertEqual(list(lst), [1, 2, 3])
+        self.assertEqual(len(lst), 3)
+        self.assertNotEqual(lst, make([1, 2, 3]))
+
+    def test_nested(self):
+        lst = make([1, make([2, 3]), Cons(None, None)])
+        self.assertEqual(repr(lst), "(1 (2 3) (None))")
+        self.assertEqual(lst, make([1, make([2, 3]), Cons(None, None)]))
+
+    def test_append(self):
+        lst = Cons(None, None) # `()`, which the first append fills in
+        for i in range(3):
+            lst.append(i)
+        self.assertEqual(repr(lst), "(0 1 2)")
+
+    def test_builder(self):
+        self.assertEqual(repr(ListBuilder().build()), "(None)") # `()`
+        builder = ListBuilder()
+        for i in range(N):
+            builder.add(i)
+        lst = builder.build()
+        self.assertEqual(len(lst), N)
+        self.assertEqual(lst, make(list(range(N))))
+        builder.add(N) # the list built so far grows with it
+        self.assertEqual(len(lst), N + 1)
+
+if __name__ == "__main__":
+    unittest.main()
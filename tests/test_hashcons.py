@@ -0,0 +1,73 @@
+from os.path import dirname, join
+import gc
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from cons import Cons, hashcons, sweep
+from interpreter import Interpreter
+import cons
+import native
+
+# Hash-consed lists: one cell per `car` and `cdr`, however the list came about (natives,
+# quotes, compiled code), on every backend, and forgotten once nothing holds them.
+
+MAIN_PATH = join(dirname(__file__), "..", "src", "awrwydr.py")
+
+class HashconsTest(unittest.TestCase):
+    def test_cells(self):
+        lst = hashcons(1, hashcons(2, None))
+        self.assertIs(hashcons(1, hashcons(2, None)), lst)
+        self.assertIsNot(hashcons(True, None), hashcons(1, None)) # told apart by type
+        self.assertEqual(hash(lst), hash(Cons(1, Cons(2, None))))
+        self.assertEqual(lst, Cons(1, Cons(2, None)))
+        unhashable = hashcons([], None)
+        self.assertIsNot(hashcons([], None), unhashable)
+
+    def test_sweep(self):
+        gc.collect() # whatever earlier tests left holding cells
+        sweep()
+        before = len(cons.CELLS)
+        kept = hashcons("kept", hashcons("kept", None))
+        for i in range(5000):
+            hashcons(f"dropped {i}", hashcons(f"dropped {i}", None))
+        sweep()
+        # the dropped lists go in one pass, the second cell of each along with the first
+        self.assertEqual(len(cons.CELLS), before + 2)
+        self.assertEqual(len(cons.HASHES), len(cons.CELLS))
+        self.assertEqual(cons.SWEEP, max(1024, 2 * len(cons.CELLS)))
+        self.assertIs(hashcons("kept", hashcons("kept", None)), kept)
+
+    def test_backends(self):
+        native.hashconsing()
+        try:
+            for backend in ("stack", "closure"):
+                for jit in (None, 1):
+                    with self.subTest(backend=backend, jit=jit):
+                        interp = Interpreter(backend, jit)
+                        interp.load("(define pair (λ (x) (list x (cons x (quote (2 3))))))")
+                        for _ in range(3): # compiled by the last run
+                            a, b = interp.run("(pair 1)"), interp.run("(pair 1)")
+                            self.assertIs(a, b)
+                            self.assertIs(a.cdr.car, interp.run("(quote (1 2 3))"))
+                            self.assertEqual(str(a), "(1 (1 2 3))")
+        finally:
+            native.hashconsing(False)
+
+    def test_flag(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = join(tmp, "lists.lisp")
+            with open(path, "w") as f:
+                f.write("(define l (list 1 (quote (2 3)) (cons 4 nil)))\n"
+                        "(eq? l (list 1 (list 2 3) (list 4)))\n(car (cdr l))\n")
+            runs = [subprocess.run([sys.executable, MAIN_PATH, "--no-cache", *flags, path],
+                                   capture_output=True, text=True) for flags in ([], ["--hashcons"])]
+            self.assertEqual(runs[0].stdout, ":: True\n:: (2 3)\n")
+            self.assertEqual(runs[1].stdout, runs[0].stdout)
+            self.assertEqual(runs[1].returncode, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+from vm import VM
+
+# The library API: programs compiled once and run many times, by any interpreter and any
+# number of threads at once, none of them seeing what the others `define`.
+
+DEFS = """
+(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))
+"""
+
+FIBS = [0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, 377, 610]
+
+class InterpreterTest(unittest.TestCase):
+    def test_run_many(self):
+        interp = Interpreter()
+        interp.load(DEFS)
+        program = interp.compile("(fib 10)")
+        for _ in range(3):
+            self.assertEqual(interp.run(program), 55)
+        self.assertEqual(interp.call("fib", 12), 144)
+        with self.assertRaises(AttributeError):
+            program.code = None
+
+        # a program only refers to globals by name, so any interpreter can run it
+        other = Interpreter(prelude=False)
+        other.define("fib", interp.lookup("fib"))
+        self.assertEqual(other.run(program), 55)
+
+    def test_isolation(self):
+        interp = Interpreter()
+        interp.load(DEFS)
+        self.assertEqual(interp.run("(define fib 1) (define x 2) (+ fib x)"), 3)
+        self.assertEqual(interp.run("(fib 10)"), 55)
+        self.assertRaises(Exception, interp.run, "x")
+        self.assertIsNot(VM().globals, VM().globals)
+
+    def test_threads(self):
+        for backend in ("stack", "closure"):
+            for jit in (None, 1):
+                with self.subTest(backend=backend, jit=jit):
+                    interp = Interpreter(backend, jit)
+                    interp.load(DEFS)
+                    shared = interp.compile("(fib n)")
+                    def work(i):
+                        n = i % len(FIBS)
+                        # compiled here, while other threads compile and run theirs
+                        own = interp.compile(f"(define n {n}) (define m (fib n)) (list n m)")
+                        results = []
+                        for _ in range(10):
+                            results.append(str(interp.run(own)))
+                            results.append(interp.run(f"(define n {n}) (fib n)"))
+                            results.append(interp.call("fib", n))
+                            self.assertRaises(Exception, interp.run, shared) # `n` is gone again
+                        return results
+                    with ThreadPoolExecutor(8) as pool:
+                        for i, results in enumerate(pool.map(work, range(16))):
+                            n = i % len(FIBS)
+                            self.assertEqual(results, [f"({n} {FIBS[n]})", FIBS[n], FIBS[n]] * 10)
+
+if __name__ == "__main__":
+    unittest.main()
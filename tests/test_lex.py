@@ -0,0 +1,71 @@
+from os.path import dirname, join
+import io
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import LexError, Lexer, chunks
+
+# Source code lexed as it's read has to come out the same as when it's lexed in one go,
+# however the stream happens to be cut up, and errors have to say where they are.
+
+SOURCE = """
+(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))
+% a comment (with a paren
+[1 (a b) nil]
+(quote
+    (λ λ λ))
+12ab
+"""
+
+class LexTest(unittest.TestCase):
+    def test_streaming(self):
+        want = [str(expr) for expr in Lexer().lex(SOURCE)]
+        for size in (1, 2, 3, 7, 64, 1 << 16):
+            with self.subTest(size=size):
+                stream = io.BytesIO(SOURCE.encode())
+                pieces = list(chunks(stream, size))
+                self.assertEqual("".join(pieces), SOURCE) # `λ` is two bytes, often split
+                self.assertTrue(all(piece.endswith("\n") for piece in pieces[:-1]))
+                got = Lexer().read(chunks(io.BytesIO(SOURCE.encode()), size))
+                self.assertEqual([str(expr) for expr in got], want)
+
+    def test_incremental(self):
+        # each expression comes out once the line it ends on has been read, not at the end
+        stream = io.BytesIO(b"(a b)\n(c\nd)\n(e)")
+        exprs = Lexer().read(chunks(stream, 1))
+        self.assertEqual(str(next(exprs)), "(a b)")
+        self.assertEqual(stream.tell(), 6)
+        self.assertEqual(str(next(exprs)), "(c d)")
+        self.assertEqual(stream.tell(), 12)
+        self.assertEqual(str(next(exprs)), "(e)")
+        self.assertRaises(StopIteration, next, exprs)
+
+# source -> the error's message, line and column
+ERRORS = {
+    "(a b))": ("unexpected closing paren `)`", 1, 6),
+    "[1 2)": ("unexpected closing paren `)`", 1, 5),
+    "(a\n  b]\n": ("unexpected closing bracket `]`", 2, 4),
+    "% a ) comment\n(a ]": ("unexpected closing bracket `]`", 2, 4),
+    "x\n  (a #b)": ("`#`: unknown lexeme", 2, 6),
+    "(a\n (b c)\n": ("unterminated s-expression", 1, 1),
+    "(f 1)\n(g 2)\n\n   (h 3 @)": ("`@`: unknown lexeme", 4, 9),
+    "(f 1)\n(g\n2": ("unterminated s-expression", 2, 1),
+}
+
+class LexErrorTest(unittest.TestCase):
+    def test_positions(self):
+        for source, want in ERRORS.items():
+            for size in (None, 1, 4):
+                with self.subTest(source=source, size=size):
+                    with self.assertRaises(LexError) as raised:
+                        if size is None:
+                            Lexer().lex(source)
+                        else:
+                            list(Lexer().read(chunks(io.BytesIO(source.encode()), size)))
+                    error = raised.exception
+                    self.assertEqual((str(error), error.line, error.column), want)
+
+if __name__ == "__main__":
+    unittest.main()
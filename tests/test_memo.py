@@ -0,0 +1,98 @@
+from os.path import dirname, join
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+
+# Memoized lambdas: what they remember, for how long, and that remembering doesn't change
+# what they return, on every backend.
+
+DEFS = """
+(define fib (memo (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2))))))))
+(define sq (memo (λ (n) (* n n)) 2))
+(define id (memo (λ (x) x)))
+"""
+
+def stats(interp, name):
+    return {pair.car: pair.cdr.car for pair in interp.run(f"(memo-stats {name})")}
+
+class MemoTest(unittest.TestCase):
+    def setUp(self):
+        self.interpreters = [Interpreter(backend, jit) for backend in ("stack", "closure") for jit in (None, 1)]
+        for interp in self.interpreters:
+            interp.load(DEFS)
+
+    def test_results(self):
+        for interp in self.interpreters:
+            with self.subTest(backend=interp.base.backend, jit=interp.base.jit):
+                self.assertEqual(interp.run("(fib 90)"), 2880067194370816120)
+                self.assertEqual(stats(interp, "fib"), {"hits": 88, "misses": 91, "evictions": 0,
+                                                        "size": 91, "limit": 1024})
+                interp.run("(memo-clear fib)")
+                self.assertEqual(stats(interp, "fib")["size"], 0)
+
+    def test_lru(self):
+        interp = self.interpreters[0]
+        self.assertEqual(str(interp.run("(list (sq 2) (sq 3) (sq 2) (sq 4) (sq 2) (sq 3))")), "(4 9 4 16 4 9)")
+        # 3 was the least recently used when 4 came in, so it's been computed twice
+        self.assertEqual(stats(interp, "sq"), {"hits": 2, "misses": 4, "evictions": 2, "size": 2, "limit": 2})
+
+    def test_keys(self):
+        interp = self.interpreters[0]
+        self.assertEqual(str(interp.run("(list (id 1) (id true) (id (list 1 2)) (id (list 1 2)) (id [1 2]))")),
+                         "(1 True (1 2) (1 2) [1 2])")
+        self.assertEqual(stats(interp, "id")["misses"], 4)
+
+    def test_unhashable(self):
+        # called uncached rather than failing
+        interp = self.interpreters[0]
+        self.assertEqual(interp.call("id", [1, 2]), [1, 2])
+        self.assertEqual(interp.call("id", [1, 2]), [1, 2])
+        self.assertEqual(stats(interp, "id"), {"hits": 0, "misses": 2, "evictions": 0, "size": 0, "limit": 1024})
+
+    def test_errors(self):
+        interp = self.interpreters[0]
+        for source in ["(memo 1)", "(memo (λ (x) x) 0)", "(memo-stats (λ (x) x))", "(sq 1 2)"]:
+            with self.subTest(source=source):
+                self.assertRaises(Exception, interp.run, source)
+
+    def test_deep(self):
+        # misses recurse on the VM's continuation stack, not Python's
+        for jit in (None, 1):
+            with self.subTest(jit=jit):
+                interp = Interpreter(jit=jit)
+                interp.load(DEFS)
+                n = sys.getrecursionlimit() * 3
+                a, b = 0, 1
+                for _ in range(n):
+                    a, b = b, a + b
+                self.assertEqual(interp.run(f"(fib {n})"), a)
+                self.assertEqual(stats(interp, "fib")["misses"], n + 1)
+
+    def test_threads(self):
+        interp = Interpreter()
+        interp.load("(define sq (memo (λ (n) (* n n)) 8))")
+        program = interp.compile("(list (sq 1) (sq 2) (sq 3) (sq 4) (sq 5) (sq 6) (sq 7) (sq 8) (sq 9) (sq 10))")
+        failures = []
+        def work():
+            try:
+                for _ in range(200):
+                    if str(interp.run(program)) != "(1 4 9 16 25 36 49 64 81 100)":
+                        failures.append("wrong result")
+            except Exception as e:
+                failures.append(e)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+        counts = stats(interp, "sq")
+        self.assertEqual(counts["hits"] + counts["misses"], 4 * 200 * 10)
+        self.assertEqual(counts["size"], 8)
+
+if __name__ == "__main__":
+    unittest.main()
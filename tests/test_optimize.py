@@ -0,0 +1,111 @@
+from os.path import dirname, join
+import random
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from ops import CALLS, OP_ATOM, OP_JIF, OP_SWITCH, OPARITY
+from optimize import optimize
+from parse import Parser
+from vm import VM
+
+# The optimizer mustn't change what code evaluates to, or whether it fails: checked on
+# the cases each rewrite has to be careful about, and on random expressions mixing them.
+
+def compile(source, optimized=True):
+    code = Parser().parse(Lexer().lex(source))
+    return optimize(code) if optimized else code
+
+def run(code):
+    vm = VM(jit=None)
+    try:
+        vm.run(code)
+        return repr(vm.stack)
+    except Exception as e:
+        return f"error: {e}"
+
+def calls(code):
+    """Whether `code` calls natives."""
+    return any(op in CALLS for op in ops(code))
+
+def ops(code):
+    """The opcodes of `code`, without their arguments."""
+    found, pc = [], 0
+    while pc < len(code.ops):
+        found.append(code.ops[pc])
+        pc += OPARITY[code.ops[pc]] + 1
+    return found
+
+class OptimizeTest(unittest.TestCase):
+    def test_folds_constants(self):
+        code = compile("(+ 1 2 3)")
+        self.assertEqual(ops(code), [OP_ATOM])
+        self.assertEqual(run(code), "[6]")
+
+    def test_leaves_failing_calls(self):
+        code = compile("(car 1)") # fails when run, not when optimized
+        self.assertTrue(calls(code))
+        self.assertTrue(run(code).startswith("error"))
+
+    def test_drops_dead_branches_unrun(self):
+        for source, want in [("(cond (false (car 1)) (true 2))", "[2]"),
+                             ("(cond ((eq? 1 2) (car 1)) (true 2))", "[2]"),
+                             ("(case 2 ((1) (car 1)) (else 3))", "[3]")]:
+            with self.subTest(source=source):
+                code = compile(source)
+                self.assertNotIn(OP_JIF, ops(code))
+                self.assertNotIn(OP_SWITCH, ops(code))
+                self.assertEqual(run(code), want)
+
+    def test_unmatched(self):
+        for source in ["(cond (false 1))", "(case 2 ((1) 1))", "(cond ((eq? 1 2) 1))"]:
+            with self.subTest(source=source):
+                self.assertEqual(run(compile(source)), "[None]")
+
+    def test_leaves_allocations(self):
+        code = compile("(vector-length (iota 20000000))")
+        self.assertTrue(calls(code))
+        self.assertEqual(len(code.consts), 1)
+
+    def test_random(self):
+        rng = random.Random(0)
+
+        def expr(depth):
+            r = rng.random()
+            if depth <= 0 or r < 0.25:
+                return rng.choice(["x", "y", "1", "2", "true", "false", "nil", "(quote (a b))"])
+            if r < 0.5:
+                pairs = " ".join(f"({test(depth - 1)} {expr(depth - 1)})" for _ in range(rng.randint(1, 3)))
+                if rng.random() < 0.5:
+                    pairs += f" (true {expr(depth - 1)})"
+                return f"(cond {pairs})"
+            if r < 0.6:
+                pairs = " ".join(f"(({rng.randint(1, 3)}) {expr(depth - 1)})" for _ in range(rng.randint(1, 2)))
+                if rng.random() < 0.5:
+                    pairs += f" (else {expr(depth - 1)})"
+                return f"(case {rng.choice(['x', '1', '2', '(+ x 1)'])} {pairs})"
+            if r < 0.75:
+                return f"(+ {num()} {num()})"
+            if r < 0.85:
+                return f"(cons {expr(depth - 1)} {expr(depth - 1)})"
+            if r < 0.95:
+                return f"(eq? {expr(depth - 1)} {expr(depth - 1)})"
+            return f"(g {expr(depth - 1)})"
+
+        def num():
+            return rng.choice(["x", "1", "3", f"(+ x {rng.randint(0, 3)})", "(- 5 2)", "y"])
+
+        def test(depth):
+            return rng.choice(["true", "false", "(eq? x 1)", "(eq? y 2)", "(nil? y)", "(atom? x)", expr(depth)])
+
+        for _ in range(200):
+            body = expr(4)
+            source = (f"(define g (λ (z) z)) (define f (λ (x y) {body}))"
+                      " (f 1 2) (f 3 nil) (f 1 nil) (f 2 2) " + body.replace("x", "1").replace("y", "2"))
+            with self.subTest(source=source):
+                self.assertEqual(run(compile(source)), run(compile(source, optimized=False)))
+
+if __name__ == "__main__":
+    unittest.main()
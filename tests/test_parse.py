@@ -0,0 +1,59 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from env import SYMBOLS
+from interpreter import Interpreter
+from lex import Lexer
+from ops import OP_DEREF, OP_FIND, OP_LOCAL, OPARITY
+from parse import Parser
+
+# Names are resolved while compiling: parameters and the names a lambda body `define`s to
+# slots of its frame, names of enclosing lambdas to a (depth, slot) pair, anything else
+# to the index of a global.
+
+def compile(source):
+    return Parser().parse(Lexer().lex(source))
+
+def instructions(code):
+    """The instructions of `code`, as tuples of the opcode and its arguments."""
+    found, pc = [], 0
+    while pc < len(code.ops):
+        found.append(tuple(code.ops[pc:pc + OPARITY[code.ops[pc]] + 1]))
+        pc += OPARITY[code.ops[pc]] + 1
+    return found
+
+class ParseTest(unittest.TestCase):
+    def test_slots(self):
+        code = compile("(λ (x y) (λ (z) (list z y x g)))").consts[0]
+        self.assertEqual(code.locals, ("x", "y"))
+        inner = code.consts[0]
+        found = instructions(inner)
+        self.assertIn((OP_FIND, SYMBOLS.intern("g")), found)
+        self.assertIn((OP_DEREF, 1, 0, inner.consts.index("x")), found)
+        self.assertIn((OP_DEREF, 1, 1, inner.consts.index("y")), found)
+        self.assertIn((OP_LOCAL, 0), found)
+
+    def test_defines(self):
+        code = compile("(λ (x) (cond ((eq? x 1) (define y 2)) (true (define z (quote (a (unquote x)))))))")
+        self.assertEqual(code.consts[0].locals, ("x", "y", "z"))
+
+    def test_unbound(self):
+        interp = Interpreter(jit=None)
+        with self.assertRaisesRegex(Exception, 'symbol "y" not defined in enclosing lambda'):
+            interp.run("(define f (λ (x) (cond (x (define y 1)) (true (λ (z) y))))) ((f false) 1)")
+
+    def test_unquoted_define(self):
+        # an unquoted expression is an element of the list, which a `define` has no value for
+        for source in ["(λ (x) (quote (a (unquote (define y x)))))", "(quote ((unquote (define y 1))))"]:
+            with self.subTest(source=source):
+                with self.assertRaisesRegex(Exception, "define/2: can't be unquoted"):
+                    compile(source)
+        interp = Interpreter(jit=None)
+        self.assertEqual(str(interp.run("(define f (λ (x) (quote (a (unquote ((λ (z) (define w z)) x))))))"
+                                        " (f 1)")), "(a None)")
+
+if __name__ == "__main__":
+    unittest.main()
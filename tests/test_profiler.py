@@ -0,0 +1,72 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from profiler import Profiler
+from vm import VM
+
+# What the profiler measures: how often each opcode, native and lambda ran, and times
+# that add up, even when errors cut lambdas short.
+
+PRELUDE_PATH = join(dirname(__file__), "..", "src", "prelude.lisp")
+
+DEFS = """
+(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))
+(define fail (λ (n) (cond ((eq? n 0) (car n)) (true (+ 1 (fail (- n 1)))))))
+"""
+
+def compile(source):
+    return Parser().parse(Lexer().lex(source))
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.vm = VM(jit=None)
+        with open(PRELUDE_PATH) as f:
+            self.vm.run(compile(f.read()))
+        self.vm.run(compile(DEFS))
+        self.profiler = Profiler(self.vm)
+
+    def profile(self, *sources):
+        """Runs each of `sources` under the profiler, ignoring errors, and returns the results."""
+        self.profiler.start()
+        try:
+            for source in sources:
+                try:
+                    self.vm.run(compile(source))
+                except Exception:
+                    pass
+        finally:
+            self.profiler.stop()
+        return self.profiler.results()
+
+    def entry(self, results, kind, name):
+        return next(entry for entry in results[kind] if entry["name"] == name)
+
+    def test_counts(self):
+        results = self.profile("(fib 10)")
+        self.assertEqual(self.entry(results, "lambdas", "fib")["count"], 177)
+        self.assertEqual(self.entry(results, "natives", "+")["count"], 88)
+        self.assertEqual(results["caches"]["hits"] + results["caches"]["misses"], 177)
+        self.assertEqual(self.vm.stack, [55])
+        self.assertEqual(self.profiler.running, [])
+        self.assertIn("fib", self.profiler.report())
+
+    def test_errors(self):
+        # errors cut `fail` short 100 levels deep, including within a lambda a native calls
+        results = self.profile("(fail 100)", "(fib 12)", "(pmap (λ (x) (fail x)) (list 5 6))",
+                               "(fail 50)", "(fib 12)")
+        self.assertEqual(self.profiler.running, [])
+        self.assertEqual(self.entry(results, "lambdas", "fail")["count"], 101 + 6 + 51)
+        for kind in ("opcodes", "natives", "lambdas"):
+            for entry in results[kind]:
+                with self.subTest(kind=kind, name=entry["name"]):
+                    self.assertLessEqual(entry["self"], entry["cumulative"] + 1e-9)
+        # and the VM isn't left profiled
+        self.assertNotIn("run", vars(self.vm))
+
+if __name__ == "__main__":
+    unittest.main()
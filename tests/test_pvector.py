@@ -0,0 +1,115 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+from pvector import EMPTY, WIDTH, make
+
+# Persistent vectors either side of where the tail fills and the trie grows a level: built
+# by pushing or all at once, indexed, changed without touching the original or copying more
+# than the path to the change, and read and printed as literals.
+
+SIZES = sorted({0, 1, 2} | {n + d for n in (WIDTH, 2 * WIDTH, WIDTH * WIDTH, WIDTH * WIDTH + WIDTH,
+                                             WIDTH ** 3 + WIDTH) for d in (-1, 0, 1)})
+
+class PVectorTest(unittest.TestCase):
+    def test_build(self):
+        vec = EMPTY
+        for count in SIZES:
+            while len(vec) < count:
+                vec = vec.push(len(vec))
+            with self.subTest(count=count):
+                items = list(range(count))
+                self.assertEqual(vec.items(), items)
+                self.assertEqual(list(vec), items)
+                self.assertEqual([vec.nth(i) for i in range(count)], items)
+                self.assertTrue(0 < len(vec.tail) <= WIDTH or count == 0)
+                # pushing one at a time makes the same trie as building it in one go
+                built = make(items)
+                self.assertEqual((built.count, built.shift, built.root, built.tail),
+                                 (vec.count, vec.shift, vec.root, vec.tail))
+                self.assertEqual(built, vec)
+                self.assertEqual(hash(built), hash(vec))
+                self.assertEqual(repr(vec), "[" + " ".join(map(str, items)) + "]")
+
+    def test_update(self):
+        for count in SIZES:
+            if count == 0:
+                continue
+            vec = make(list(range(count)))
+            leaves = list(vec.leaves())
+            for idx in sorted({0, WIDTH - 1, WIDTH, count // 2, count - WIDTH, count - 1} & set(range(count))):
+                with self.subTest(count=count, idx=idx):
+                    new = vec.update(idx, "x")
+                    self.assertEqual(new.nth(idx), "x")
+                    self.assertEqual(vec.nth(idx), idx)
+                    self.assertEqual(new.items(), list(range(idx)) + ["x"] + list(range(idx + 1, count)))
+                    self.assertNotEqual(new, vec)
+                    # every leaf but the changed one is shared
+                    shared = [a is b for a, b in zip(leaves, new.leaves())]
+                    self.assertEqual(shared.count(False), 1)
+                    if idx >= count - len(vec.tail):
+                        self.assertIs(new.root, vec.root)
+                    else:
+                        self.assertIs(new.tail, vec.tail)
+
+    def test_push(self):
+        for count in SIZES:
+            vec = make(list(range(count)))
+            with self.subTest(count=count):
+                new = vec.push("x")
+                self.assertEqual(len(new), count + 1)
+                self.assertEqual(len(vec), count)
+                self.assertEqual(new.nth(count), "x")
+                self.assertEqual(vec.update(count, "x"), new)
+                self.assertEqual(new.items()[:count], vec.items())
+                if len(vec.tail) < WIDTH:
+                    self.assertIs(new.root, vec.root)
+                else: # the full tail went into the trie as it was
+                    self.assertIs(list(new.leaves())[-2], vec.tail)
+
+    def test_programs(self):
+        interp = Interpreter()
+        for source, expected in [
+            ("[1 2 (a b) c]", "[1 2 (a b) c]"),
+            ("[(+ 1 2)]", "[(+ 1 2)]"), # elements aren't run
+            ("(quote [1 [2 x]])", "[1 [2 x]]"),
+            ("[]", "[]"),
+            ("(pvector)", "[]"),
+            ("(to-pvector nil)", "[]"),
+            ("(to-list [1 (a) 3])", "(1 (a) 3)"),
+            ("(to-list [])", "None"),
+            ("(pvector-push [1 2] 3)", "[1 2 3]"),
+            ("(pvector-update [1 2] 2 3)", "[1 2 3]"),
+            ("(eq? [1 2] (pvector 1 2))", "True"),
+            ("(eq? [1 2] (list 1 2))", "False"),
+        ]:
+            with self.subTest(source=source):
+                self.assertEqual(str(interp.run(source)), expected)
+        for count in (WIDTH, WIDTH + 1, WIDTH * WIDTH + 1):
+            with self.subTest(count=count):
+                source = f"(to-pvector (to-list (iota {count})))"
+                self.assertEqual(interp.run(f"(pvector-length {source})"), count)
+                self.assertEqual(interp.run(f"(pvector-ref {source} {count - 1})"), count - 1)
+                self.assertEqual(interp.run(f"(eq? (to-list {source}) (to-list (iota {count})))"), True)
+                literal = "[" + " ".join(map(str, range(count))) + "]"
+                self.assertEqual(interp.run(f"(eq? {literal} {source})"), True)
+
+    def test_errors(self):
+        interp = Interpreter()
+        for source, message in [
+            ("(pvector-ref [] 0)", "`pvector-ref/2`: index 0 out of range"),
+            ("(pvector-ref [1 2] 2)", "`pvector-ref/2`: index 2 out of range"),
+            ("(pvector-ref (list 1) 0)", "`pvector-ref/2`: invalid argument type"),
+            ("(pvector-update [1 2] 3 3)", "`pvector-update/3`: index 3 out of range"),
+            ("(to-pvector 1)", "`to-pvector/1`: invalid argument type"),
+        ]:
+            with self.subTest(source=source):
+                with self.assertRaises(Exception) as cm:
+                    interp.run(source)
+                self.assertEqual(str(cm.exception), message)
+
+if __name__ == "__main__":
+    unittest.main()
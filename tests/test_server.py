@@ -0,0 +1,95 @@
+from os.path import dirname, join
+import asyncio
+import json
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from parse import Parser
+from server import Worker
+from vm import VM
+
+# The evaluation server's protocol (see server.py): a line of JSON in, a line of JSON out,
+# in order, with each connection keeping its globals to itself.
+
+PRELUDE_PATH = join(dirname(__file__), "..", "src", "prelude.lisp")
+
+def template():
+    vm = VM()
+    with open(PRELUDE_PATH) as f:
+        vm.run(Parser().parse(Lexer().lex(f.read())))
+    return vm
+
+class ServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.worker = Worker(template())
+
+    def respond(self, vm, request):
+        return self.worker.respond(vm, json.dumps(request) if type(request) is dict else request)
+
+    def test_requests(self):
+        vm = self.worker.pool.acquire()
+        try:
+            self.assertEqual(self.respond(vm, {"id": 1, "source": "(define x 2) (+ x 1)"}),
+                             {"id": 1, "results": ["3"]})
+            self.assertEqual(self.respond(vm, {"source": "(cadr (list 1 x))"}), {"results": ["2"]})
+            response = self.respond(vm, {"id": "a", "source": "(+ x 1) (car 1) (+ x 2)"})
+            self.assertEqual(response["id"], "a")
+            self.assertEqual(response["results"], ["3"])
+            self.assertIn("error", response)
+        finally:
+            self.worker.pool.release(vm)
+
+    def test_budget(self):
+        vm = self.worker.pool.acquire()
+        try:
+            response = self.respond(vm, {"source": "(define f (λ (x) (f x))) (f 1)",
+                                         "budget": {"instructions": 100000}})
+            self.assertEqual(response["error"], "<error: instructions budget of 100000 exceeded>")
+            self.assertGreater(response["usage"]["instructions"], 100000)
+            response = self.respond(vm, {"source": "(+ 1 2)", "budget": {"depth": 10}})
+            self.assertEqual(response["results"], ["3"])
+            self.assertIn("usage", response)
+        finally:
+            self.worker.pool.release(vm)
+
+    def test_bad_requests(self):
+        vm = self.worker.pool.acquire()
+        try:
+            for request in ["not json", "[1]", '{"source": 1}', '{"id": 1}',
+                            '{"source": "1", "budget": {"instructions": "many"}}',
+                            '{"source": "1", "budget": {"steps": 1}}']:
+                with self.subTest(request=request):
+                    response = self.respond(vm, request)
+                    self.assertTrue(response["error"].startswith("<error:"))
+        finally:
+            self.worker.pool.release(vm)
+
+    def test_connections(self):
+        async def session(path, requests):
+            reader, writer = await asyncio.open_unix_connection(path)
+            # all at once, without waiting for the responses in between
+            writer.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            return responses
+
+        async def main(path):
+            server = await asyncio.start_unix_server(self.worker.connection, path)
+            async with server:
+                first = await session(path, [{"id": n, "source": f"(define x {n}) x"} for n in range(50)])
+                second = await session(path, [{"source": "x"}])
+            return first, second
+
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = asyncio.run(main(join(tmp, "socket")))
+        self.assertEqual(first, [{"id": n, "results": [str(n)]} for n in range(50)])
+        self.assertIn("error", second[0]) # another connection's `define`s aren't seen
+
+if __name__ == "__main__":
+    unittest.main()
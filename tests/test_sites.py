@@ -0,0 +1,100 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from lex import Lexer
+from ops import EMPTY, OP_FIND_EVAL, OP_FIND_TAIL_EVAL
+from parse import Parser
+from profiler import Profiler
+from vm import VM
+import ops
+
+# Inline caches of calls of globals (see `ops.site`): each call has a slot of its own in
+# each VM, which is only trusted while none of the VM's globals have changed.
+
+def compile(source):
+    return Parser().parse(Lexer().lex(source))
+
+def slot(vm, code):
+    """The slot of the first call of a global in `code`, in `vm`."""
+    for pc in range(len(code.ops)):
+        if code.ops[pc] in (OP_FIND_EVAL, OP_FIND_TAIL_EVAL):
+            idx = code.ops[pc + 3]
+            return vm.sites[idx] if idx < len(vm.sites) else EMPTY
+
+class SitesTest(unittest.TestCase):
+    def test_redefinition(self):
+        vm = VM(jit=None)
+        vm.run(compile("(define f (λ (x) x)) (define g (λ (x) (f x)))"))
+        call = compile("(g 1)")
+        body = vm.lookup("g").code
+        vm.run(call)
+        self.assertEqual(vm.stack, [1])
+        first = slot(vm, body)
+        self.assertIs(first.fn, vm.lookup("f"))
+        self.assertIs(first.version, vm.version)
+
+        vm.run(compile("(define f (λ (x) (+ x 1)))"))
+        self.assertIsNot(first.version, vm.version) # no longer trusted...
+        vm.run(call)
+        self.assertEqual(vm.stack, [2])
+        self.assertIs(slot(vm, body).fn, vm.lookup("f")) # ...and filled in anew
+
+        # redefined while the call is running, and to something it can't call at all
+        vm.run(compile("(define h (λ (x) (cond ((eq? x 0) (f 0)) (true (h (- x 1))))))"))
+        self.assertRaisesRegex(Exception, "not a lambda", vm.run, compile("(define f 1) (h 3)"))
+        vm.run(compile("(define f (λ (x) 7)) (h 3)"))
+        self.assertEqual(vm.stack, [7])
+
+    def test_vms(self):
+        # the same code run on two VMs, each with globals of its own, and slots of its own
+        code = compile("(define g (λ (x) (f x)))")
+        one, two = VM(jit=None), VM(jit=None)
+        for vm, body in ((one, "(λ (x) 1)"), (two, "(λ (x) 2)")):
+            vm.run(compile(f"(define f {body})"))
+            vm.run(code)
+        call = compile("(g 0)")
+        for _ in range(3):
+            one.run(call)
+            self.assertEqual(one.stack, [1])
+            two.run(call)
+            self.assertEqual(two.stack, [2])
+
+    def test_stats(self):
+        # how the profiler tells hits from misses
+        vm = VM(jit=None)
+        vm.run(compile("(define fib (λ (n) (cond ((eq? n 0) 0) ((eq? n 1) 1) (true (+ (fib (- n 1)) (fib (- n 2)))))))"))
+        profiler = Profiler(vm)
+        profiler.start()
+        try:
+            vm.run(compile("(fib 10)"))
+            # every call a miss the first time (the one running this, and the two in `fib`)
+            self.assertEqual(profiler.results()["caches"], {"hits": 174, "misses": 3, "rate": 174 / 177})
+            vm.run(compile("(define unrelated 1)"))
+            code = compile("(fib 10)")
+            vm.run(code)
+            self.assertEqual(profiler.results()["caches"]["misses"], 3 + 3)
+            vm.load(code)
+            vm.pc = list(code.ops).index(OP_FIND_EVAL)
+            self.assertTrue(ops.cached(vm)) # the call that just ran
+            vm.run(compile("(define unrelated 2)"))
+            vm.load(code)
+            vm.pc = list(code.ops).index(OP_FIND_EVAL)
+            self.assertFalse(ops.cached(vm))
+        finally:
+            profiler.stop()
+
+    def test_counting(self):
+        # a lambda still being counted towards JIT compilation isn't remembered
+        vm = VM(jit=100)
+        vm.run(compile("(define f (λ (x) x)) (define g (λ (x) (f x)))"))
+        call = compile("(g 1)")
+        for _ in range(3):
+            vm.run(call)
+        self.assertIs(slot(vm, vm.lookup("g").code), EMPTY)
+        self.assertEqual(vm.lookup("f").calls, 3)
+
+if __name__ == "__main__":
+    unittest.main()
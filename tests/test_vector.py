@@ -0,0 +1,94 @@
+from os.path import dirname, join
+import sys
+import unittest
+
+sys.path.insert(0, join(dirname(__file__), "..", "src"))
+
+from interpreter import Interpreter
+import vector
+
+# Numeric vectors on the `array` fallback (NumPy or not): conversions both ways, elementwise
+# arithmetic, the reductions, empty vectors, and the errors for what 64-bit ints or zero
+# divisors can't hold.
+
+PROGRAMS = [
+    ("(vector)", "#()"),
+    ("(iota 0)", "#()"),
+    ("(to-vector nil)", "#()"),
+    ("(to-list (vector))", "None"),
+    ("(to-list (iota 3))", "(0 1 2)"),
+    ("(to-vector (list 1 2 3))", "#(1 2 3)"),
+    ("(eq? (vector 1 2) (to-vector (list 1 2)))", "True"),
+    ("(eq? (vector 1 2) (/ (vector 2 4) 2))", "False"), # ints and floats
+    ("(+ (vector 1 2) (vector 3 4))", "#(4 6)"),
+    ("(- 10 (vector 1 2))", "#(9 8)"),
+    ("(* (vector 1 2) 2 (vector 3 4))", "#(6 16)"),
+    ("(/ (vector 1 2) 2)", "#(0.5 1.0)"),
+    ("(+ (vector 1 2) (/ 1 2))", "#(1.5 2.5)"),
+    ("(+ (vector) (vector))", "#()"),
+    ("(vector-ref (/ (iota 3) 1) 2)", "2.0"),
+    ("(vector-sum (vector))", "0"),
+    ("(vector-sum (iota 5))", "10"),
+    ("(vector-sum (list 1 2 3))", "6"),
+    ("(vector-sum (/ (vector 1 2) 4))", "0.75"),
+    ("(vector-min (vector 3 1 2))", "1"),
+    ("(vector-max (list 3 1 2))", "3"),
+    ("(vector-dot (vector 1 2) (vector 3 4))", "11"),
+    ("(vector-dot (vector) (vector))", "0"),
+    ("(vector-length (iota 1000))", "1000"),
+    ("(vector? (iota 1))", "True"),
+    ("(vector? (list 1))", "False"),
+]
+
+ERRORS = [
+    ("(vector 9223372036854775808)", "vector: element out of the 64-bit range"),
+    ("(- (vector 0) 9223372036854775807 2)", "`-/n`: element out of the 64-bit range"),
+    ("(* (vector 9223372036854775807) 2)", "`*/n`: element out of the 64-bit range"),
+    ("(+ (vector 9223372036854775807) (vector 1))", "`+/n`: element out of the 64-bit range"),
+    ("(/ (vector 1 2) 0)", "`//n`: division by zero"),
+    ("(/ 1 (vector 1 0))", "`//n`: division by zero"),
+    ("(+ (vector 1) (vector 1 2))", "`+/n`: vectors of different lengths"),
+    ("(+ (vector 1) (quote a))", "`+/n`: invalid argument type"),
+    ("(to-vector (list 1 (quote a)))", "vector: elements must be numbers"),
+    ("(vector-min (vector))", "`vector-min/1`: no elements"),
+    ("(vector-max nil)", "`vector-max/1`: no elements"),
+    ("(vector-dot (vector 1) (vector 1 2))", "`vector-dot/2`: vectors of different lengths"),
+    ("(vector-ref (vector 1) 1)", "`vector-ref/2`: index 1 out of range"),
+    ("(vector-ref (vector 1) (- 0 1))", "`vector-ref/2`: index -1 out of range"),
+    ("(iota (- 0 1))", "`iota/1`: invalid argument type"),
+]
+
+class VectorTest(unittest.TestCase):
+    def setUp(self):
+        self.numpy, vector.numpy = vector.numpy, None
+
+    def tearDown(self):
+        vector.numpy = self.numpy
+
+    def test_programs(self):
+        interp = Interpreter()
+        for source, expected in PROGRAMS:
+            with self.subTest(source=source):
+                self.assertEqual(str(interp.run(source)), expected)
+
+    def test_errors(self):
+        interp = Interpreter()
+        for source, message in ERRORS:
+            with self.subTest(source=source):
+                with self.assertRaises(Exception) as cm:
+                    interp.run(source)
+                self.assertEqual(str(cm.exception), message)
+
+    def test_values(self):
+        a, b = vector.make([1, 2]), vector.make([1.0, 2.0])
+        self.assertEqual((a.kind, b.kind), ("int", "float"))
+        self.assertEqual(a.data.typecode, "q")
+        self.assertNotEqual(a, b)
+        self.assertEqual(a, vector.make([1, 2]))
+        self.assertEqual(hash(a), hash(vector.make([1, 2])))
+        self.assertEqual(vector.make([1, 2], "float"), b)
+        self.assertEqual(type(vector.sum_(None, b)), float)
+        self.assertEqual(type(vector.vector_ref(None, b, 0)), float)
+
+if __name__ == "__main__":
+    unittest.main()